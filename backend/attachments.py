@@ -0,0 +1,274 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from decouple import config
+from fastapi import HTTPException
+from sqlalchemy import delete, exists, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import FileBlob, FileUpload, Note, NoteAttachment
+from file_handler import (
+    StoredFile, file_handler, content_hash, delete_file,
+    CONTENT_NAME_RE, DERIVATIVE_NAME_RE, DERIVATIVE_TYPE
+)
+
+# Configuration
+# Uploads never attached to a note are reclaimed after this long
+UPLOAD_RETENTION_HOURS = config("UPLOAD_RETENTION_HOURS", default=24, cast=int)
+UPLOAD_REAP_INTERVAL = config("UPLOAD_REAP_INTERVAL", default=3600, cast=int)  # seconds
+
+_reaper_task: Optional[asyncio.Task] = None
+
+
+async def register_upload(db: AsyncSession, stored: StoredFile, user_id: int) -> str:
+    """Record an uploaded blob and its uploader; return its canonical URL."""
+    blob = await db.get(FileBlob, stored.sha256)
+    if blob is None:
+        try:
+            async with db.begin_nested():
+                blob = FileBlob(
+                    sha256=stored.sha256,
+                    file_type=stored.file_type,
+                    extension=stored.extension,
+                    content_type=stored.content_type,
+                    size=stored.size,
+                )
+                db.add(blob)
+        except IntegrityError:
+            # A concurrent upload of the same bytes registered it first
+            blob = await db.get(FileBlob, stored.sha256)
+
+    if (blob.file_type, blob.extension) != (stored.file_type, stored.extension):
+        # Same bytes already stored under another type or extension
+        file_handler.blob_path(stored.file_type, stored.sha256, stored.extension).unlink(missing_ok=True)
+
+    upload = await db.get(FileUpload, (stored.sha256, user_id))
+    if upload is None:
+        try:
+            async with db.begin_nested():
+                db.add(FileUpload(sha256=stored.sha256, user_id=user_id))
+        except IntegrityError:
+            pass
+    else:
+        # Uploading again restarts the retention period
+        upload.created_at = datetime.utcnow()
+    return file_handler.file_url(blob.file_type, blob.filename)
+
+
+async def get_readable_file(db: AsyncSession, user_id: int, file_type: str, filename: str):
+    """Return (path, content_type) of a stored file the user may read, else None.
+
+    A blob (and its derivatives) is readable by its uploaders and by owners
+    of notes attached to it; a legacy file by the owner of the note whose
+    URL names it.
+    """
+    path = file_handler.resolve_path(file_type, filename)
+    if path is None:
+        return None
+
+    if file_type == DERIVATIVE_TYPE:
+        match = DERIVATIVE_NAME_RE.match(filename)
+        source = await get_readable_file(
+            db, user_id, "images", match.group("sha256"))
+        if source is None:
+            return None
+        return path, "image/webp" if match.group("ext") == "webp" else "image/jpeg"
+
+    match = CONTENT_NAME_RE.match(filename)
+    if match:
+        digest = match.group("sha256")
+        attached = exists().where(
+            NoteAttachment.sha256 == digest,
+            NoteAttachment.note_id == Note.id,
+            Note.user_id == user_id)
+        uploaded = exists().where(
+            FileUpload.sha256 == digest, FileUpload.user_id == user_id)
+        blob = (await db.execute(
+            select(FileBlob.content_type).where(
+                FileBlob.sha256 == digest, FileBlob.file_type == file_type,
+                or_(attached, uploaded)))).first()
+        return (path, blob.content_type) if blob is not None else None
+
+    suffix = f"/files/{file_type}/{filename}"
+    owned = await db.scalar(select(
+        exists().where(
+            Note.user_id == user_id,
+            or_(Note.image_url.endswith(suffix, autoescape=True),
+                Note.audio_url.endswith(suffix, autoescape=True)))))
+    return (path, None) if owned else None
+
+
+async def sync_note_files(db: AsyncSession, note_id: int, user_id: int,
+                          file_urls: Iterable[Optional[str]]) -> List[str]:
+    """Point a note's attachments at the blobs its URLs name.
+
+    A blob can only be attached by a user who uploaded it or already has it
+    on one of their notes; naming any other blob is rejected with 400.
+    Attaching consumes the owner's pending upload of a blob. Returns URLs of
+    blobs that lost their last reference; pass them to purge_files once the
+    transaction has committed.
+    """
+    wanted = {digest for digest in map(content_hash, file_urls) if digest}
+    current = set(await db.scalars(
+        select(NoteAttachment.sha256).where(NoteAttachment.note_id == note_id)))
+
+    added = wanted - current
+    if added:
+        # Knowing a blob's URL must not be enough to gain read access to it
+        attached = exists().where(
+            NoteAttachment.sha256 == FileBlob.sha256,
+            NoteAttachment.note_id == Note.id,
+            Note.user_id == user_id)
+        uploaded = exists().where(
+            FileUpload.sha256 == FileBlob.sha256, FileUpload.user_id == user_id)
+        claimable = set(await db.scalars(
+            select(FileBlob.sha256).where(
+                FileBlob.sha256.in_(added), or_(attached, uploaded))))
+        if claimable != added:
+            raise HTTPException(status_code=400, detail="Invalid file URL")
+
+        await db.execute(insert(NoteAttachment), [
+            {"note_id": note_id, "sha256": digest} for digest in added])
+        await db.execute(
+            update(FileBlob)
+            .where(FileBlob.sha256.in_(added))
+            .values(ref_count=FileBlob.ref_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(FileUpload)
+            .where(FileUpload.user_id == user_id, FileUpload.sha256.in_(added))
+            .execution_options(synchronize_session=False)
+        )
+
+    removed = current - wanted
+    if not removed:
+        return []
+    await db.execute(
+        delete(NoteAttachment)
+        .where(NoteAttachment.note_id == note_id, NoteAttachment.sha256.in_(removed))
+        .execution_options(synchronize_session=False)
+    )
+    return await _release(db, Counter(removed))
+
+
+async def release_note_files(db: AsyncSession, note_ids: List[int], file_urls: Iterable[Optional[str]]) -> List[str]:
+    """Drop the attachments of deleted notes.
+
+    Returns the URLs to remove from disk after commit: blobs that lost their
+    last reference plus any legacy (not content-addressed) URLs.
+    """
+    orphaned = [url for url in file_urls if url and not content_hash(url)]
+    if not note_ids:
+        return orphaned
+
+    references = Counter(await db.scalars(
+        select(NoteAttachment.sha256).where(NoteAttachment.note_id.in_(note_ids))))
+    if references:
+        await db.execute(
+            delete(NoteAttachment)
+            .where(NoteAttachment.note_id.in_(note_ids))
+            .execution_options(synchronize_session=False)
+        )
+        orphaned.extend(await _release(db, references))
+    return orphaned
+
+
+async def _release(db: AsyncSession, references: Counter) -> List[str]:
+    """Decrement reference counts; delete and return blobs nothing uses any more."""
+    by_count = {}
+    for digest, count in references.items():
+        by_count.setdefault(count, []).append(digest)
+    for count, digests in by_count.items():
+        await db.execute(
+            update(FileBlob)
+            .where(FileBlob.sha256.in_(digests))
+            .values(ref_count=FileBlob.ref_count - count)
+            .execution_options(synchronize_session=False)
+        )
+
+    return await _delete_unused_blobs(db, list(references))
+
+
+async def _delete_unused_blobs(db: AsyncSession, digests: List[str]) -> List[str]:
+    """Delete blobs with no attachments and no pending upload; return their URLs.
+
+    Other users' pending uploads of the same content keep a blob alive.
+    """
+    pending = exists().where(FileUpload.sha256 == FileBlob.sha256)
+    unused = (await db.scalars(
+        select(FileBlob).where(
+            FileBlob.sha256.in_(digests), FileBlob.ref_count <= 0, ~pending))).all()
+    if not unused:
+        return []
+    await db.execute(
+        delete(FileBlob)
+        .where(FileBlob.sha256.in_([blob.sha256 for blob in unused]))
+        .execution_options(synchronize_session=False)
+    )
+    return [file_handler.file_url(blob.file_type, blob.filename) for blob in unused]
+
+
+async def reap_unattached_uploads(db: AsyncSession, older_than: datetime) -> List[str]:
+    """Expire uploads never attached to a note.
+
+    Returns URLs of blobs left unused; pass them to purge_files once the
+    transaction has committed.
+    """
+    expired = set(await db.scalars(
+        select(FileUpload.sha256).where(FileUpload.created_at < older_than)))
+    if not expired:
+        return []
+    await db.execute(
+        delete(FileUpload)
+        .where(FileUpload.created_at < older_than)
+        .execution_options(synchronize_session=False)
+    )
+    return await _delete_unused_blobs(db, list(expired))
+
+
+async def purge_files(db: AsyncSession, file_urls: List[str]):
+    """Remove orphaned files from disk; call only after commit."""
+    digests = [digest for digest in map(content_hash, file_urls) if digest]
+    # A blob re-uploaded since it was released must stay
+    revived = set()
+    if digests:
+        revived = set(await db.scalars(
+            select(FileBlob.sha256).where(FileBlob.sha256.in_(digests))))
+    for file_url in file_urls:
+        if content_hash(file_url) not in revived:
+            delete_file(file_url)
+
+
+async def _reap_loop():
+    while True:
+        await asyncio.sleep(UPLOAD_REAP_INTERVAL)
+        try:
+            cutoff = datetime.utcnow() - timedelta(hours=UPLOAD_RETENTION_HOURS)
+            async with AsyncSessionLocal() as db:
+                orphaned = await reap_unattached_uploads(db, cutoff)
+                await db.commit()
+                await purge_files(db, orphaned)
+            if orphaned:
+                print(f"Reclaimed {len(orphaned)} unattached uploads")
+        except Exception as e:
+            print(f"Upload reaper failed: {e}")
+
+
+def start_upload_reaper():
+    """Periodically reclaim abandoned uploads on application startup."""
+    global _reaper_task
+    if _reaper_task is None:
+        _reaper_task = asyncio.ensure_future(_reap_loop())
+
+
+def stop_upload_reaper():
+    """Stop the reaper on application shutdown."""
+    global _reaper_task
+    if _reaper_task is not None:
+        _reaper_task.cancel()
+        _reaper_task = None
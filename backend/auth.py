@@ -1,16 +1,23 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+import hashlib
+import hmac
+import os
 import secrets
+import threading
+import time
 import smtplib
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from decouple import config
 
 from database import get_db
@@ -22,6 +29,22 @@ SECRET_KEY = config(
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 PASSWORD_RESET_EXPIRE_MINUTES = 30  # 30 minutes for password reset
+# Lifetime of signed attachment URLs (for <img>/<audio> src)
+FILE_URL_EXPIRE_SECONDS = config("FILE_URL_EXPIRE_SECONDS", default=300, cast=int)
+
+# Authenticated principal cache (per process)
+PRINCIPAL_CACHE_SIZE = config("PRINCIPAL_CACHE_SIZE", default=10000, cast=int)
+PRINCIPAL_CACHE_TTL = config("PRINCIPAL_CACHE_TTL", default=60, cast=int)  # seconds
+
+# Password hashing pool: "thread" (bcrypt releases the GIL) or "process"
+PASSWORD_HASH_EXECUTOR = config("PASSWORD_HASH_EXECUTOR", default="thread")
+PASSWORD_HASH_WORKERS = config(
+    "PASSWORD_HASH_WORKERS", default=os.cpu_count() or 2, cast=int)
+# Hash/verify calls allowed to run or wait before shedding load with 503
+PASSWORD_HASH_QUEUE_LIMIT = config(
+    "PASSWORD_HASH_QUEUE_LIMIT", default=64, cast=int)
+# bcrypt cost factor (defaults to fast rounds for development)
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", default=4, cast=int)
 
 # Email configuration
 SMTP_SERVER = config("SMTP_SERVER", default="smtp.gmail.com")
@@ -29,24 +52,98 @@ SMTP_PORT = config("SMTP_PORT", default=587, cast=int)
 SMTP_EMAIL = config("SMTP_EMAIL", default="")
 SMTP_PASSWORD = config("SMTP_PASSWORD", default="")
 
-# Password hashing (faster rounds for development)
+# Password hashing; hashes with any other cost are flagged for rehash
 pwd_context = CryptContext(
-    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS)
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHashPool:
+    """Long-lived, bounded executor for bcrypt work.
+
+    At most queue_limit calls may be running or queued; beyond that new
+    calls fail fast with 503 so a login burst cannot starve every other
+    endpoint of CPU.
+    """
+
+    def __init__(self, kind: str = PASSWORD_HASH_EXECUTOR, workers: int = PASSWORD_HASH_WORKERS,
+                 queue_limit: int = PASSWORD_HASH_QUEUE_LIMIT):
+        self.kind = kind
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = None
+        self._pending = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls currently running or waiting for a worker."""
+        return self._pending
+
+    async def run(self, func, *args):
+        # Only touched from the event loop thread, so no lock is needed
+        if self._pending >= self.queue_limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+
+# Service instance
+hash_pool = PasswordHashPool()
 
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, pwd_context.verify, plain_password, hashed_password)
+    valid, _ = await verify_and_update_password(plain_password, hashed_password)
+    return valid
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also return a new hash if the cost changed."""
+    return await hash_pool.run(_verify_and_update, plain_password, hashed_password)
 
 
 async def get_password_hash(password: str) -> str:
     """Hash a password."""
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, pwd_context.hash, password)
+    return await hash_pool.run(_hash_password, password)
+
+
+def shutdown_hash_pool():
+    """Stop the hashing workers on application shutdown."""
+    hash_pool.shutdown()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -62,16 +159,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify JWT token and return email if valid."""
+def create_user_access_token(user: User) -> str:
+    """Create an access token carrying the user id and token version."""
+    return create_access_token(data={
+        "sub": user.email,
+        "uid": user.id,
+        "ver": user.token_version or 0,
+    })
+
+
+def decode_access_token(token: str) -> Optional[dict]:
+    """Verify an access token and return its claims if valid."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
         return None
+    # Password reset tokens share the key but must not authenticate requests
+    if payload.get("sub") is None or payload.get("type") is not None:
+        return None
+    return payload
+
+
+def verify_token(token: str) -> Optional[str]:
+    """Verify JWT token and return email if valid."""
+    payload = decode_access_token(token)
+    return payload.get("sub") if payload else None
 
 
 def create_password_reset_token(email: str) -> str:
@@ -147,29 +259,176 @@ def send_password_reset_email(email: str, reset_token: str) -> bool:
         return False
 
 
+class UserPrincipal:
+    """The authenticated user as seen by request handlers.
+
+    A detached, read-only snapshot of the user row; handlers that need to
+    modify the user load the row themselves.
+    """
+    __slots__ = ("id", "email", "username", "token_version")
+
+    def __init__(self, id: int, email: str, username: str, token_version: int):
+        self.id = id
+        self.email = email
+        self.username = username
+        self.token_version = token_version
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserPrincipal":
+        return cls(user.id, user.email, user.username, user.token_version or 0)
+
+
+class PrincipalCache:
+    """LRU cache of principals keyed by user id, with a TTL.
+
+    Entries are dropped explicitly when a user's credentials change; the
+    TTL bounds how long another worker process can serve a stale entry.
+    """
+
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_SIZE, ttl: int = PRINCIPAL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[UserPrincipal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def put(self, principal: UserPrincipal):
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Service instance
+principal_cache = PrincipalCache()
+
+
+def invalidate_user(user_id: int):
+    """Drop a cached principal after the user's credentials change."""
+    principal_cache.invalidate(user_id)
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> UserPrincipal:
     """Get current authenticated user."""
+    return await authenticate_token(db, credentials.credentials)
+
+
+def _file_url_signature(path: str, user_id: int, expires: int) -> str:
+    # Separate key so a file signature can never pass as anything else
+    key = hashlib.sha256(b"file-url:" + SECRET_KEY.encode()).digest()
+    message = f"{path}\n{user_id}\n{expires}".encode()
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+def sign_file_url(path: str, user_id: int, expires_in: int = FILE_URL_EXPIRE_SECONDS) -> Tuple[str, datetime]:
+    """A short-lived URL for one file path, readable as user_id without a header.
+
+    The expiry is rounded up to a multiple of expires_in, so within one
+    window the same file gets the same URL and browser caches can hit; a
+    URL stays valid for between expires_in and twice that.
+    """
+    window = max(expires_in, 1)
+    expires = -(-(int(time.time()) + expires_in) // window) * window
+    signature = _file_url_signature(path, user_id, expires)
+    return f"{path}?uid={user_id}&exp={expires}&sig={signature}", datetime.utcfromtimestamp(expires)
+
+
+async def get_current_user_or_signed_url(
+    request: Request,
+    uid: Optional[int] = None,
+    exp: Optional[int] = None,
+    sig: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_db)
+) -> UserPrincipal:
+    """Like get_current_user, but also accepts a URL from sign_file_url."""
+    if credentials is not None:
+        return await authenticate_token(db, credentials.credentials)
+
+    if uid is None or exp is None or not sig:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    expected = _file_url_signature(request.url.path, uid, exp)
+    if exp < time.time() or not hmac.compare_digest(sig, expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired file URL",
+        )
+
+    principal = principal_cache.get(uid)
+    if principal is None:
+        user = await db.get(User, uid)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired file URL",
+            )
+        principal = UserPrincipal.from_user(user)
+        principal_cache.put(principal)
+    return principal
+
+
+async def authenticate_token(db: AsyncSession, token: str) -> UserPrincipal:
+    """Resolve an access token to its principal or raise 401."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token = credentials.credentials
-    email = verify_token(token)
-    if email is None:
+    payload = decode_access_token(token)
+    if payload is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    user_id = payload.get("uid")
+    version = payload.get("ver", 0)
+    if user_id is not None:
+        principal = principal_cache.get(user_id)
+        if principal is not None and principal.token_version == version:
+            return principal
+        # Cache miss: primary key lookup
+        user = await db.get(User, user_id)
+    else:
+        # Tokens issued before ids were embedded
+        user = await db.scalar(select(User).where(User.email == payload["sub"]))
+
+    if user is None or user.email != payload["sub"]:
+        raise credentials_exception
+    if (user.token_version or 0) != version:
+        # Token predates a password reset
         raise credentials_exception
 
-    return user
+    principal = UserPrincipal.from_user(user)
+    principal_cache.put(principal)
+    return principal
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: UserPrincipal = Depends(get_current_user)) -> UserPrincipal:
     """Get current active user (can extend with user.is_active check)."""
     return current_user
@@ -0,0 +1,197 @@
+import json
+from typing import List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Note, NoteTombstone
+from schemas import NoteBatchOperation
+from sync import next_change_seq, clear_tombstones
+from drawings import save_drawing, delete_drawings
+from attachments import sync_note_files, release_note_files
+from image_derivatives import apply_image_derivatives, catch_up_image_derivatives
+from note_links import extract_links, sync_note_links, delete_note_links
+from link_preview import prefetch_link_previews
+
+# Configuration
+MAX_BATCH_OPERATIONS = 500
+
+
+class NoteBatch:
+    """Apply many note mutations in one transaction.
+
+    Updates that share the same changes become one UPDATE ... WHERE id IN
+    (...), deletes become one DELETE, and the whole batch shares a single
+    change sequence number and a single commit.
+    """
+
+    def __init__(self, db: AsyncSession, user_id: int):
+        self.db = db
+        self.user_id = user_id
+
+    async def apply(self, operations: List[NoteBatchOperation], atomic: bool = True) -> Tuple[List[dict], List[str]]:
+        """Run the batch; returns per-operation results and orphaned file URLs."""
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise HTTPException(
+                status_code=400, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+        self._validate(operations)
+
+        # One query to check ownership of every referenced note
+        referenced = [op.id for op in operations if op.op != "create"]
+        owned = {}
+        if referenced:
+            owned = {
+                row.id: row
+                for row in await self.db.execute(
+                    select(Note.id, Note.image_url, Note.audio_url).where(
+                        Note.user_id == self.user_id, Note.id.in_(referenced)))
+            }
+        missing = [note_id for note_id in referenced if note_id not in owned]
+        if missing and atomic:
+            raise HTTPException(
+                status_code=404, detail=f"Notes not found: {', '.join(map(str, missing))}")
+
+        results = [
+            {"index": index, "op": op.op, "id": op.id, "status": "ok"}
+            for index, op in enumerate(operations)
+        ]
+        for result in results:
+            if result["op"] != "create" and result["id"] not in owned:
+                result["status"] = "not_found"
+
+        applied = [
+            (index, op) for index, op in enumerate(operations)
+            if results[index]["status"] == "ok"
+        ]
+        if not applied:
+            return results, []
+
+        change_seq = await next_change_seq(self.db, self.user_id)
+
+        # Deletes: tombstones plus one set-based DELETE
+        delete_ids = [op.id for _, op in applied if op.op == "delete"]
+        orphaned_files = []
+        if delete_ids:
+            orphaned_files = await release_note_files(self.db, delete_ids, [
+                url for note_id in delete_ids
+                for url in (owned[note_id].image_url, owned[note_id].audio_url)
+            ])
+            await self.db.execute(insert(NoteTombstone), [
+                {"note_id": note_id, "user_id": self.user_id, "change_seq": change_seq}
+                for note_id in delete_ids
+            ])
+            await delete_drawings(self.db, delete_ids)
+            await delete_note_links(self.db, delete_ids)
+            await self.db.execute(
+                delete(Note)
+                .where(Note.user_id == self.user_id, Note.id.in_(delete_ids))
+                .execution_options(synchronize_session=False)
+            )
+
+        # Updates: one UPDATE per distinct set of changes
+        groups = {}
+        drawings = []
+        attachments = []
+        relinked = []
+        for _, op in applied:
+            if op.op != "update":
+                continue
+            values = op.changes.dict(exclude_unset=True)
+            if "drawing_data" in values:
+                # Drawings are per-note blobs, stored individually below
+                drawings.append((op.id, values.pop("drawing_data")))
+            if "image_url" in values or "audio_url" in values:
+                attachments.append((op.id, values))
+            if values.keys() & {"content", "checklist_items", "link_url"}:
+                relinked.append(op.id)
+            key = json.dumps(values, sort_keys=True, default=str)
+            groups.setdefault(key, (values, []))[1].append(op.id)
+        for values, note_ids in groups.values():
+            await self.db.execute(
+                update(Note)
+                .where(Note.user_id == self.user_id, Note.id.in_(note_ids))
+                .values(**values, change_seq=change_seq)
+                .execution_options(synchronize_session=False)
+            )
+
+        if drawings:
+            notes = {
+                note.id: note
+                for note in await self.db.scalars(
+                    select(Note).where(Note.id.in_([note_id for note_id, _ in drawings])))
+            }
+            for note_id, drawing_data in drawings:
+                await save_drawing(self.db, notes[note_id], drawing_data)
+
+        imaged = []
+        for note_id, values in attachments:
+            row = owned[note_id]
+            orphaned_files.extend(await sync_note_files(self.db, note_id, self.user_id, (
+                values.get("image_url", row.image_url),
+                values.get("audio_url", row.audio_url),
+            )))
+            if "image_url" in values:
+                await apply_image_derivatives(self.db, note_id, values["image_url"])
+                imaged.append(note_id)
+
+        links = []
+        if relinked:
+            rows = await self.db.execute(
+                select(Note.id, Note.content, Note.checklist_items, Note.link_url)
+                .where(Note.id.in_(relinked)))
+            for row in rows.all():
+                links.extend(await sync_note_links(self.db, row.id, extract_links(
+                    row.content, row.checklist_items, row.link_url)))
+
+        # Creates: inserted together, ids reported back
+        created = []
+        for index, op in applied:
+            if op.op != "create":
+                continue
+            values = op.note.dict()
+            drawing_data = values.pop("drawing_data", None)
+            note = Note(**values, user_id=self.user_id, change_seq=change_seq)
+            created.append((index, note, drawing_data))
+        if created:
+            self.db.add_all([note for _, note, _ in created])
+            await self.db.flush()
+            for index, note, drawing_data in created:
+                results[index]["id"] = note.id
+                await clear_tombstones(self.db, note.id)
+                if drawing_data:
+                    await save_drawing(self.db, note, drawing_data)
+                await sync_note_files(self.db, note.id, self.user_id, (note.image_url, note.audio_url))
+                if note.image_url:
+                    await apply_image_derivatives(self.db, note.id, note.image_url)
+                    imaged.append(note.id)
+                links.extend(await sync_note_links(self.db, note.id, extract_links(
+                    note.content, note.checklist_items, note.link_url)))
+
+        await self.db.commit()
+        await catch_up_image_derivatives(self.db, imaged)
+        prefetch_link_previews(links)
+        return results, orphaned_files
+
+    def _validate(self, operations: List[NoteBatchOperation]):
+        seen = set()
+        for index, op in enumerate(operations):
+            if op.op == "create" and op.note is None:
+                raise HTTPException(
+                    status_code=400, detail=f"Operation {index}: create requires 'note'")
+            if op.op == "update" and (op.id is None or op.changes is None):
+                raise HTTPException(
+                    status_code=400, detail=f"Operation {index}: update requires 'id' and 'changes'")
+            if op.op == "delete" and op.id is None:
+                raise HTTPException(
+                    status_code=400, detail=f"Operation {index}: delete requires 'id'")
+            if op.op != "create":
+                if op.id in seen:
+                    raise HTTPException(
+                        status_code=400, detail=f"Operation {index}: note {op.id} appears more than once")
+                seen.add(op.id)
+
+
+async def apply_batch(db: AsyncSession, user_id: int, operations: List[NoteBatchOperation], atomic: bool = True):
+    """Public function to apply a batch of note operations."""
+    return await NoteBatch(db, user_id).apply(operations, atomic)
@@ -0,0 +1,57 @@
+"""Compare two benchmark result files from run.py.
+
+    python benchmarks/compare.py before.json after.json [--threshold 5]
+
+Prints latency and throughput per mode and scenario with the relative
+change; changes beyond the threshold (percent) are flagged.
+"""
+import argparse
+import json
+
+METRICS = [("p50_ms", False), ("p95_ms", False), ("p99_ms", False),
+           ("throughput_rps", True), ("peak_rss_mb", False)]
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before.get('commit')}  {before.get('timestamp')}")
+    print(f"after:  {after.get('commit')}  {after.get('timestamp')}")
+    if before.get("config") != after.get("config"):
+        print("warning: runs used different configurations")
+
+    for mode, scenarios in after["results"].items():
+        for name, stats in scenarios.items():
+            old = before["results"].get(mode, {}).get(name)
+            if old is None:
+                continue
+            cells = []
+            for metric, higher_is_better in METRICS:
+                delta = change(old.get(metric), stats.get(metric))
+                if delta is None:
+                    cells.append(f"{metric} n/a")
+                    continue
+                flag = ""
+                if abs(delta) >= args.threshold:
+                    flag = " +" if (delta > 0) == higher_is_better else " -"
+                cells.append(f"{metric} {old[metric]:.1f}->{stats[metric]:.1f} ({delta:+.1f}%){flag}")
+            print(f"{mode:9} {name:22} " + "  ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
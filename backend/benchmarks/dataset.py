@@ -0,0 +1,126 @@
+"""Synthetic, reproducible dataset for the benchmarks.
+
+Rows are written with bulk Core inserts straight into the database the app
+uses, so seeding 100k notes takes seconds rather than hours of API calls.
+"""
+import hashlib
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import func, insert, select, update
+
+WORDS = (
+    "meeting notes groceries project idea travel budget reading list follow up "
+    "call schedule review draft recipe workout garden invoice birthday plan "
+    "weekend book movie podcast deadline sprint release bug design sketch"
+).split()
+LABELS = ["work", "personal", "ideas", "shopping", "travel", "health", "finance", "reading"]
+COLORS = ["white", "yellow", "blue", "green", "pink", "purple", "orange", "gray"]
+MOODS = ["happy", "calm", "neutral", "stressed", "sad", None]
+LINK_HOSTS = ["example.com", "docs.example.org", "news.example.net", "blog.example.io"]
+
+DEFAULT_PASSWORD = "benchmark-password"
+BATCH_SIZE = 1000
+
+
+def _sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def seed_users(engine, count: int, password: str = DEFAULT_PASSWORD, prefix: str = "bench") -> List[dict]:
+    """Create users sharing one password hash; returns their credentials."""
+    from auth import pwd_context
+    from models import Label, User
+
+    hashed = pwd_context.hash(password)
+    users = []
+    with engine.begin() as conn:
+        for n in range(count):
+            email = f"{prefix}{n}@example.com"
+            user_id = conn.execute(insert(User).values(
+                email=email, username=f"{prefix}{n}", hashed_password=hashed)).inserted_primary_key[0]
+            conn.execute(insert(Label), [
+                {"name": name, "color": COLORS[i % len(COLORS)], "user_id": user_id}
+                for i, name in enumerate(LABELS)
+            ])
+            users.append({"id": user_id, "email": email, "password": password})
+    return users
+
+
+def seed_notes(engine, user_id: int, count: int, seed: int = 0) -> List[int]:
+    """Insert count notes for a user with checklists, drawings, labels and links.
+
+    Returns the new note ids.
+    """
+    from models import Note, NoteDrawing, NoteLink, User
+    from note_links import extract_links
+
+    rng = random.Random(f"{seed}:{user_id}")
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        next_id = (conn.scalar(select(func.max(Note.id))) or 0) + 1
+        change_seq = conn.scalar(select(User.change_seq).where(User.id == user_id)) or 0
+        note_ids = []
+
+        for start in range(0, count, BATCH_SIZE):
+            notes, drawings, links = [], [], []
+            for _ in range(min(BATCH_SIZE, count - start)):
+                note_id, change_seq = next_id, change_seq + 1
+                next_id += 1
+                kind = rng.random()
+                content = ". ".join(_sentence(rng, rng.randint(6, 18)) for _ in range(rng.randint(1, 6)))
+                link_url = None
+                if rng.random() < 0.2:
+                    link_url = f"https://{rng.choice(LINK_HOSTS)}/articles/{rng.randint(1, 5000)}"
+                if rng.random() < 0.1:
+                    content += f" see https://{rng.choice(LINK_HOSTS)}/posts/{rng.randint(1, 5000)}"
+                checklist = None
+                if kind < 0.25:
+                    checklist = [
+                        {"text": _sentence(rng, rng.randint(2, 6)), "completed": rng.random() < 0.4}
+                        for _ in range(rng.randint(2, 12))
+                    ]
+                created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+                row = {
+                    "id": note_id,
+                    "user_id": user_id,
+                    "title": _sentence(rng, rng.randint(1, 5)).capitalize(),
+                    "content": content,
+                    "note_type": "checklist" if checklist else "drawing" if kind > 0.95 else "text",
+                    "checklist_items": checklist,
+                    "is_pinned": rng.random() < 0.05,
+                    "is_archived": rng.random() < 0.15,
+                    "color": rng.choice(COLORS),
+                    "labels": rng.sample(LABELS, rng.randint(0, 3)),
+                    "link_url": link_url,
+                    "detected_mood": rng.choice(MOODS),
+                    "reminder_time": created + timedelta(days=7) if rng.random() < 0.05 else None,
+                    "change_seq": change_seq,
+                    "created_at": created,
+                    "updated_at": created + timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+                    "drawing_size": None,
+                    "drawing_hash": None,
+                }
+                if row["note_type"] == "drawing":
+                    data = rng.randbytes(rng.randint(1024, 8192))
+                    row["drawing_size"] = len(data)
+                    row["drawing_hash"] = hashlib.sha256(data).hexdigest()
+                    drawings.append({
+                        "note_id": note_id, "data": data, "content_type": "image/png",
+                        "size": len(data), "sha256": row["drawing_hash"],
+                    })
+                links.extend(
+                    {"note_id": note_id, "url": url}
+                    for url in extract_links(content, checklist, link_url))
+                notes.append(row)
+                note_ids.append(note_id)
+
+            conn.execute(insert(Note), notes)
+            if drawings:
+                conn.execute(insert(NoteDrawing), drawings)
+            if links:
+                conn.execute(insert(NoteLink), links)
+
+        conn.execute(update(User).where(User.id == user_id).values(change_seq=change_seq))
+    return note_ids
@@ -0,0 +1,119 @@
+"""Encode time and bytes on the wire for a 1,000-note GET /notes.
+
+Seeds a throwaway SQLite database, then compares
+  * stdlib json vs orjson for the serialized NoteListResponse, and
+  * identity vs gzip/br/zstd (whichever are installed) for the body,
+and finally fetches the listing through the app with each coding.
+
+Run from backend/:  python benchmarks/list_encoding.py [--notes 1000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from statistics import median
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(func, repeat):
+    """Median seconds per call over repeat runs."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="notes-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+
+    import main as app_module
+    from database import engine
+    from models import Note, User
+    from schemas import NoteListResponse
+    from dataset import seed_notes
+    from http_encoding import DefaultJSONResponse, AVAILABLE_ENCODINGS, _Compressor, orjson
+
+    client = TestClient(app_module.app)
+    token = client.post("/auth/register", json={
+        "email": "bench@example.com", "username": "bench", "password": "bench-password",
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    with Session(engine) as session:
+        user_id = session.scalar(select(User.id).where(User.email == "bench@example.com"))
+    seed_notes(engine, user_id, args.notes)
+    print(f"Seeded {args.notes} notes in {workdir}\n")
+
+    with Session(engine) as session:
+        notes = session.scalars(select(Note).where(Note.user_id == user_id)).all()
+        payload = NoteListResponse(items=notes).model_dump(mode="json")
+
+    # Encoding
+    stdlib_body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    stdlib_time = timed(lambda: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(), args.repeat)
+    print("Encoder          median ms   bytes")
+    print(f"stdlib json      {stdlib_time * 1000:9.2f}   {len(stdlib_body)}")
+    if orjson is not None:
+        render = DefaultJSONResponse.render
+        orjson_body = render(None, payload)
+        orjson_time = timed(lambda: render(None, payload), args.repeat)
+        print(f"orjson           {orjson_time * 1000:9.2f}   {len(orjson_body)}"
+              f"   ({stdlib_time / orjson_time:.1f}x faster)")
+    else:
+        print("orjson           not installed")
+
+    # Compression
+    print("\nCoding           median ms   bytes   ratio")
+    print(f"identity         {0:9.2f}   {len(stdlib_body):6}   1.00")
+    for encoding in AVAILABLE_ENCODINGS:
+        def compress():
+            compressor = _Compressor(encoding)
+            return compressor.compress(stdlib_body) + compressor.finish()
+        size = len(compress())
+        print(f"{encoding:16} {timed(compress, args.repeat) * 1000:9.2f}   {size:6}"
+              f"   {len(stdlib_body) / size:.2f}")
+
+    # Through the app, 500 notes per page; cursors come from an identity pass
+    # since the test client cannot decode every coding
+    cursors, cursor = [None], None
+    while True:
+        cursor = client.get("/notes", params={"limit": 500, **({"cursor": cursor} if cursor else {})},
+                            headers=headers).json()["next_cursor"]
+        if not cursor:
+            break
+        cursors.append(cursor)
+
+    print(f"\nGET /notes x{len(cursors)}     median ms   bytes on wire")
+    for encoding in ["identity"] + AVAILABLE_ENCODINGS:
+        received = []
+
+        def fetch_all():
+            total = 0
+            for page_cursor in cursors:
+                params = {"limit": 500, **({"cursor": page_cursor} if page_cursor else {})}
+                response = client.get("/notes", params=params,
+                                      headers={**headers, "Accept-Encoding": encoding})
+                total += response.num_bytes_downloaded
+            received.append(total)
+        elapsed = timed(fetch_all, max(3, args.repeat // 4))
+        print(f"{encoding:16} {elapsed * 1000:9.2f}   {received[-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""Load and latency benchmark for the API.
+
+Seeds a throwaway SQLite database with synthetic users and notes, then
+drives each endpoint scenario with concurrent clients, in-process (ASGI
+transport, no network) and/or against a local uvicorn. Link previews are
+fetched from a stub HTTP server in this process. Reports p50/p95/p99
+latency, throughput and peak RSS per scenario and writes them as JSON.
+
+Peak RSS is measured per scenario on Linux, from /proc (null elsewhere).
+With --workers > 1 only the uvicorn parent process is measured, not the
+workers that serve the requests.
+
+Run from backend/:
+    python benchmarks/run.py --notes 10000 --mode both --output results.json
+    python benchmarks/compare.py before.json results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SCENARIOS = [
+    "register", "login", "list_notes", "list_notes_summary", "list_notes_revalidate",
+    "get_note", "create_note", "update_note", "upload_image",
+    "link_preview_miss", "link_preview_hit",
+]
+# Password hashing is deliberately slow; these run fewer requests
+AUTH_SCENARIOS = {"register", "login"}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def tiny_png(rng: random.Random, size: int = 64) -> bytes:
+    """A valid PNG of random pixels, unique per call."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows))
+            + chunk(b"IEND", b""))
+
+
+# Stub link preview target
+
+def start_stub_server(delay: float):
+    """Serve small HTML pages with head metadata after an artificial delay."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = (
+                "<html><head><title>Stub %s</title>"
+                "<meta property='og:description' content='Synthetic page for benchmarks'>"
+                "<meta property='og:image' content='/image.png'></head>"
+                "<body>%s</body></html>" % (self.path, "<p>filler</p>" * 200)
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# Scenarios: each returns a function i -> (method, url, request kwargs)
+
+class Context:
+    def __init__(self, token, note_ids, stub_url, run_id):
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.note_ids = note_ids
+        self.stub_url = stub_url
+        self.run_id = run_id
+        self.rng = random.Random(run_id)
+        self.list_etag = None
+
+
+def build_request(name, ctx: Context, users):
+    rng = ctx.rng
+    if name == "register":
+        return lambda i: ("POST", "/auth/register", {"json": {
+            "email": f"new-{ctx.run_id}-{i}@example.com", "username": f"new{i}",
+            "password": "benchmark-password"}})
+    if name == "login":
+        return lambda i: ("POST", "/auth/login", {"json": {
+            "email": users[i % len(users)]["email"], "password": users[i % len(users)]["password"]}})
+    if name == "list_notes":
+        return lambda i: ("GET", "/notes", {"params": {"limit": 100}, "headers": ctx.headers})
+    if name == "list_notes_summary":
+        return lambda i: ("GET", "/notes", {"params": {"limit": 100, "view": "summary"}, "headers": ctx.headers})
+    if name == "list_notes_revalidate":
+        return lambda i: ("GET", "/notes", {"params": {"limit": 100},
+                                            "headers": {**ctx.headers, "If-None-Match": ctx.list_etag or ""}})
+    if name == "get_note":
+        return lambda i: ("GET", f"/notes/{rng.choice(ctx.note_ids)}", {"headers": ctx.headers})
+    if name == "create_note":
+        return lambda i: ("POST", "/notes", {"headers": ctx.headers, "json": {
+            "title": f"Benchmark note {i}",
+            "content": f"Created during the benchmark with a link {ctx.stub_url}/created/{ctx.run_id}/{i}",
+            "labels": ["work"]}})
+    if name == "update_note":
+        return lambda i: ("PUT", f"/notes/{rng.choice(ctx.note_ids)}", {"headers": ctx.headers, "json": {
+            "content": f"Updated during the benchmark ({i})", "is_pinned": i % 2 == 0}})
+    if name == "upload_image":
+        return lambda i: ("POST", "/upload/image", {"headers": ctx.headers, "files": {
+            "file": (f"bench{i}.png", tiny_png(rng), "image/png")}})
+    if name == "link_preview_miss":
+        return lambda i: ("GET", "/link-preview", {"params": {"url": f"{ctx.stub_url}/miss/{ctx.run_id}/{i}"}})
+    if name == "link_preview_hit":
+        return lambda i: ("GET", "/link-preview", {"params": {"url": f"{ctx.stub_url}/hit/{i % 10}"}})
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+async def run_scenario(client, make_request, requests, concurrency, rss):
+    """Fire requests from concurrency workers; returns the scenario stats."""
+    latencies, statuses = [], {}
+    counter = itertools.count()
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if i >= requests:
+                return
+            method, url, kwargs = make_request(i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    rss.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    peak_rss = rss.stop()
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items()
+                 if not isinstance(status, int) or status >= 400)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "peak_rss_mb": peak_rss,
+    }
+
+
+class PeakRss:
+    """Peak resident set size of one process during a single scenario.
+
+    VmHWM is a process-lifetime high-water mark, so it is reset before each
+    scenario by writing 5 to /proc/<pid>/clear_refs. Where the kernel
+    refuses that, VmRSS is sampled while the scenario runs instead.
+    """
+
+    SAMPLE_INTERVAL = 0.01  # seconds
+
+    def __init__(self, pid="self"):
+        self.pid = pid
+        self._peak_kib = 0
+        self._sampling = None
+        self._sampler = None
+
+    def _status_kib(self, field):
+        try:
+            with open(f"/proc/{self.pid}/status") as status:
+                for line in status:
+                    if line.startswith(field + ":"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return None
+
+    def start(self):
+        self._peak_kib = 0
+        try:
+            with open(f"/proc/{self.pid}/clear_refs", "w") as clear_refs:
+                clear_refs.write("5")
+            return
+        except OSError:
+            pass
+        self._sampling = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        while not self._sampling.is_set():
+            self._peak_kib = max(self._peak_kib, self._status_kib("VmRSS") or 0)
+            self._sampling.wait(self.SAMPLE_INTERVAL)
+
+    def stop(self):
+        """Peak RSS in MiB since start(), or None where /proc is unavailable."""
+        if self._sampler is not None:
+            self._sampling.set()
+            self._sampler.join()
+            self._sampler = None
+            peak = max(self._peak_kib, self._status_kib("VmRSS") or 0) or None
+        else:
+            peak = self._status_kib("VmHWM")
+        return round(peak / 1024, 1) if peak else None
+
+
+async def run_mode(mode, client, args, users, note_ids, stub_url, rss):
+    user = users[0]
+    response = await client.post("/auth/login", json={"email": user["email"], "password": user["password"]})
+    response.raise_for_status()
+    ctx = Context(response.json()["access_token"], note_ids, stub_url, f"{mode}-{int(time.time())}")
+    ctx.list_etag = (await client.get("/notes", params={"limit": 100}, headers=ctx.headers)).headers.get("etag")
+
+    results = {}
+    for name in args.scenarios:
+        requests = args.auth_requests if name in AUTH_SCENARIOS else args.requests
+        if name == "link_preview_hit":
+            # Warm the cache so the timed requests are hits
+            for i in range(10):
+                await client.get("/link-preview", params={"url": f"{stub_url}/hit/{i}"})
+        if name == "list_notes_revalidate":
+            ctx.list_etag = (await client.get("/notes", params={"limit": 100}, headers=ctx.headers)).headers.get("etag")
+        results[name] = await run_scenario(
+            client, build_request(name, ctx, users), requests, args.concurrency, rss)
+        print(f"  {mode:9} {name:22} p50 {results[name]['p50_ms']:8.2f} ms  "
+              f"p99 {results[name]['p99_ms']:8.2f} ms  {results[name]['throughput_rps']:8.1f} req/s  "
+              f"errors {results[name]['errors']}", file=sys.stderr)
+    return results
+
+
+async def run_in_process(args, users, note_ids, stub_url):
+    import httpx
+    import main as app_module
+
+    for handler in app_module.app.router.on_startup:
+        await handler()
+    try:
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await run_mode("inprocess", client, args, users, note_ids, stub_url, PeakRss())
+    finally:
+        for handler in app_module.app.router.on_shutdown:
+            await handler()
+
+
+async def run_uvicorn(args, users, note_ids, stub_url, workdir):
+    import httpx
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+         "--workers", str(args.workers)],
+        cwd=workdir, env=os.environ.copy(), stdout=sys.stderr)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            for _ in range(300):
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            # With several workers this is only the supervising parent
+            return await run_mode("uvicorn", client, args, users, note_ids, stub_url,
+                                  PeakRss(server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API load and latency benchmark")
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--notes", type=int, default=10000, help="notes per user (10k-100k)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--auth-requests", type=int, default=50, help="requests for register/login")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "both"], default="both")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (peak RSS covers only the parent)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--stub-delay-ms", type=float, default=20.0, help="latency of the stub site")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    if args.output != "-":
+        args.output = os.path.abspath(args.output)
+    workdir = tempfile.mkdtemp(prefix="notes-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    # The stub site listens on loopback
+    os.environ["LINK_PREVIEW_ALLOW_PRIVATE_HOSTS"] = "true"
+    os.chdir(workdir)
+
+    # The app logs with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args, workdir)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "users": args.users, "notes_per_user": args.notes, "requests": args.requests,
+            "auth_requests": args.auth_requests, "concurrency": args.concurrency,
+            "workers": args.workers, "stub_delay_ms": args.stub_delay_ms, "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+def run(args, workdir):
+    """Seed the database and run the selected modes; returns results by mode."""
+    # Importing the app creates the schema in the fresh database
+    import main as app_module  # noqa: F401
+    from database import engine
+    from dataset import seed_notes, seed_users
+
+    started = time.perf_counter()
+    users = seed_users(engine, args.users)
+    note_ids = []
+    for user in users:
+        ids = seed_notes(engine, user["id"], args.notes, seed=args.seed)
+        if user is users[0]:
+            note_ids = ids
+    print(f"Seeded {args.users} users x {args.notes} notes in {time.perf_counter() - started:.1f}s "
+          f"({workdir})", file=sys.stderr)
+
+    stub, stub_url = start_stub_server(args.stub_delay_ms / 1000)
+    results = {}
+    try:
+        if args.mode in ("inprocess", "both"):
+            results["inprocess"] = asyncio.run(run_in_process(args, users, note_ids, stub_url))
+        if args.mode in ("uvicorn", "both"):
+            results["uvicorn"] = asyncio.run(run_uvicorn(args, users, note_ids, stub_url, workdir))
+    finally:
+        stub.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    main()
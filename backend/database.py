@@ -1,21 +1,66 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import time
 from decouple import config
 
+from metrics import record_pool_wait
+
+
+def _async_database_url(url: str) -> str:
+    """Map a sync database URL to its async driver (aiosqlite/asyncpg)."""
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    if url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url
+
+
 # Database configuration
 DATABASE_URL = config("DATABASE_URL", default="sqlite:///./notes_app.db")
+ASYNC_DATABASE_URL = config(
+    "ASYNC_DATABASE_URL", default=_async_database_url(DATABASE_URL))
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=10, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=20, cast=int)
+
 
-# Create engine
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    """Let readers run concurrently with the single SQLite writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+# Sync engine: schema creation, migrations and scripts
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(DATABASE_URL, connect_args={
                            "check_same_thread": False})
+    event.listen(engine, "connect", _enable_sqlite_wal)
 else:
     engine = create_engine(DATABASE_URL)
 
+# Async engine: used by every request handler
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+    event.listen(async_engine.sync_engine, "connect", _enable_sqlite_wal)
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True
+    )
+
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -23,9 +68,10 @@ Base = declarative_base()
 # Dependency to get DB session
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        # Check a connection out up front so the wait for the pool is measured
+        started = time.perf_counter()
+        await db.connection()
+        record_pool_wait(time.perf_counter() - started)
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import hashlib
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Note, NoteDrawing
+
+# Configuration
+MAX_DRAWING_SIZE = 5 * 1024 * 1024  # 5MB decoded
+DEFAULT_DRAWING_TYPE = "image/png"
+
+DATA_URL_RE = re.compile(r"^data:(?P<type>[\w.+-]+/[\w.+-]+)?(?P<base64>;base64)?,(?P<data>.*)$", re.DOTALL)
+
+
+def parse_drawing_data(drawing_data: str) -> Tuple[bytes, str]:
+    """Decode a data URL (or bare base64) into bytes and a content type."""
+    content_type = DEFAULT_DRAWING_TYPE
+    payload = drawing_data.strip()
+    match = DATA_URL_RE.match(payload)
+    if match:
+        content_type = match.group("type") or "text/plain"
+        payload = match.group("data")
+        if not match.group("base64"):
+            return payload.encode(), content_type
+    try:
+        return base64.b64decode(payload, validate=True), content_type
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid drawing data")
+
+
+async def save_drawing(db: AsyncSession, note: Note, drawing_data: Optional[str]):
+    """Store, replace or (for empty data) remove a note's drawing."""
+    if not drawing_data:
+        await delete_drawings(db, [note.id])
+        note.drawing_size = None
+        note.drawing_hash = None
+        return
+
+    data, content_type = parse_drawing_data(drawing_data)
+    await store_drawing(db, note, data, content_type)
+
+
+async def store_drawing(db: AsyncSession, note: Note, data: bytes, content_type: str = DEFAULT_DRAWING_TYPE):
+    """Store or replace a note's drawing from raw image bytes; empty removes it."""
+    if not data:
+        await delete_drawings(db, [note.id])
+        note.drawing_size = None
+        note.drawing_hash = None
+        return
+    if len(data) > MAX_DRAWING_SIZE:
+        raise HTTPException(status_code=413, detail="Drawing too large")
+
+    digest = hashlib.sha256(data).hexdigest()
+    drawing = await db.get(NoteDrawing, note.id)
+    if drawing is None:
+        drawing = NoteDrawing(note_id=note.id)
+        db.add(drawing)
+    drawing.data = data
+    drawing.content_type = content_type
+    drawing.size = len(data)
+    drawing.sha256 = digest
+    drawing.updated_at = datetime.utcnow()
+
+    note.drawing_size = len(data)
+    note.drawing_hash = digest
+
+
+async def delete_drawings(db: AsyncSession, note_ids: List[int]):
+    """Remove the drawings of deleted notes."""
+    if note_ids:
+        await db.execute(
+            delete(NoteDrawing)
+            .where(NoteDrawing.note_id.in_(note_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def get_drawing_hash(db: AsyncSession, user_id: int, note_id: int) -> Optional[str]:
+    """Return the current drawing hash from the notes row (no blob read)."""
+    return await db.scalar(select(Note.drawing_hash).where(
+        Note.id == note_id, Note.user_id == user_id))
+
+
+async def get_drawing(db: AsyncSession, note_id: int) -> Optional[NoteDrawing]:
+    """Load the drawing blob of a note."""
+    return await db.get(NoteDrawing, note_id)
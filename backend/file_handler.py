@@ -1,23 +1,24 @@
+import hashlib
 import os
+import re
 import uuid
 import aiofiles
 from fastapi import UploadFile, HTTPException
+from fastapi.responses import JSONResponse
 from pathlib import Path
-# from PIL import Image  # Temporarily disabled for deployment
 import io
-from typing import Optional
-#         if img.mode in ('RGBA', 'P'):
-#             img = img.convert('RGB')
-#
-#         # Create thumbnail
-#         img.thumbnail((300, 300), Image.Resampling.LANCZOS)rom pathlib import Path
-# from PIL import Image  # Temporarily disabled for deployment
-import io
-from typing import Optional
+from typing import NamedTuple, Optional, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import record_upload
 
 # Configuration
 UPLOAD_DIR = Path("uploads")
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read and written per step
+# Room for multipart boundaries and part headers around the file itself
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+UPLOAD_PATH_PREFIX = "/upload/"
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
 ALLOWED_AUDIO_TYPES = {"audio/mpeg", "audio/wav",
                        "audio/ogg", "audio/mp4", "audio/webm"}
@@ -28,42 +29,104 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 (UPLOAD_DIR / "audio").mkdir(exist_ok=True)
 (UPLOAD_DIR / "thumbnails").mkdir(exist_ok=True)
 
+FILE_TYPES = {"images", "audio"}
+# Content-addressed names: <sha256><ext>; anything else is a legacy uuid name
+CONTENT_NAME_RE = re.compile(r"^(?P<sha256>[0-9a-f]{64})(?P<ext>\.[a-z0-9]{1,10})?$")
+# Resized image copies: thumbnails/<sha256>_<size>.<ext>
+DERIVATIVE_TYPE = "thumbnails"
+DERIVATIVE_NAME_RE = re.compile(r"^(?P<sha256>[0-9a-f]{64})_(?P<size>[a-z0-9]+)\.(?P<ext>webp|jpg)$")
+
+
+class StoredFile(NamedTuple):
+    url: str
+    sha256: str
+    size: int
+    file_type: str
+    extension: str
+    content_type: str
+
 
 class FileHandler:
     def __init__(self):
         self.base_url = os.getenv("BASE_URL", "http://localhost:8000")
 
-    async def save_file(self, file: UploadFile, file_type: str) -> str:
-        """Save uploaded file and return URL."""
-        # Validate file size
-        file.file.seek(0, 2)  # Seek to end
-        size = file.file.tell()
-        file.file.seek(0)  # Reset position
-
-        if size > MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
+    async def save_file(self, file: UploadFile, file_type: str) -> StoredFile:
+        """Save uploaded file under its content hash.
 
+        Identical bytes are stored once; a repeat upload just returns the
+        existing file's URL.
+        """
         # Validate content type
         if file_type == "images" and file.content_type not in ALLOWED_IMAGE_TYPES:
             raise HTTPException(status_code=400, detail="Invalid image type")
         elif file_type == "audio" and file.content_type not in ALLOWED_AUDIO_TYPES:
             raise HTTPException(status_code=400, detail="Invalid audio type")
 
-        # Generate unique filename
         file_extension = self._get_extension(file.filename, file.content_type)
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = UPLOAD_DIR / file_type / unique_filename
-
-        # Save file
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
 
-        # Create thumbnail for images
-        if file_type == "images":
-            await self._create_thumbnail(file_path, unique_filename)
-
-        return f"{self.base_url}/files/{file_type}/{unique_filename}"
+        # Save file; it only appears under its final name once complete
+        temp_path, digest, size = await self._stream_to_temp(file, UPLOAD_DIR / file_type)
+        record_upload(file_type, size)
+        filename = f"{digest}{file_extension}"
+        file_path = self.blob_path(file_type, digest, file_extension)
+        if file_path.exists():
+            temp_path.unlink()
+        else:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_path, file_path)
+
+        return StoredFile(self.file_url(file_type, filename), digest, size,
+                          file_type, file_extension, file.content_type)
+
+    def file_url(self, file_type: str, filename: str) -> str:
+        return f"{self.base_url}/files/{file_type}/{filename}"
+
+    def blob_path(self, file_type: str, sha256: str, extension: str = "") -> Path:
+        """Sharded location of a blob: <type>/ab/cd/abcd...<ext>."""
+        return UPLOAD_DIR / file_type / sha256[:2] / sha256[2:4] / f"{sha256}{extension}"
+
+    def derivative_path(self, filename: str) -> Path:
+        return UPLOAD_DIR / DERIVATIVE_TYPE / filename[:2] / filename[2:4] / filename
+
+    def resolve_path(self, file_type: str, filename: str) -> Optional[Path]:
+        """Map a /files/<type>/<name> pair to a path on disk, or None if invalid."""
+        if file_type == DERIVATIVE_TYPE:
+            if not DERIVATIVE_NAME_RE.match(filename):
+                return None
+            return self.derivative_path(filename)
+        if file_type not in FILE_TYPES or not filename or filename.startswith("."):
+            return None
+        if "/" in filename or "\\" in filename:
+            return None
+        match = CONTENT_NAME_RE.match(filename)
+        if match:
+            return self.blob_path(file_type, match.group("sha256"), match.group("ext") or "")
+        return UPLOAD_DIR / file_type / filename
+
+    async def _stream_to_temp(self, file: UploadFile, directory: Path) -> Tuple[Path, str, int]:
+        """Copy an upload to a temp file in chunks; return (path, sha256, size).
+
+        The form parser has already spooled the body by now (bounded by
+        UploadLimitMiddleware); this enforces the exact file size limit.
+        """
+        temp_path = directory / f".upload-{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > MAX_FILE_SIZE:
+                        raise HTTPException(status_code=413, detail="File too large")
+                    digest.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        return temp_path, digest.hexdigest(), size
 
     def delete_file(self, file_url: str) -> bool:
         """Delete file from storage."""
@@ -72,44 +135,33 @@ class FileHandler:
             filename = file_url.split("/")[-1]
             file_type = file_url.split("/")[-2]
 
-            file_path = UPLOAD_DIR / file_type / filename
+            file_path = self.resolve_path(file_type, filename)
+            if file_path is None:
+                return False
             if file_path.exists():
                 file_path.unlink()
 
-            # Delete thumbnail if exists
+            # Delete thumbnails if they exist
             if file_type == "images":
                 thumb_path = UPLOAD_DIR / "thumbnails" / f"thumb_{filename}"
                 if thumb_path.exists():
                     thumb_path.unlink()
+                match = CONTENT_NAME_RE.match(filename)
+                if match:
+                    digest = match.group("sha256")
+                    for derivative in self.derivative_path(digest).parent.glob(f"{digest}_*"):
+                        derivative.unlink()
 
             return True
         except Exception as e:
             print(f"Error deleting file: {e}")
             return False
 
-    async def _create_thumbnail(self, image_path: Path, filename: str):
-        """Create thumbnail for image."""
-        try:
-            with Image.open(image_path) as img:
-                # Convert RGBA to RGB if necessary
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-
-                # Create thumbnail
-                img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-
-                # Save thumbnail
-                thumb_path = UPLOAD_DIR / "thumbnails" / f"thumb_{filename}"
-                img.save(thumb_path, "JPEG", quality=85)
-        except Exception as e:
-            print(f"Error creating thumbnail: {e}")
-
     def _get_extension(self, filename: Optional[str], content_type: str) -> str:
-        """Get file extension from filename or content type."""
-        if filename and "." in filename:
-            return Path(filename).suffix.lower()
+        """Get file extension from content type, falling back to the filename.
 
-        # Fallback to content type
+        The content type comes first so identical uploads get the same name.
+        """
         type_map = {
             "image/jpeg": ".jpg",
             "image/png": ".png",
@@ -121,18 +173,75 @@ class FileHandler:
             "audio/mp4": ".mp4",
             "audio/webm": ".webm"
         }
-        return type_map.get(content_type, ".bin")
+        if content_type in type_map:
+            return type_map[content_type]
+        if filename and "." in filename:
+            suffix = Path(filename).suffix.lower()
+            if re.match(r"^\.[a-z0-9]{1,10}$", suffix):
+                return suffix
+        return ".bin"
+
+
+class UploadLimitMiddleware:
+    """Refuse upload bodies larger than MAX_FILE_SIZE before they are parsed.
+
+    Starlette reads and spools the whole multipart body before the endpoint
+    runs, so the limit is enforced on the raw request: by Content-Length up
+    front, and by counting received bytes for bodies sent without one.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int = MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(UPLOAD_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and (
+                not content_length.isdigit() or int(content_length) > self.max_body_size):
+            response = JSONResponse({"detail": "File too large"}, status_code=413,
+                                    headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # Propagates out of the form parser as a 413 response
+                    raise HTTPException(status_code=413, detail="File too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
 
 
 # Service instance
 file_handler = FileHandler()
 
 
-async def save_file(file: UploadFile, file_type: str) -> str:
+async def save_file(file: UploadFile, file_type: str) -> StoredFile:
     """Public function to save file."""
     return await file_handler.save_file(file, file_type)
 
 
+def content_hash(file_url: Optional[str]) -> Optional[str]:
+    """SHA-256 named by a content-addressed file URL (None for legacy URLs)."""
+    if not file_url:
+        return None
+    parts = file_url.rsplit("/", 2)
+    if len(parts) < 3 or parts[-2] not in FILE_TYPES:
+        return None
+    match = CONTENT_NAME_RE.match(parts[-1])
+    return match.group("sha256") if match else None
+
+
 def delete_file(file_url: str) -> bool:
     """Public function to delete file."""
     return file_handler.delete_file(file_url)
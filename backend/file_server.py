@@ -0,0 +1,146 @@
+import os
+import stat
+from email.utils import formatdate
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from decouple import config
+from fastapi import HTTPException, Request, Response
+from starlette.types import Receive, Scope, Send
+
+from file_handler import UPLOAD_DIR, CONTENT_NAME_RE, DERIVATIVE_NAME_RE
+from http_cache import make_etag, etag_matches, modified_since, parse_range, RangeNotSatisfiable
+
+# Configuration
+# Offload delivery to a front proxy, e.g. "X-Accel-Redirect" (nginx) or
+# "X-Sendfile" (Apache, lighttpd); empty serves files from this process.
+FILES_SENDFILE_HEADER = config("FILES_SENDFILE_HEADER", default="")
+# Internal location the proxy maps to UPLOAD_DIR (X-Accel-Redirect only)
+FILES_SENDFILE_PREFIX = config("FILES_SENDFILE_PREFIX", default="/protected-files/")
+
+IMMUTABLE_CACHE = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE = "private, no-cache"
+
+
+class FileRangeResponse(Response):
+    """Send a byte range of a file without loading it into memory.
+
+    Uses the ASGI zero-copy send extension (sendfile) when the server
+    offers it, otherwise streams fixed-size chunks.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int = 200,
+                 headers: Optional[dict] = None, media_type: Optional[str] = None,
+                 method: str = "GET"):
+        self.path = path
+        self.start = start
+        self.length = end - start + 1
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.send_header_only = method.upper() == "HEAD"
+        self.init_headers(headers)
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.send_header_only or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+            if remaining > 0:
+                # File shrank underneath us; end the body
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def serve_file(request: Request, path: Path, content_type: Optional[str] = None) -> Response:
+    """Answer a GET/HEAD for a stored file with validators, 304s and Range."""
+    try:
+        stat_result = path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    size = stat_result.st_size
+    if CONTENT_NAME_RE.match(path.name) or DERIVATIVE_NAME_RE.match(path.name):
+        # Content-addressed: the name is the validator and never changes
+        etag = make_etag(path.stem)
+        cache_control = IMMUTABLE_CACHE
+    else:
+        etag = make_etag(f"{stat_result.st_mtime_ns:x}-{size:x}")
+        cache_control = REVALIDATE_CACHE
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    # If-Modified-Since is only consulted without If-None-Match
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif not modified_since(request.headers.get("if-modified-since"), stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    media_type = content_type or guess_type(path.name)[0] or "application/octet-stream"
+
+    if FILES_SENDFILE_HEADER:
+        # The proxy handles Range and streams the file with sendfile(2)
+        relative = path.relative_to(UPLOAD_DIR).as_posix()
+        target = FILES_SENDFILE_PREFIX + relative \
+            if FILES_SENDFILE_HEADER.lower() == "x-accel-redirect" else os.path.abspath(path)
+        headers[FILES_SENDFILE_HEADER] = target
+        return Response(status_code=200, headers=headers, media_type=media_type)
+
+    start, end = 0, size - 1
+    status_code = 200
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            requested = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            raise HTTPException(
+                status_code=416, detail="Range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"})
+        if requested is not None:
+            start, end = requested
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    return FileRangeResponse(path, start, end, status_code=status_code, headers=headers,
+                             media_type=media_type, method=request.method)
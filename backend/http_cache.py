@@ -0,0 +1,82 @@
+import hashlib
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple
+
+
+def make_etag(value: str, weak: bool = False) -> str:
+    """Quote a validator as an ETag header value."""
+    return f'W/"{value}"' if weak else f'"{value}"'
+
+
+def version_etag(*parts) -> str:
+    """Weak ETag for a representation named by a version and its parameters."""
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return make_etag(digest, weak=True)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def modified_since(if_modified_since: Optional[str], last_modified: float) -> bool:
+    """Check If-Modified-Since against a Unix mtime (True if it changed)."""
+    if not if_modified_since:
+        return True
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+    if since is None:
+        return True
+    # HTTP dates have one-second resolution
+    return int(last_modified) > int(since.timestamp())
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised when a Range header lies entirely outside the resource."""
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range "bytes=" header into inclusive (start, end).
+
+    Returns None when the whole resource should be sent: no header, a unit
+    other than bytes, a malformed value or several ranges (which may be
+    ignored per RFC 9110).
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not first:
+            suffix = int(last)
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    # RangeNotSatisfiable is a ValueError; raise it outside the try above
+    if not first:
+        # Suffix range: the last N bytes (none exist in an empty file)
+        if suffix <= 0 or size == 0:
+            raise RangeNotSatisfiable(range_header)
+        return max(size - suffix, 0), size - 1
+    if start >= size:
+        raise RangeNotSatisfiable(range_header)
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
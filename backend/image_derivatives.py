@@ -0,0 +1,209 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from decouple import config, Csv
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import FileBlob, Note, NoteAttachment
+from file_handler import file_handler, content_hash, DERIVATIVE_TYPE
+from sync import next_change_seq
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional; without it no derivatives are made
+    Image = None
+
+# Configuration
+# name:max-edge pairs; "thumb" is exposed as the note's thumbnail_url
+IMAGE_DERIVATIVE_SIZES = config(
+    "IMAGE_DERIVATIVE_SIZES", default="thumb:320,medium:1280", cast=Csv())
+IMAGE_DERIVATIVE_FORMAT = config("IMAGE_DERIVATIVE_FORMAT", default="webp")  # webp or jpeg
+IMAGE_DERIVATIVE_QUALITY = config("IMAGE_DERIVATIVE_QUALITY", default=80, cast=int)
+IMAGE_DERIVATIVE_WORKERS = config(
+    "IMAGE_DERIVATIVE_WORKERS", default=os.cpu_count() or 2, cast=int)
+THUMBNAIL_SIZE = "thumb"
+
+
+def _parse_sizes(specs) -> Dict[str, int]:
+    sizes = {}
+    for spec in specs:
+        name, _, edge = spec.partition(":")
+        sizes[name.strip()] = int(edge)
+    return sizes
+
+
+def _render_derivatives(source: str, sha256: str, sizes: Dict[str, int],
+                        image_format: str, quality: int) -> Dict[str, str]:
+    """Write resized, EXIF-free copies of an image; runs in a worker process.
+
+    Returns size name -> derivative filename.
+    """
+    if image_format == "webp" and not features.check("webp"):
+        image_format = "jpeg"
+    extension = ".webp" if image_format == "webp" else ".jpg"
+
+    rendered = {}
+    with Image.open(source) as original:
+        # Apply the EXIF orientation, then drop all metadata
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        if image_format == "jpeg" and img.mode == "RGBA":
+            img = img.convert("RGB")
+
+        for name, edge in sizes.items():
+            copy = img.copy()
+            copy.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            filename = f"{sha256}_{name}{extension}"
+            path = file_handler.derivative_path(filename)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f".{filename}.tmp")
+            copy.save(temp_path, image_format.upper(), quality=quality)
+            os.replace(temp_path, path)
+            rendered[name] = filename
+    return rendered
+
+
+def derivative_urls(derivatives: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """Size name -> URL for a blob's derivatives."""
+    return {
+        name: file_handler.file_url(DERIVATIVE_TYPE, filename)
+        for name, filename in (derivatives or {}).items()
+    }
+
+
+class ImageDerivativePipeline:
+    """Renders image derivatives in a process pool after the upload returns."""
+
+    def __init__(self, workers: int = IMAGE_DERIVATIVE_WORKERS):
+        self.workers = workers
+        self.sizes = _parse_sizes(IMAGE_DERIVATIVE_SIZES)
+        self._executor = None
+
+    async def process(self, sha256: str):
+        """Render a blob's derivatives and attach them to notes that use it."""
+        if Image is None:
+            return
+        async with AsyncSessionLocal() as db:
+            blob = await db.get(FileBlob, sha256)
+            if blob is None or blob.derivatives:
+                return
+            source = file_handler.blob_path(blob.file_type, blob.sha256, blob.extension)
+
+        try:
+            loop = asyncio.get_running_loop()
+            rendered = await loop.run_in_executor(
+                self._get_executor(), _render_derivatives, str(source), sha256,
+                self.sizes, IMAGE_DERIVATIVE_FORMAT, IMAGE_DERIVATIVE_QUALITY)
+        except Exception as e:
+            print(f"Error creating image derivatives for {sha256}: {e}")
+            return
+
+        async with AsyncSessionLocal() as db:
+            blob = await db.get(FileBlob, sha256)
+            if blob is None:
+                # Released while rendering
+                for filename in rendered.values():
+                    file_handler.derivative_path(filename).unlink(missing_ok=True)
+                return
+            blob.derivatives = rendered
+            await self._update_notes(db, sha256, derivative_urls(rendered))
+            await db.commit()
+
+    async def _update_notes(self, db: AsyncSession, sha256: str, urls: Dict[str, str]):
+        """Record derivative URLs on notes already showing this image."""
+        rows = (await db.execute(
+            select(Note.id, Note.user_id, Note.image_url)
+            .join(NoteAttachment, NoteAttachment.note_id == Note.id)
+            .where(NoteAttachment.sha256 == sha256))).all()
+        note_ids_by_user = {}
+        for row in rows:
+            if row.image_url and sha256 in row.image_url:
+                note_ids_by_user.setdefault(row.user_id, []).append(row.id)
+        for user_id, note_ids in note_ids_by_user.items():
+            # Clients see the new thumbnail through delta sync
+            change_seq = await next_change_seq(db, user_id)
+            await db.execute(
+                update(Note)
+                .where(Note.id.in_(note_ids))
+                .values(thumbnail_url=urls.get(THUMBNAIL_SIZE), image_variants=urls,
+                        change_seq=change_seq)
+                .execution_options(synchronize_session=False)
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+
+# Service instance
+image_pipeline = ImageDerivativePipeline()
+
+
+async def generate_derivatives(sha256: str):
+    """Public function to render derivatives for an uploaded image."""
+    await image_pipeline.process(sha256)
+
+
+async def apply_image_derivatives(db: AsyncSession, note_id: int, image_url: Optional[str]):
+    """Set a note's thumbnail_url/image_variants from its image's blob."""
+    derivatives = None
+    digest = content_hash(image_url)
+    if digest:
+        derivatives = await db.scalar(
+            select(FileBlob.derivatives).where(FileBlob.sha256 == digest))
+    urls = derivative_urls(derivatives)
+    await db.execute(
+        update(Note)
+        .where(Note.id == note_id)
+        .values(thumbnail_url=urls.get(THUMBNAIL_SIZE), image_variants=urls or None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def catch_up_image_derivatives(db: AsyncSession, note_ids: List[int]):
+    """Apply derivatives that finished rendering while these notes were written.
+
+    The pipeline only updates notes whose attachment it can already see, so
+    a note committed just after its image was rendered would keep a null
+    thumbnail_url. Call after commit; commits again if anything changed.
+    """
+    if not note_ids:
+        return
+    rows = (await db.execute(
+        select(Note.id, Note.user_id, Note.image_url, FileBlob.sha256, FileBlob.derivatives)
+        .join(NoteAttachment, NoteAttachment.note_id == Note.id)
+        .join(FileBlob, FileBlob.sha256 == NoteAttachment.sha256)
+        .where(Note.id.in_(note_ids), Note.thumbnail_url.is_(None),
+               FileBlob.derivatives.is_not(None)))).all()
+    rows = [row for row in rows if content_hash(row.image_url) == row.sha256]
+    if not rows:
+        return
+    change_seqs = {}
+    for row in rows:
+        if row.user_id not in change_seqs:
+            change_seqs[row.user_id] = await next_change_seq(db, row.user_id)
+        urls = derivative_urls(row.derivatives)
+        await db.execute(
+            update(Note)
+            .where(Note.id == row.id)
+            .values(thumbnail_url=urls.get(THUMBNAIL_SIZE), image_variants=urls,
+                    change_seq=change_seqs[row.user_id])
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+
+
+def shutdown_image_pipeline():
+    """Stop the derivative workers on application shutdown."""
+    image_pipeline.shutdown()
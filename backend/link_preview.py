@@ -1,80 +1,558 @@
+import asyncio
+import codecs
+import importlib.util
+import ipaddress
+import socket
 import httpx
 from bs4 import BeautifulSoup
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from html.parser import HTMLParser
 from urllib.parse import urljoin, urlparse
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 import re
 from datetime import datetime, timedelta
+from decouple import config
+from sqlalchemy import bindparam, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from schemas import LinkPreviewResponse
 from models import LinkPreview
-from database import SessionLocal
+from database import AsyncSessionLocal
+from metrics import record_link_preview_lookup
+
+# Configuration
+LINK_PREVIEW_CACHE_DAYS = config("LINK_PREVIEW_CACHE_DAYS", default=7, cast=int)
+# Failed fetches are cached briefly so a dead site is not hammered
+LINK_PREVIEW_ERROR_TTL = config("LINK_PREVIEW_ERROR_TTL", default=900, cast=int)  # seconds
+# Expired previews may be served this long while a refresh runs
+LINK_PREVIEW_STALE_DAYS = config("LINK_PREVIEW_STALE_DAYS", default=30, cast=int)
+# Popular previews refresh in the background during the last part of their TTL
+LINK_PREVIEW_POPULAR_HITS = config("LINK_PREVIEW_POPULAR_HITS", default=5, cast=int)
+LINK_PREVIEW_REFRESH_AHEAD = config("LINK_PREVIEW_REFRESH_AHEAD", default=0.2, cast=float)  # fraction of TTL
+# Hit counters are flushed and cold expired rows purged this often
+LINK_PREVIEW_MAINTENANCE_INTERVAL = config("LINK_PREVIEW_MAINTENANCE_INTERVAL", default=600, cast=int)  # seconds
+LINK_PREVIEW_TIMEOUT = config("LINK_PREVIEW_TIMEOUT", default=10.0, cast=float)
+# Shared client connection pool
+LINK_PREVIEW_MAX_CONNECTIONS = config("LINK_PREVIEW_MAX_CONNECTIONS", default=100, cast=int)
+LINK_PREVIEW_MAX_KEEPALIVE = config("LINK_PREVIEW_MAX_KEEPALIVE", default=20, cast=int)
+LINK_PREVIEW_PER_HOST_CONNECTIONS = config("LINK_PREVIEW_PER_HOST_CONNECTIONS", default=4, cast=int)
+# Page fetches in flight across all hosts
+LINK_PREVIEW_MAX_CONCURRENT_FETCHES = config("LINK_PREVIEW_MAX_CONCURRENT_FETCHES", default=32, cast=int)
+# Batch endpoint: URLs per request and how long to wait for slow hosts
+MAX_BATCH_PREVIEWS = 100
+LINK_PREVIEW_BATCH_DEADLINE = config("LINK_PREVIEW_BATCH_DEADLINE", default=3.0, cast=float)
+# Most bytes of a page read while looking for metadata
+LINK_PREVIEW_MAX_BYTES = config("LINK_PREVIEW_MAX_BYTES", default=256 * 1024, cast=int)
+# In-process LRU in front of the link_previews table
+LINK_PREVIEW_MEMORY_CACHE_SIZE = config("LINK_PREVIEW_MEMORY_CACHE_SIZE", default=2048, cast=int)
+# Background fetches of previews missing from note listings; URLs beyond
+# the queue size are dropped and picked up by a later listing
+LINK_PREVIEW_PREFETCH_QUEUE_SIZE = config("LINK_PREVIEW_PREFETCH_QUEUE_SIZE", default=1000, cast=int)
+LINK_PREVIEW_PREFETCH_WORKERS = config("LINK_PREVIEW_PREFETCH_WORKERS", default=4, cast=int)
+
+# Redirects followed per fetch; every hop must pass the public address check
+LINK_PREVIEW_MAX_REDIRECTS = config("LINK_PREVIEW_MAX_REDIRECTS", default=5, cast=int)
+# Skips the public address check; only for local testing and benchmarks
+LINK_PREVIEW_ALLOW_PRIVATE_HOSTS = config("LINK_PREVIEW_ALLOW_PRIVATE_HOSTS", default=False, cast=bool)
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class UnsafeURLError(ValueError):
+    """A preview URL that names a private, loopback or otherwise internal host."""
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_public_url(url: str):
+    """Refuse URLs whose host resolves to anything but public addresses.
+
+    Previews are fetched server-side for any URL typed into a note, so
+    loopback, RFC 1918, link-local (cloud metadata) and reserved targets
+    must never be reachable through them.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise UnsafeURLError(f"Unsupported URL: {url}")
+    if LINK_PREVIEW_ALLOW_PRIVATE_HOSTS:
+        return
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parsed.hostname, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise UnsafeURLError(f"Cannot resolve {parsed.hostname}: {e}")
+    if not infos or not all(_is_public_address(info[4][0]) for info in infos):
+        raise UnsafeURLError(f"Refusing to fetch non-public host {parsed.hostname}")
+
+
+class HeadMetadataParser(HTMLParser):
+    """Incremental parser that collects <title> and <meta> tags of <head>.
+
+    Feed it chunks as they arrive; head_complete turns true at </head> or
+    the first body content, after which the rest of the page is not needed.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title: Optional[str] = None
+        self.head_complete = False
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.head_complete:
+            return
+        if tag == "meta":
+            attrs = dict(attrs)
+            key = attrs.get("property") or attrs.get("name")
+            content = attrs.get("content")
+            if key and content and content.strip():
+                self.meta.setdefault(key.strip().lower(), content.strip())
+        elif tag == "title" and self.title is None:
+            self._title_parts = []
+        elif tag == "body":
+            self.head_complete = True
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title_parts is not None:
+            self.title = "".join(self._title_parts).strip() or None
+            self._title_parts = None
+        elif tag == "head":
+            self.head_complete = True
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def get(self, properties: list) -> Optional[str]:
+        for prop in properties:
+            if prop in self.meta:
+                return self.meta[prop]
+        return None
+
+
+class CachedPreview:
+    """A preview held in memory with its expiry and refresh-ahead point."""
+    __slots__ = ("preview", "expires_at", "refresh_at", "hit_count")
+
+    def __init__(self, preview: LinkPreviewResponse, expires_at: datetime,
+                 refresh_at: Optional[datetime] = None, hit_count: int = 0):
+        self.preview = preview
+        self.expires_at = expires_at
+        self.refresh_at = refresh_at
+        self.hit_count = hit_count
+
+
+class PreviewMemoryCache:
+    """Small LRU of previews with their database expiry.
+
+    Only touched from the event loop thread, so no lock is needed.
+    """
+
+    def __init__(self, max_size: int = LINK_PREVIEW_MEMORY_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, CachedPreview]" = OrderedDict()
+
+    def get(self, url: str) -> Optional[CachedPreview]:
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        if entry.expires_at <= datetime.utcnow():
+            del self._entries[url]
+            return None
+        self._entries.move_to_end(url)
+        return entry
+
+    def put(self, url: str, entry: CachedPreview):
+        if self.max_size <= 0:
+            return
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
 
 
 class LinkPreviewService:
     def __init__(self):
-        self.timeout = 10.0
-        self.max_content_length = 5 * 1024 * 1024  # 5MB
+        self.timeout = LINK_PREVIEW_TIMEOUT
+        self.max_read_bytes = LINK_PREVIEW_MAX_BYTES
         self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        self.memory_cache = PreviewMemoryCache()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._fetch_limit = asyncio.Semaphore(LINK_PREVIEW_MAX_CONCURRENT_FETCHES)
+        # host -> [semaphore, users]; hosts leave the map when idle
+        self._host_limits: Dict[str, list] = {}
+        # key -> task of the fetch in progress (single-flight)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Cache hits not yet written to link_previews.hit_count
+        self._hits: Counter = Counter()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._prefetch_queue: Optional[asyncio.Queue] = None
+        self._prefetch_workers: List[asyncio.Task] = []
+        # URLs waiting in the prefetch queue
+        self._queued: set = set()
 
     async def fetch_preview(self, url: str) -> LinkPreviewResponse:
         """Fetch link preview with caching."""
-        # Check cache first
-        db = SessionLocal()
+        entry = self.memory_cache.get(url)
+        if entry is not None:
+            record_link_preview_lookup("memory")
+            return self._serve(url, entry)
+
+        # Shielded so one caller disconnecting does not cancel the others
+        return await asyncio.shield(self._single_flight(url, self._load_preview))
+
+    async def fetch_previews(self, urls: List[str], deadline: float = LINK_PREVIEW_BATCH_DEADLINE):
+        """Resolve many URLs at once; returns (previews by URL, pending URLs).
+
+        Cache hits cost one IN query; misses are fetched concurrently and
+        whatever is not done by the deadline keeps fetching in the
+        background and is reported as pending.
+        """
+        urls = list(dict.fromkeys(urls))
+        previews = await self.cached_previews(urls)
+
+        tasks = {
+            url: self._single_flight(url, self._refresh_preview)
+            for url in urls if url not in previews
+        }
+        for _ in tasks:
+            record_link_preview_lookup("miss")
+        if tasks:
+            await asyncio.wait(list(tasks.values()), timeout=deadline)
+        pending = []
+        for url, task in tasks.items():
+            if not task.done():
+                pending.append(url)
+            elif task.exception() is None:
+                previews[url] = task.result()
+        return previews, pending
+
+    async def cached_previews(self, urls: List[str]) -> Dict[str, LinkPreviewResponse]:
+        """Previews already cached for urls: memory first, then one IN query."""
+        previews: Dict[str, LinkPreviewResponse] = {}
+        for url in urls:
+            entry = self.memory_cache.get(url)
+            if entry is not None:
+                record_link_preview_lookup("memory")
+                previews[url] = self._serve(url, entry)
+
+        missing = [url for url in urls if url not in previews]
+        if missing:
+            async with AsyncSessionLocal() as db:
+                rows = await db.scalars(select(LinkPreview).where(
+                    LinkPreview.url.in_(missing),
+                    LinkPreview.cache_expiry > datetime.utcnow() - timedelta(days=LINK_PREVIEW_STALE_DAYS)))
+                for row in rows:
+                    preview = self._serve_row(row)
+                    if preview is not None:
+                        previews[row.url] = preview
+        return previews
+
+    def prefetch(self, urls: List[str]):
+        """Queue background fetches without waiting; full queue drops URLs."""
+        if self._prefetch_queue is None:
+            return
+        for url in urls:
+            if url in self._queued or url in self._inflight \
+                    or urlparse(url).scheme not in ("http", "https"):
+                continue
+            try:
+                self._prefetch_queue.put_nowait(url)
+            except asyncio.QueueFull:
+                break
+            self._queued.add(url)
+
+    async def _prefetch_worker(self):
+        while True:
+            url = await self._prefetch_queue.get()
+            try:
+                await self._single_flight(url, self._load_preview)
+            except Exception as e:
+                print(f"Link preview prefetch failed for {url}: {e}")
+            finally:
+                self._queued.discard(url)
+                self._prefetch_queue.task_done()
+
+    def _single_flight(self, url: str, load, key: Optional[str] = None) -> asyncio.Task:
+        """Return the task loading url, starting one if none is running."""
+        key = key or url
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load(url))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _refresh_in_background(self, url: str):
+        self._single_flight(url, self._refresh_preview, key=f"refresh:{url}")
+
+    def _serve(self, url: str, entry: CachedPreview) -> LinkPreviewResponse:
+        """Count a cache hit and start a refresh-ahead if one is due."""
+        self._hits[url] += 1
+        entry.hit_count += 1
+        if entry.refresh_at is not None and entry.hit_count >= LINK_PREVIEW_POPULAR_HITS \
+                and entry.refresh_at <= datetime.utcnow():
+            entry.refresh_at = None
+            self._refresh_in_background(url)
+        return entry.preview
+
+    def _serve_row(self, row: LinkPreview) -> Optional[LinkPreviewResponse]:
+        """Serve a cached row: fresh, or stale while a refresh runs.
+
+        Returns None when the row cannot be used (an expired failure).
+        """
+        preview = LinkPreviewResponse(
+            url=row.url,
+            title=row.title,
+            description=row.description,
+            image=row.image_url,
+            site_name=row.site_name
+        )
+        if row.cache_expiry > datetime.utcnow():
+            record_link_preview_lookup("database")
+            entry = self._remember(row.url, preview, row.cache_expiry, row.hit_count,
+                                   refresh_ahead=not row.is_error)
+            return self._serve(row.url, entry)
+        if row.is_error:
+            return None
+        # Stale-while-revalidate
+        record_link_preview_lookup("stale")
+        self._hits[row.url] += 1
+        self._refresh_in_background(row.url)
+        return preview
+
+    def _remember(self, url: str, preview: LinkPreviewResponse, expires_at: datetime,
+                  hit_count: int = 0, refresh_ahead: bool = True) -> CachedPreview:
+        refresh_at = None
+        if refresh_ahead:
+            ttl = timedelta(days=LINK_PREVIEW_CACHE_DAYS)
+            refresh_at = expires_at - ttl * LINK_PREVIEW_REFRESH_AHEAD
+        entry = CachedPreview(preview, expires_at, refresh_at, hit_count)
+        self.memory_cache.put(url, entry)
+        return entry
+
+    async def _refresh_preview(self, url: str) -> LinkPreviewResponse:
+        """Fetch and cache without consulting the database first."""
         try:
-            cached = db.query(LinkPreview).filter(
-                LinkPreview.url == url).first()
-            if cached and cached.cache_expiry > datetime.utcnow():
-                return LinkPreviewResponse(
-                    url=cached.url,
-                    title=cached.title,
-                    description=cached.description,
-                    image=cached.image_url,
-                    site_name=cached.site_name
-                )
-        finally:
-            db.close()
-
-        # Fetch fresh data
-        preview_data = await self._scrape_url(url)
-
-        # Cache the result
+            preview_data = await self._scrape_url(url)
+        except Exception as e:
+            print(f"Link preview fetch failed for {url}: {e}")
+            return await self._cache_failure(url)
         await self._cache_preview(url, preview_data)
-
         return preview_data
 
-    async def _scrape_url(self, url: str) -> LinkPreviewResponse:
-        """Scrape URL for metadata."""
+    async def _load_preview(self, url: str) -> LinkPreviewResponse:
+        # Check cache first
+        async with AsyncSessionLocal() as db:
+            cached = await db.scalar(
+                select(LinkPreview).where(LinkPreview.url == url))
+            if cached and cached.cache_expiry > datetime.utcnow() - timedelta(days=LINK_PREVIEW_STALE_DAYS):
+                preview = self._serve_row(cached)
+                if preview is not None:
+                    return preview
+
+        # Fetch fresh data and cache the result
+        record_link_preview_lookup("miss")
+        return await self._refresh_preview(url)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Long-lived client so connections, DNS and TLS sessions are reused."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers={"User-Agent": self.user_agent},
+                # Redirects are followed by _open, which checks every hop
+                follow_redirects=False,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=LINK_PREVIEW_MAX_CONNECTIONS,
+                    max_keepalive_connections=LINK_PREVIEW_MAX_KEEPALIVE,
+                ),
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _fetch_slot(self, url: str):
+        """Hold a global and a per-host fetch slot."""
+        host = urlparse(url).netloc.lower()
+        entry = self._host_limits.get(host)
+        if entry is None:
+            entry = self._host_limits[host] = [asyncio.Semaphore(LINK_PREVIEW_PER_HOST_CONNECTIONS), 0]
+        entry[1] += 1
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                headers = {"User-Agent": self.user_agent}
-                response = await client.get(url, headers=headers, follow_redirects=True)
+            async with entry[0], self._fetch_limit:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._host_limits[host]
+
+    async def close(self):
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        for worker in self._prefetch_workers:
+            worker.cancel()
+        self._prefetch_workers = []
+        self._prefetch_queue = None
+        self._queued.clear()
+        await self.flush_hits()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def start_maintenance(self):
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.ensure_future(self._maintenance_loop())
+        if self._prefetch_queue is None:
+            self._prefetch_queue = asyncio.Queue(maxsize=LINK_PREVIEW_PREFETCH_QUEUE_SIZE)
+            self._prefetch_workers = [
+                asyncio.ensure_future(self._prefetch_worker())
+                for _ in range(LINK_PREVIEW_PREFETCH_WORKERS)
+            ]
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(LINK_PREVIEW_MAINTENANCE_INTERVAL)
+            try:
+                await self.flush_hits()
+                await self.purge_expired()
+            except Exception as e:
+                print(f"Link preview maintenance failed: {e}")
+
+    async def flush_hits(self):
+        """Write accumulated hit counts and access times in one statement."""
+        if not self._hits:
+            return
+        hits, self._hits = self._hits, Counter()
+        table = LinkPreview.__table__
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(table)
+                .where(table.c.url == bindparam("hit_url"))
+                .values(hit_count=table.c.hit_count + bindparam("hits"),
+                        last_accessed=datetime.utcnow()),
+                [{"hit_url": url, "hits": count} for url, count in hits.items()])
+            await db.commit()
+
+    async def purge_expired(self) -> int:
+        """Delete expired rows that are past the stale window or gone cold."""
+        now = datetime.utcnow()
+        cold_before = now - timedelta(days=LINK_PREVIEW_STALE_DAYS)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(LinkPreview)
+                .where(
+                    LinkPreview.cache_expiry < now,
+                    or_(
+                        LinkPreview.is_error,
+                        LinkPreview.cache_expiry < cold_before,
+                        func.coalesce(LinkPreview.last_accessed, LinkPreview.created_at) < cold_before,
+                    ))
+                .execution_options(synchronize_session=False))
+            await db.commit()
+        return result.rowcount
 
+    async def _scrape_url(self, url: str) -> LinkPreviewResponse:
+        """Scrape URL for metadata; raises if the page cannot be used."""
+        async with self._fetch_slot(url):
+            async with self._open(url) as response:
                 if response.status_code != 200:
                     raise Exception(f"HTTP {response.status_code}")
 
-                # Check content length
-                content_length = response.headers.get("content-length")
-                if content_length and int(content_length) > self.max_content_length:
-                    raise Exception("Content too large")
-
                 content_type = response.headers.get("content-type", "")
                 if not content_type.startswith("text/html"):
                     raise Exception("Not an HTML page")
 
-                html = response.text
-                soup = BeautifulSoup(html, 'html.parser')
+                parser, html = await self._read_head(response)
+
+        # Head metadata is enough unless the description must come
+        # from the body; then parse what was read the slow way
+        if parser.get(["og:description", "twitter:description", "description"]):
+            return self._metadata_from_head(parser, url)
+        soup = BeautifulSoup(html, 'html.parser')
+        return self._extract_metadata(soup, url)
+
+    @asynccontextmanager
+    async def _open(self, url: str):
+        """Stream a GET of url, following redirects only to public hosts."""
+        client = self._get_client()
+        for _ in range(LINK_PREVIEW_MAX_REDIRECTS + 1):
+            await check_public_url(url)
+            response = await client.send(client.build_request("GET", url), stream=True)
+            if not response.is_redirect:
+                try:
+                    yield response
+                finally:
+                    await response.aclose()
+                return
+            await response.aclose()
+            url = urljoin(url, response.headers["location"])
+        raise Exception("Too many redirects")
+
+    def _fallback_preview(self, url: str) -> LinkPreviewResponse:
+        """Basic info shown when a page cannot be scraped."""
+        return LinkPreviewResponse(
+            url=url,
+            title=self._get_title_from_url(url),
+            description=f"Preview of {urlparse(url).netloc}",
+            image=None,
+            site_name=urlparse(url).netloc
+        )
 
-                return self._extract_metadata(soup, url)
+    async def _read_head(self, response: httpx.Response) -> Tuple[HeadMetadataParser, str]:
+        """Stream the body until <head> is parsed or the byte budget is spent.
 
-        except Exception as e:
-            # Return basic info if scraping fails
-            return LinkPreviewResponse(
-                url=url,
-                title=self._get_title_from_url(url),
-                description=f"Preview of {urlparse(url).netlify}",
-                image=None,
-                site_name=urlparse(url).netloc
-            )
+        Returns the parser and the text read so far; the rest of the body is
+        never downloaded.
+        """
+        try:
+            decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        parser = HeadMetadataParser()
+        parts = []
+        received = 0
+        async for chunk in response.aiter_bytes():
+            chunk = chunk[:self.max_read_bytes - received]
+            received += len(chunk)
+            text = decoder.decode(chunk)
+            parts.append(text)
+            parser.feed(text)
+            if received >= self.max_read_bytes:
+                break
+            if parser.head_complete and parser.get(["og:description", "twitter:description", "description"]):
+                break
+        parser.close()
+        return parser, "".join(parts)
+
+    def _metadata_from_head(self, parser: HeadMetadataParser, url: str) -> LinkPreviewResponse:
+        """Build a preview from <head> metadata alone."""
+        title = parser.get(["og:title", "twitter:title"]) or parser.title or self._get_title_from_url(url)
+        image = parser.get(["og:image", "twitter:image"])
+        return LinkPreviewResponse(
+            url=url,
+            title=title,
+            description=parser.get(["og:description", "twitter:description", "description"]),
+            image=urljoin(url, image) if image else None,
+            site_name=parser.get(["og:site_name"]) or urlparse(url).netloc
+        )
 
     def _extract_metadata(self, soup: BeautifulSoup, url: str) -> LinkPreviewResponse:
         """Extract metadata from HTML."""
@@ -156,40 +634,80 @@ class LinkPreviewService:
 
     async def _cache_preview(self, url: str, preview: LinkPreviewResponse):
         """Cache preview data."""
-        db = SessionLocal()
-        try:
-            # Check if exists
-            existing = db.query(LinkPreview).filter(
-                LinkPreview.url == url).first()
-
-            cache_expiry = datetime.utcnow() + timedelta(days=7)  # Cache for 7 days
-
-            if existing:
-                # Update existing
-                existing.title = preview.title
-                existing.description = preview.description
-                existing.image_url = preview.image
-                existing.site_name = preview.site_name
-                existing.last_updated = datetime.utcnow()
-                existing.cache_expiry = cache_expiry
-            else:
-                # Create new
-                link_preview = LinkPreview(
-                    url=url,
-                    title=preview.title,
-                    description=preview.description,
-                    image_url=preview.image,
-                    site_name=preview.site_name,
-                    cache_expiry=cache_expiry
-                )
-                db.add(link_preview)
-
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            print(f"Error caching preview: {e}")
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            try:
+                await self._store_preview(db, url, preview)
+            except Exception as e:
+                await db.rollback()
+                print(f"Error caching preview: {e}")
+
+    async def _cache_failure(self, url: str) -> LinkPreviewResponse:
+        """Negative-cache a failed fetch for LINK_PREVIEW_ERROR_TTL.
+
+        A previously good preview keeps its content (served stale) and is
+        only retried after the error TTL.
+        """
+        retry_at = datetime.utcnow() + timedelta(seconds=LINK_PREVIEW_ERROR_TTL)
+        async with AsyncSessionLocal() as db:
+            try:
+                existing = await db.scalar(
+                    select(LinkPreview).where(LinkPreview.url == url))
+                if existing is not None and not existing.is_error:
+                    existing.cache_expiry = retry_at
+                    await db.commit()
+                    preview = LinkPreviewResponse(
+                        url=existing.url,
+                        title=existing.title,
+                        description=existing.description,
+                        image=existing.image_url,
+                        site_name=existing.site_name
+                    )
+                    self._remember(url, preview, retry_at, existing.hit_count, refresh_ahead=False)
+                    return preview
+                preview = self._fallback_preview(url)
+                await self._store_preview(db, url, preview, is_error=True, cache_expiry=retry_at)
+            except Exception as e:
+                await db.rollback()
+                print(f"Error caching preview: {e}")
+                preview = self._fallback_preview(url)
+        return preview
+
+    async def _store_preview(self, db: AsyncSession, url: str, preview: LinkPreviewResponse,
+                             is_error: bool = False, cache_expiry: Optional[datetime] = None):
+        """Insert or update the cached row for url."""
+        # Check if exists
+        existing = await db.scalar(
+            select(LinkPreview).where(LinkPreview.url == url))
+
+        if cache_expiry is None:
+            cache_expiry = datetime.utcnow() + timedelta(days=LINK_PREVIEW_CACHE_DAYS)
+
+        if existing:
+            # Update existing
+            existing.title = preview.title
+            existing.description = preview.description
+            existing.image_url = preview.image
+            existing.site_name = preview.site_name
+            existing.last_updated = datetime.utcnow()
+            existing.cache_expiry = cache_expiry
+            existing.is_error = is_error
+            hit_count = existing.hit_count or 0
+        else:
+            # Create new
+            link_preview = LinkPreview(
+                url=url,
+                title=preview.title,
+                description=preview.description,
+                image_url=preview.image,
+                site_name=preview.site_name,
+                cache_expiry=cache_expiry,
+                is_error=is_error
+            )
+            db.add(link_preview)
+            hit_count = 0
+
+        await db.commit()
+        self._remember(url, preview, cache_expiry, hit_count, refresh_ahead=not is_error)
 
 
 # Service instance
@@ -199,3 +717,31 @@ link_service = LinkPreviewService()
 async def get_link_preview(url: str) -> LinkPreviewResponse:
     """Public function to get link preview."""
     return await link_service.fetch_preview(url)
+
+
+async def get_link_previews(urls: List[str], deadline: float = LINK_PREVIEW_BATCH_DEADLINE):
+    """Public function to resolve many link previews at once."""
+    return await link_service.fetch_previews(urls, deadline)
+
+
+async def get_cached_link_previews(urls: List[str]) -> Dict[str, LinkPreviewResponse]:
+    """Public function to look up cached previews; misses are fetched in the background."""
+    urls = list(dict.fromkeys(url for url in urls if url))
+    previews = await link_service.cached_previews(urls)
+    link_service.prefetch([url for url in urls if url not in previews])
+    return previews
+
+
+def prefetch_link_previews(urls: List[str]):
+    """Public function to warm the preview cache in the background."""
+    link_service.prefetch(list(dict.fromkeys(urls)))
+
+
+def start_link_preview_maintenance():
+    """Start prefetch workers and the periodic hit flush and purge on application startup."""
+    link_service.start_maintenance()
+
+
+async def close_link_preview_client():
+    """Close pooled connections on application shutdown."""
+    await link_service.close()
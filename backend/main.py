@@ -1,38 +1,71 @@
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Query, Header, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 import os
+import secrets
 from typing import List, Optional
 import uvicorn
 
-from database import get_db, engine, Base
+from database import get_db, engine, async_engine, Base, AsyncSessionLocal
 from models import Note, User, Label
 from schemas import (
-    NoteCreate, NoteUpdate, NoteResponse,
+    NoteCreate, NoteUpdate, NoteResponse, NoteListResponse, NoteFilters,
     UserCreate, UserLogin, UserResponse,
+    NoteSearchResponse, NoteChangesResponse, NoteBatchRequest, NoteBatchResponse,
     LabelCreate, LabelResponse,
-    LinkPreviewResponse,
+    LinkPreviewResponse, LinkPreviewBatchRequest, LinkPreviewBatchResponse, SignedFileUrlResponse,
     ForgotPasswordRequest, ResetPasswordRequest, MessageResponse
 )
 from auth import (
-    get_current_user, create_access_token, verify_password, get_password_hash,
+    get_current_user, get_current_user_or_signed_url, sign_file_url, create_user_access_token, verify_and_update_password, get_password_hash,
+    invalidate_user, shutdown_hash_pool, UserPrincipal,
     create_password_reset_token, verify_password_reset_token, send_password_reset_email,
     PASSWORD_RESET_EXPIRE_MINUTES
 )
-from link_preview import get_link_preview
-from file_handler import save_file, delete_file
+from link_preview import (
+    get_link_preview, get_link_previews, get_cached_link_previews, prefetch_link_previews,
+    start_link_preview_maintenance, close_link_preview_client,
+    MAX_BATCH_PREVIEWS, LINK_PREVIEW_BATCH_DEADLINE
+)
+from search import create_search_index, search_notes
+from note_query import list_notes, resolve_fields, resolve_sort, InvalidCursor
+from migrations import run_migrations
+from sync import (
+    record_note_change, record_note_deletion, clear_tombstones, get_changes,
+    get_change_seq, next_change_seq
+)
+from batch import apply_batch
+from drawings import save_drawing, store_drawing, delete_drawings, get_drawing, get_drawing_hash, MAX_DRAWING_SIZE
+from http_cache import make_etag, etag_matches, version_etag
+from file_handler import file_handler, save_file, UploadLimitMiddleware
+from attachments import (
+    register_upload, sync_note_files, release_note_files, purge_files, get_readable_file,
+    start_upload_reaper, stop_upload_reaper
+)
+from file_server import serve_file
+from image_derivatives import (
+    generate_derivatives, apply_image_derivatives, catch_up_image_derivatives, shutdown_image_pipeline
+)
+from note_links import extract_links, sync_note_links, delete_note_links
+from http_encoding import DefaultJSONResponse, CompressionMiddleware, json_response
+from metrics import MetricsMiddleware, instrument_engine, render_metrics, METRICS_TOKEN
+from profiling import ProfilingMiddleware, profile_engine
 
 app = FastAPI(
     title="Notes App API",
     description="FastAPI backend for React Notes App with themes and link previews",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultJSONResponse
 )
 
 # Create tables (with error handling)
 try:
     Base.metadata.create_all(bind=engine)
+    run_migrations()
+    create_search_index()
     print("✅ Database tables created successfully")
 except Exception as e:
     print(f"⚠️ Database connection issue: {e}")
@@ -58,6 +91,11 @@ production_origins = os.getenv("ALLOWED_ORIGINS", "").split(",")
 allowed_origins.extend([origin.strip()
                        for origin in production_origins if origin.strip()])
 
+# Innermost, so profiles cover the handler rather than compression
+app.add_middleware(ProfilingMiddleware)
+# Oversized uploads are refused before the form is parsed
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -66,6 +104,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+profile_engine(engine)
+profile_engine(async_engine.sync_engine)
+
 security = HTTPBearer()
 
 
@@ -76,6 +121,16 @@ async def startup_event():
     print(f"🌐 Port: {os.getenv('PORT', '8000')}")
     print(
         f"🔗 Allowed Origins: {os.getenv('ALLOWED_ORIGINS', 'localhost only')}")
+    start_link_preview_maintenance()
+    start_upload_reaper()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_hash_pool()
+    stop_upload_reaper()
+    shutdown_image_pipeline()
+    await close_link_preview_client()
 
 
 @app.get("/")
@@ -88,8 +143,8 @@ async def health_check():
     """Health check endpoint for Railway deployment."""
     try:
         # Test database connection
-        db = next(get_db())
-        db.execute("SELECT 1")
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
         db_status = "connected"
     except Exception as e:
         print(f"Database health check failed: {e}")
@@ -102,13 +157,21 @@ async def health_check():
         "version": "1.0.0"
     }
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(authorization: Optional[str] = Header(None)):
+    """Prometheus metrics for this process."""
+    if METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Authentication endpoints
 
 
 @app.post("/auth/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Check if user exists
-    existing_user = db.query(User).filter(User.email == user.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -120,11 +183,11 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     # Create access token
-    access_token = create_access_token(data={"sub": db_user.email})
+    access_token = create_user_access_token(db_user)
 
     return UserResponse(
         id=db_user.id,
@@ -135,14 +198,22 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/login", response_model=UserResponse)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
     # Authenticate user
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not await verify_password(user.password, db_user.hashed_password):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_and_update_password(user.password, db_user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Transparently rehash when the configured bcrypt cost changed
+    if new_hash:
+        db_user.hashed_password = new_hash
+        await db.commit()
 
     # Create access token
-    access_token = create_access_token(data={"sub": db_user.email})
+    access_token = create_user_access_token(db_user)
 
     return UserResponse(
         id=db_user.id,
@@ -153,9 +224,9 @@ async def login(user: UserLogin, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/forgot-password", response_model=MessageResponse)
-async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
+async def forgot_password(request: ForgotPasswordRequest, db: AsyncSession = Depends(get_db)):
     # Check if user exists
-    db_user = db.query(User).filter(User.email == request.email).first()
+    db_user = await db.scalar(select(User).where(User.email == request.email))
     if not db_user:
         # Don't reveal if email exists or not for security
         return MessageResponse(message="If the email exists, a password reset link has been sent.")
@@ -167,7 +238,7 @@ async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(
     db_user.reset_token = reset_token
     db_user.reset_token_expires = datetime.utcnow(
     ) + timedelta(minutes=PASSWORD_RESET_EXPIRE_MINUTES)
-    db.commit()
+    await db.commit()
 
     # Send email (in development, this will just print to console)
     email_sent = send_password_reset_email(db_user.email, reset_token)
@@ -180,7 +251,7 @@ async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(
 
 
 @app.post("/auth/reset-password", response_model=MessageResponse)
-async def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
+async def reset_password(request: ResetPasswordRequest, db: AsyncSession = Depends(get_db)):
     # Verify the reset token
     email = verify_password_reset_token(request.token)
     if not email:
@@ -188,7 +259,7 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
             status_code=400, detail="Invalid or expired reset token")
 
     # Find user by email
-    db_user = db.query(User).filter(User.email == email).first()
+    db_user = await db.scalar(select(User).where(User.email == email))
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -201,51 +272,213 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
         raise HTTPException(status_code=400, detail="Reset token has expired")
 
     # Update password
-    db_user.hashed_password = get_password_hash(request.new_password)
+    db_user.hashed_password = await get_password_hash(request.new_password)
     db_user.reset_token = None
     db_user.reset_token_expires = None
-    db.commit()
+    # Revoke existing access tokens
+    db_user.token_version = (db_user.token_version or 0) + 1
+    await db.commit()
+    invalidate_user(db_user.id)
 
     return MessageResponse(message="Password has been reset successfully")
 
 # Notes endpoints
 
 
-@app.get("/notes", response_model=List[NoteResponse])
+@app.get("/notes", response_model=NoteListResponse)
 async def get_notes(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    sort: str = "modified",
+    archived: Optional[bool] = None,
+    pinned: Optional[bool] = None,
+    mood: Optional[str] = None,
+    color: Optional[str] = None,
+    has_reminder: Optional[bool] = None,
+    has_image: Optional[bool] = None,
+    has_audio: Optional[bool] = None,
+    label: Optional[List[str]] = Query(None),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    view: str = "full",
+    include_previews: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    notes = db.query(Note).filter(
-        Note.user_id == current_user.id).offset(skip).limit(limit).all()
-    return notes
+    """List notes; fields= or view=summary return only the named fields.
+
+    include_previews=true embeds cached link previews; uncached links are
+    fetched in the background and show up on a later request.
+    """
+    try:
+        sort = resolve_sort(sort)
+        projection = resolve_fields(fields, view)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {}
+    if not include_previews:
+        # Previews arrive without a note write, so only plain listings are versioned
+        version = await get_change_seq(db, current_user.id)
+        headers = {
+            "ETag": version_etag("notes", current_user.id, version, request.url.query),
+            "Cache-Control": "private, no-cache",
+        }
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    # Previews need link_url; fetch it for them but only return it if asked
+    borrowed_link_url = bool(include_previews and projection and "link_url" not in projection)
+    if borrowed_link_url:
+        projection.append("link_url")
+
+    filters = NoteFilters(
+        archived=archived,
+        pinned=pinned,
+        mood=mood,
+        color=color,
+        has_reminder=has_reminder,
+        has_image=has_image,
+        has_audio=has_audio,
+        labels=label,
+        created_after=created_after,
+        created_before=created_before,
+        updated_after=updated_after,
+        updated_before=updated_before
+    )
+    try:
+        notes, next_cursor = await list_notes(
+            db, current_user.id, limit, cursor, filters, sort, projection)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if projection:
+        if include_previews:
+            previews = await get_cached_link_previews([note["link_url"] for note in notes])
+            for note in notes:
+                url = note.pop("link_url") if borrowed_link_url else note["link_url"]
+                note["link_preview"] = previews.get(url)
+        # Partial notes do not fit NoteResponse; skip response_model
+        return json_response({"items": notes, "next_cursor": next_cursor}, headers=headers)
+    if include_previews:
+        previews = await get_cached_link_previews([note.link_url for note in notes])
+        items = [NoteResponse.model_validate(note) for note in notes]
+        for item in items:
+            item.link_preview = previews.get(item.link_url)
+        return NoteListResponse(items=items, next_cursor=next_cursor)
+    response.headers.update(headers)
+    return NoteListResponse(items=notes, next_cursor=next_cursor)
 
 
 @app.post("/notes", response_model=NoteResponse)
 async def create_note(
     note: NoteCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    db_note = Note(**note.dict(), user_id=current_user.id)
+    note_data = note.dict()
+    drawing_data = note_data.pop("drawing_data", None)
+    db_note = Note(**note_data, user_id=current_user.id)
+    await record_note_change(db, db_note)
     db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
+    await db.flush()
+    await clear_tombstones(db, db_note.id)
+    if drawing_data:
+        await save_drawing(db, db_note, drawing_data)
+    await sync_note_files(db, db_note.id, current_user.id, (db_note.image_url, db_note.audio_url))
+    if db_note.image_url:
+        await apply_image_derivatives(db, db_note.id, db_note.image_url)
+    links = await sync_note_links(db, db_note.id, extract_links(
+        db_note.content, db_note.checklist_items, db_note.link_url))
+    await db.commit()
+    if db_note.image_url:
+        await catch_up_image_derivatives(db, [db_note.id])
+    prefetch_link_previews(links)
+    await db.refresh(db_note)
     return db_note
 
 
+@app.post("/notes/batch", response_model=NoteBatchResponse)
+async def batch_notes(
+    batch: NoteBatchRequest,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    results, orphaned_files = await apply_batch(
+        db, current_user.id, batch.operations, batch.atomic)
+
+    # Remove files only once the deletes are committed
+    await purge_files(db, orphaned_files)
+
+    return NoteBatchResponse(results=results)
+
+
+@app.get("/notes/changes", response_model=NoteChangesResponse)
+async def get_note_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        notes, deleted, next_cursor, has_more = await get_changes(
+            db, current_user.id, since, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return NoteChangesResponse(
+        notes=notes,
+        deleted=deleted,
+        next_cursor=next_cursor,
+        has_more=has_more
+    )
+
+
+@app.get("/notes/search", response_model=NoteSearchResponse)
+async def search_notes_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    include_archived: bool = False,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    hits, has_more = await search_notes(
+        db, current_user.id, q, limit, offset, include_archived)
+    return NoteSearchResponse(
+        query=q,
+        results=hits,
+        next_offset=offset + limit if has_more else None
+    )
+
+
 @app.get("/notes/{note_id}", response_model=NoteResponse)
 async def get_note(
     note_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    note = db.query(Note).filter(Note.id == note_id,
-                                 Note.user_id == current_user.id).first()
+    if if_none_match:
+        # Revalidation only reads the note's change_seq
+        change_seq = await db.scalar(select(Note.change_seq).where(
+            Note.id == note_id, Note.user_id == current_user.id))
+        if change_seq is None:
+            raise HTTPException(status_code=404, detail="Note not found")
+        etag = version_etag("note", note_id, change_seq)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+    note = await db.scalar(select(Note).where(
+        Note.id == note_id, Note.user_id == current_user.id))
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    response.headers["ETag"] = version_etag("note", note.id, note.change_seq)
+    response.headers["Cache-Control"] = "private, no-cache"
     return note
 
 
@@ -253,70 +486,186 @@ async def get_note(
 async def update_note(
     note_id: int,
     note_update: NoteUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    note = db.query(Note).filter(Note.id == note_id,
-                                 Note.user_id == current_user.id).first()
+    note = await db.scalar(select(Note).where(
+        Note.id == note_id, Note.user_id == current_user.id))
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    for key, value in note_update.dict(exclude_unset=True).items():
+    changes = note_update.dict(exclude_unset=True)
+    if "drawing_data" in changes:
+        await save_drawing(db, note, changes.pop("drawing_data"))
+    for key, value in changes.items():
         setattr(note, key, value)
-
-    db.commit()
-    db.refresh(note)
+    await record_note_change(db, note)
+
+    orphaned_files = []
+    if "image_url" in changes or "audio_url" in changes:
+        orphaned_files = await sync_note_files(db, note.id, current_user.id, (note.image_url, note.audio_url))
+    if "image_url" in changes:
+        await apply_image_derivatives(db, note.id, note.image_url)
+    links = []
+    if changes.keys() & {"content", "checklist_items", "link_url"}:
+        links = await sync_note_links(db, note.id, extract_links(
+            note.content, note.checklist_items, note.link_url))
+
+    await db.commit()
+    if "image_url" in changes and note.image_url:
+        await catch_up_image_derivatives(db, [note.id])
+    await purge_files(db, orphaned_files)
+    prefetch_link_previews(links)
+    await db.refresh(note)
     return note
 
 
 @app.delete("/notes/{note_id}")
 async def delete_note(
     note_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    note = db.query(Note).filter(Note.id == note_id,
-                                 Note.user_id == current_user.id).first()
+    note = await db.scalar(select(Note).where(
+        Note.id == note_id, Note.user_id == current_user.id))
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    # Delete associated files
-    if note.image_url:
-        delete_file(note.image_url)
-    if note.audio_url:
-        delete_file(note.audio_url)
+    # Associated files are removed once the delete is committed
+    orphaned_files = await release_note_files(db, [note.id], (note.image_url, note.audio_url))
 
-    db.delete(note)
-    db.commit()
+    await record_note_deletion(db, note)
+    await delete_drawings(db, [note.id])
+    await delete_note_links(db, [note.id])
+    await db.delete(note)
+    await db.commit()
+    await purge_files(db, orphaned_files)
     return {"message": "Note deleted successfully"}
 
+
+@app.get("/notes/{note_id}/drawing")
+async def get_note_drawing(
+    note_id: int,
+    v: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Revalidation only reads the hash from the notes row
+    drawing_hash = await get_drawing_hash(db, current_user.id, note_id)
+    if not drawing_hash:
+        raise HTTPException(status_code=404, detail="Drawing not found")
+
+    etag = make_etag(drawing_hash)
+    # A versioned URL never changes content; an unversioned one must revalidate
+    cache_control = "private, max-age=31536000, immutable" if v and drawing_hash.startswith(v) \
+        else "private, no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    drawing = await get_drawing(db, note_id)
+    if drawing is None:
+        raise HTTPException(status_code=404, detail="Drawing not found")
+    return Response(content=drawing.data, media_type=drawing.content_type, headers=headers)
+
+
+
+@app.put("/notes/{note_id}/drawing", response_model=NoteResponse)
+async def put_note_drawing(
+    note_id: int,
+    request: Request,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Replace a note's drawing with the raw image body; an empty body removes it."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type and not content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Drawing must be an image")
+    note = await db.scalar(select(Note).where(
+        Note.id == note_id, Note.user_id == current_user.id))
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    data = bytearray()
+    async for chunk in request.stream():
+        data.extend(chunk)
+        if len(data) > MAX_DRAWING_SIZE:
+            raise HTTPException(status_code=413, detail="Drawing too large")
+
+    await store_drawing(db, note, bytes(data), content_type or "image/png")
+    await record_note_change(db, note)
+    await db.commit()
+    await db.refresh(note)
+    return note
+
 # File upload endpoints
 
 
 @app.post("/upload/image")
 async def upload_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
 
-    file_url = await save_file(file, "images")
+    stored = await save_file(file, "images")
+    file_url = await register_upload(db, stored, current_user.id)
+    await db.commit()
+
+    # Thumbnails are rendered after the response is sent
+    background_tasks.add_task(generate_derivatives, stored.sha256)
     return {"file_url": file_url}
 
 
 @app.post("/upload/audio")
 async def upload_audio(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if not file.content_type.startswith("audio/"):
         raise HTTPException(
             status_code=400, detail="File must be an audio file")
 
-    file_url = await save_file(file, "audio")
+    stored = await save_file(file, "audio")
+    file_url = await register_upload(db, stored, current_user.id)
+    await db.commit()
     return {"file_url": file_url}
 
+
+@app.api_route("/files/{file_type}/{filename}", methods=["GET", "HEAD"])
+async def get_file(
+    request: Request,
+    file_type: str,
+    filename: str,
+    current_user: UserPrincipal = Depends(get_current_user_or_signed_url),
+    db: AsyncSession = Depends(get_db)
+):
+    """Serve an attachment with Range, ETag and immutable caching."""
+    readable = await get_readable_file(db, current_user.id, file_type, filename)
+    if readable is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    path, content_type = readable
+    return serve_file(request, path, content_type)
+
+
+@app.get("/files/{file_type}/{filename}/signed-url", response_model=SignedFileUrlResponse)
+async def get_signed_file_url(
+    file_type: str,
+    filename: str,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """A short-lived URL for one file, for <img>/<audio> src where no header can be sent."""
+    if await get_readable_file(db, current_user.id, file_type, filename) is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    url, expires_at = sign_file_url(f"/files/{file_type}/{filename}", current_user.id)
+    return {"url": f"{file_handler.base_url}{url}", "expires_at": expires_at}
+
 # Link preview endpoint
 
 
@@ -329,36 +678,67 @@ async def get_link_preview_endpoint(url: str):
         raise HTTPException(
             status_code=400, detail=f"Failed to fetch preview: {str(e)}")
 
+
+@app.post("/link-previews", response_model=LinkPreviewBatchResponse)
+async def get_link_previews_endpoint(
+    batch: LinkPreviewBatchRequest,
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    if len(batch.urls) > MAX_BATCH_PREVIEWS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_BATCH_PREVIEWS} URLs per request")
+    deadline = LINK_PREVIEW_BATCH_DEADLINE
+    if batch.timeout is not None:
+        deadline = max(0.0, min(batch.timeout, deadline))
+    previews, pending = await get_link_previews(batch.urls, deadline)
+    return LinkPreviewBatchResponse(
+        previews=[previews[url] for url in dict.fromkeys(batch.urls) if url in previews],
+        pending=pending)
+
 # Labels endpoints
 
 
 @app.get("/labels", response_model=List[LabelResponse])
 async def get_labels(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    labels = db.query(Label).filter(Label.user_id == current_user.id).all()
+    version = await get_change_seq(db, current_user.id)
+    headers = {
+        "ETag": version_etag("labels", current_user.id, version),
+        "Cache-Control": "private, no-cache",
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    labels = (await db.scalars(
+        select(Label).where(Label.user_id == current_user.id))).all()
+    response.headers.update(headers)
     return labels
 
 
 @app.post("/labels", response_model=LabelResponse)
 async def create_label(
     label: LabelCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     # Check if label already exists
-    existing = db.query(Label).filter(
+    existing = await db.scalar(select(Label).where(
         Label.name == label.name,
         Label.user_id == current_user.id
-    ).first()
+    ))
     if existing:
         raise HTTPException(status_code=400, detail="Label already exists")
 
     db_label = Label(**label.dict(), user_id=current_user.id)
     db.add(db_label)
-    db.commit()
-    db.refresh(db_label)
+    # Invalidates cached label (and note) listings
+    await next_change_seq(db, current_user.id)
+    await db.commit()
+    await db.refresh(db_label)
     return db_label
 
 if __name__ == "__main__":
@@ -0,0 +1,323 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from decouple import config
+from sqlalchemy import event
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Configuration
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+# When set, GET /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    """A metric family in the Prometheus text format."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(sample name, formatted labels, value) rows for rendering."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in values]
+
+
+class Gauge(Metric):
+    """A gauge set directly or read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 function: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+        self.function = function
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            return [] if value is None else [(self.name, "", value)]
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts)) for key, counts in self._values.items()]
+        samples = []
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket",
+                                _format_labels(self.labels, key, f'le="{_format_value(bound)}"'),
+                                cumulative))
+            samples.append((f"{self.name}_count", _format_labels(self.labels, key), cumulative))
+            samples.append((f"{self.name}_sum", _format_labels(self.labels, key), counts[-1]))
+        return samples
+
+
+registry: List[Metric] = []
+
+# HTTP
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route and status.",
+    ("method", "route", "status"))
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being handled.", ("method", "route"))
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries issued per request.",
+    ("method", "route"), buckets=QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in database queries per request.",
+    ("method", "route"), buckets=LATENCY_BUCKETS)
+
+# Database
+DB_QUERIES = Counter("db_queries_total", "Database queries by statement type.", ("operation",))
+DB_QUERY_TIME = Histogram(
+    "db_query_duration_seconds", "Database query latency by statement type.",
+    ("operation",), buckets=DB_BUCKETS)
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool.")
+DB_CONNECTION_HOLD = Histogram(
+    "db_connection_hold_seconds", "Time a connection stays checked out of the pool.")
+DB_CONNECT_TIME = Histogram(
+    "db_connect_seconds", "Time to open a new database connection.", buckets=DB_BUCKETS)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time a request session waits to get a connection, including opening one.",
+    buckets=DB_BUCKETS)
+
+# Application
+LINK_PREVIEW_LOOKUPS = Counter(
+    "link_preview_cache_lookups_total",
+    "Link preview lookups by result: memory, database, stale or miss.", ("result",))
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes received in file uploads.", ("file_type",))
+UPLOADS = Counter("uploads_total", "File uploads received.", ("file_type",))
+
+
+def _password_queue_depth():
+    from auth import hash_pool
+    return hash_pool.queue_depth
+
+
+PASSWORD_HASH_QUEUE = Gauge(
+    "password_hash_queue_depth", "bcrypt calls running or waiting for a worker.",
+    function=_password_queue_depth)
+
+
+# Per-request database usage: [query count, seconds]
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA") else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    operation = _operation(statement)
+    DB_QUERIES.inc(operation)
+    DB_QUERY_TIME.observe(elapsed, operation)
+    usage = _request_db.get()
+    if usage is not None:
+        usage[0] += 1
+        usage[1] += elapsed
+
+
+def _handle_error(exception_context):
+    # Drop the start time of a query that failed
+    started = exception_context.connection.info.get("query_started") \
+        if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _do_connect(dialect, connection_record, cargs, cparams):
+    connection_record.info["connect_started"] = time.perf_counter()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    started = connection_record.info.pop("connect_started", None)
+    if started is not None:
+        DB_CONNECT_TIME.observe(time.perf_counter() - started)
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKOUTS.inc()
+    connection_record.info["checked_out"] = time.perf_counter()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop("checked_out", None)
+    if started is not None:
+        DB_CONNECTION_HOLD.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Time queries, connects and pool checkouts of a (sync) engine.
+
+    Pool listeners are carried over when engine.dispose() recreates the pool.
+    """
+    if getattr(engine, "_metrics_instrumented", False):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(engine, "do_connect", _do_connect)
+    event.listen(engine, "connect", _on_connect)
+    event.listen(engine, "checkout", _on_checkout)
+    event.listen(engine, "checkin", _on_checkin)
+    engine._metrics_instrumented = True
+
+
+class MetricsMiddleware:
+    """Record latency, in-flight requests and database usage per route."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        # [status, time the last body byte was sent]
+        response = [500, None]
+
+        async def send_with_status(message: Message):
+            if message["type"] == "http.response.start":
+                response[0] = message["status"]
+            await send(message)
+            if message["type"] != "http.response.start" and not message.get("more_body", False):
+                response[1] = time.perf_counter()
+
+        usage = [0, 0.0]
+        token = _request_db.set(usage)
+        REQUESTS_IN_PROGRESS.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Background tasks run after the body; they are not request latency
+            elapsed = (response[1] or time.perf_counter()) - started
+            status = response[0]
+            REQUESTS_IN_PROGRESS.dec(method, route)
+            _request_db.reset(token)
+            REQUEST_LATENCY.observe(elapsed, method, route, str(status))
+            REQUEST_DB_QUERIES.observe(usage[0], method, route)
+            REQUEST_DB_TIME.observe(usage[1], method, route)
+
+    def _route_template(self, scope: Scope) -> str:
+        """The matched route's path template, keeping label cardinality bounded."""
+        app = scope.get("app")
+        for route in getattr(app, "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", UNMATCHED_ROUTE)
+        return UNMATCHED_ROUTE
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+def record_link_preview_lookup(result: str):
+    LINK_PREVIEW_LOOKUPS.inc(result)
+
+
+def record_pool_wait(seconds: float):
+    DB_POOL_WAIT.observe(seconds)
+
+
+def record_upload(file_type: str, size: int):
+    UPLOADS.inc(file_type)
+    UPLOAD_BYTES.inc(file_type, amount=size)
@@ -0,0 +1,141 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from sqlalchemy import Column, DateTime, String, Table, inspect, text
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql import func
+
+from database import engine, Base
+from note_links import extract_links
+
+# Bookkeeping table for one-off data migrations
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("name", String(100), primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def _add_missing_columns(conn):
+    """Add model columns that an older database does not have yet."""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            # Only literal defaults; SQLite cannot add a column with a
+            # non-constant default such as CURRENT_TIMESTAMP.
+            default = getattr(column.server_default, "arg", None)
+            if isinstance(default, str):
+                ddl += f" DEFAULT '{default}'"
+            elif hasattr(default, "text"):
+                ddl += f" DEFAULT {default.text}"
+            conn.execute(text(ddl))
+            print(f"Added column {table.name}.{column.name}")
+
+
+def _create_missing_indexes(conn):
+    """Create indexes declared on models for tables that already existed."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            # Reflection skips expression indexes, so let the database check
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _normalize_note_timestamps(conn):
+    """Give every note an updated_at so it can be used as a keyset column."""
+    if conn.dialect.name == "sqlite":
+        # Rows written by CURRENT_TIMESTAMP lack the fractional seconds that
+        # SQLAlchemy writes, which breaks string comparison of cursor values.
+        conn.execute(text(
+            "UPDATE notes SET created_at = created_at || '.000000' "
+            "WHERE length(created_at) = 19"))
+        conn.execute(text(
+            "UPDATE notes SET updated_at = updated_at || '.000000' "
+            "WHERE length(updated_at) = 19"))
+    conn.execute(text(
+        "UPDATE notes SET updated_at = created_at WHERE updated_at IS NULL"))
+    conn.execute(text(
+        "UPDATE notes SET is_pinned = :false WHERE is_pinned IS NULL"), {"false": False})
+    conn.execute(text(
+        "UPDATE notes SET is_archived = :false WHERE is_archived IS NULL"), {"false": False})
+
+
+def _move_drawings_to_blobs(conn):
+    """Move base64 drawing_data out of notes into note_drawings."""
+    columns = {column["name"] for column in inspect(conn).get_columns("notes")}
+    if "drawing_data" not in columns:
+        return
+
+    rows = conn.execute(text(
+        "SELECT id, drawing_data FROM notes "
+        "WHERE drawing_data IS NOT NULL AND drawing_data != ''"))
+    for note_id, drawing_data in rows.all():
+        content_type, payload = "image/png", drawing_data
+        if drawing_data.startswith("data:") and "," in drawing_data:
+            header, payload = drawing_data[5:].split(",", 1)
+            content_type = header.split(";")[0] or content_type
+        try:
+            data = base64.b64decode(payload)
+        except (binascii.Error, ValueError):
+            data = drawing_data.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        conn.execute(text(
+            "INSERT INTO note_drawings (note_id, data, content_type, size, sha256) "
+            "VALUES (:note_id, :data, :content_type, :size, :sha256)"),
+            {"note_id": note_id, "data": data, "content_type": content_type,
+             "size": len(data), "sha256": digest})
+        conn.execute(text(
+            "UPDATE notes SET drawing_size = :size, drawing_hash = :sha256 WHERE id = :id"),
+            {"size": len(data), "sha256": digest, "id": note_id})
+
+    # The legacy column is left in place (portable) but emptied
+    conn.execute(text("UPDATE notes SET drawing_data = NULL WHERE drawing_data IS NOT NULL"))
+
+
+def _extract_note_links(conn):
+    """Fill note_links from the notes saved before links were extracted."""
+    rows = conn.execute(text("SELECT id, content, checklist_items, link_url FROM notes"))
+    for note_id, content, checklist_items, link_url in rows.all():
+        if isinstance(checklist_items, str):
+            try:
+                checklist_items = json.loads(checklist_items)
+            except ValueError:
+                checklist_items = None
+        links = extract_links(content, checklist_items, link_url)
+        if links:
+            conn.execute(text(
+                "INSERT INTO note_links (note_id, url) VALUES (:note_id, :url)"),
+                [{"note_id": note_id, "url": url} for url in links])
+
+
+# Ordered data migrations; each runs once per database
+DATA_MIGRATIONS = [
+    ("0001_normalize_note_timestamps", _normalize_note_timestamps),
+    ("0002_move_drawings_to_blobs", _move_drawings_to_blobs),
+    ("0003_extract_note_links", _extract_note_links),
+]
+
+
+def run_migrations(bind=engine):
+    """Bring an existing database up to date with the models."""
+    with bind.begin() as conn:
+        _add_missing_columns(conn)
+        _create_missing_indexes(conn)
+
+        applied = {row[0] for row in conn.execute(schema_migrations.select())}
+        for name, migration in DATA_MIGRATIONS:
+            if name in applied:
+                continue
+            migration(conn)
+            conn.execute(schema_migrations.insert().values(name=name))
+            print(f"Applied migration {name}")
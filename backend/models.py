@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, Index, LargeBinary, literal_column, true
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -16,6 +17,12 @@ class User(Base):
     reset_token = Column(String(500), nullable=True)
     reset_token_expires = Column(DateTime(timezone=True), nullable=True)
 
+    # Bumped when credentials change; access tokens carry it
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Last change sequence allocated to this user's notes (delta sync)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -45,7 +52,13 @@ class Note(Base):
     # File attachments
     image_url = Column(String(500))
     audio_url = Column(String(500))
-    drawing_data = Column(Text)  # Base64 encoded drawing
+    # Resized copies of the image, filled in by the derivative pipeline
+    thumbnail_url = Column(String(500))
+    image_variants = Column(JSON)  # size name -> URL
+
+    # Drawing bytes live in note_drawings; the row only keeps a reference
+    drawing_size = Column(Integer)
+    drawing_hash = Column(String(64))  # SHA-256 of the drawing bytes
 
     # Reminders and mood
     reminder_time = Column(DateTime(timezone=True))
@@ -57,14 +70,125 @@ class Note(Base):
     link_text = Column(String(255))
     labels = Column(JSON)  # Array of label names
 
-    # Metadata
+    # Per-user change sequence of the last write (delta sync)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Metadata (set in Python so stored values compare exactly with
+    # pagination cursor parameters)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    updated_at = Column(DateTime(timezone=True),
+                        default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="notes")
 
+    @property
+    def drawing_url(self):
+        """Versioned URL of the drawing so clients can cache it forever."""
+        if not self.drawing_hash:
+            return None
+        return f"/notes/{self.id}/drawing?v={self.drawing_hash[:16]}"
+
+    __table_args__ = (
+        # Cover keyset pagination of GET /notes for each sort
+        Index("ix_notes_user_pinned_updated",
+              "user_id", "is_pinned", "updated_at", "id"),
+        Index("ix_notes_user_pinned_created",
+              "user_id", "is_pinned", "created_at", "id"),
+        Index("ix_notes_user_pinned_title",
+              "user_id", "is_pinned", "title", "id"),
+        # Delta sync reads notes changed after a cursor
+        Index("ix_notes_user_change_seq", "user_id", "change_seq", "id"),
+    )
+
+
+# Mood sort/filter key; notes without a detected mood sort first
+MOOD_SORT_KEY = func.coalesce(Note.detected_mood, literal_column("''"))
+
+Index("ix_notes_user_pinned_mood",
+      Note.user_id, Note.is_pinned, MOOD_SORT_KEY, Note.id)
+
+# Partial indexes for the narrow filtered views
+Index("ix_notes_user_archived_updated",
+      Note.user_id, Note.is_pinned, Note.updated_at, Note.id,
+      sqlite_where=Note.is_archived == true(),
+      postgresql_where=Note.is_archived == true())
+
+Index("ix_notes_user_reminder",
+      Note.user_id, Note.reminder_time,
+      sqlite_where=Note.reminder_time.isnot(None),
+      postgresql_where=Note.reminder_time.isnot(None))
+
+
+class NoteDrawing(Base):
+    __tablename__ = "note_drawings"
+
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    content_type = Column(String(100), nullable=False, default="image/png")
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class FileBlob(Base):
+    """An uploaded file stored once under its content hash."""
+    __tablename__ = "file_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    file_type = Column(String(20), nullable=False)  # images, audio
+    extension = Column(String(16), nullable=False, default="")
+    content_type = Column(String(100))
+    size = Column(Integer, nullable=False)
+    # Number of note_attachments rows pointing at this blob
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    derivatives = Column(JSON)  # size name -> derivative filename (images)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+    @property
+    def filename(self):
+        return f"{self.sha256}{self.extension}"
+
+
+class NoteAttachment(Base):
+    __tablename__ = "note_attachments"
+
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    sha256 = Column(String(64), ForeignKey("file_blobs.sha256"), primary_key=True, index=True)
+
+
+class FileUpload(Base):
+    """Who uploaded a blob; lets the uploader read it before attaching it."""
+    __tablename__ = "file_uploads"
+
+    sha256 = Column(String(64), ForeignKey("file_blobs.sha256"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class NoteLink(Base):
+    """A URL found in a note's content, checklist or link_url."""
+    __tablename__ = "note_links"
+
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    url = Column(String(500), primary_key=True, index=True)
+
+
+class NoteTombstone(Base):
+    __tablename__ = "note_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    note_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_note_tombstones_user_change_seq",
+              "user_id", "change_seq", "note_id"),
+    )
+
 
 class Label(Base):
     __tablename__ = "labels"
@@ -92,4 +216,7 @@ class LinkPreview(Base):
     # Cache metadata
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     last_updated = Column(DateTime(timezone=True), onupdate=func.now())
-    cache_expiry = Column(DateTime(timezone=True))  # TTL for cache
+    cache_expiry = Column(DateTime(timezone=True), index=True)  # TTL for cache
+    is_error = Column(Boolean, nullable=False, default=False, server_default="0")  # negative entry
+    hit_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_accessed = Column(DateTime(timezone=True))
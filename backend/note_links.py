@@ -0,0 +1,77 @@
+import re
+from typing import Iterable, List, Optional
+from urllib.parse import urlparse
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import NoteLink
+
+# Configuration
+MAX_LINKS_PER_NOTE = 50
+MAX_LINK_LENGTH = 500  # link_previews.url
+
+URL_RE = re.compile(r"https?://[^\s<>\"'`]+", re.IGNORECASE)
+TRAILING_PUNCTUATION = ".,;:!?*_~"
+CLOSING_BRACKETS = {")": "(", "]": "[", "}": "{"}
+
+
+def _clean_url(url: str) -> str:
+    """Drop sentence punctuation and unbalanced closing brackets at the end."""
+    while url:
+        last = url[-1]
+        if last in TRAILING_PUNCTUATION:
+            url = url[:-1]
+        elif last in CLOSING_BRACKETS and url.count(last) > url.count(CLOSING_BRACKETS[last]):
+            url = url[:-1]
+        else:
+            break
+    return url
+
+
+def extract_links(content: Optional[str] = None, checklist_items: Optional[Iterable] = None,
+                  link_url: Optional[str] = None) -> List[str]:
+    """URLs in a note's text, checklist items and link_url, in order of appearance."""
+    texts = [link_url or "", content or ""]
+    for item in checklist_items or []:
+        text = item.get("text") if isinstance(item, dict) else getattr(item, "text", None)
+        texts.append(text or "")
+
+    links = []
+    for text in texts:
+        for match in URL_RE.finditer(text):
+            url = _clean_url(match.group(0))
+            if urlparse(url).netloc and len(url) <= MAX_LINK_LENGTH and url not in links:
+                links.append(url)
+                if len(links) >= MAX_LINKS_PER_NOTE:
+                    return links
+    return links
+
+
+async def sync_note_links(db: AsyncSession, note_id: int, urls: List[str]) -> List[str]:
+    """Store a note's links; returns the ones it did not have before."""
+    current = set(await db.scalars(
+        select(NoteLink.url).where(NoteLink.note_id == note_id)))
+    wanted = set(urls)
+
+    added = [url for url in urls if url not in current]
+    if added:
+        await db.execute(insert(NoteLink), [
+            {"note_id": note_id, "url": url} for url in added])
+    removed = current - wanted
+    if removed:
+        await db.execute(
+            delete(NoteLink)
+            .where(NoteLink.note_id == note_id, NoteLink.url.in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+    return added
+
+
+async def delete_note_links(db: AsyncSession, note_ids: List[int]):
+    """Remove the links of deleted notes."""
+    await db.execute(
+        delete(NoteLink)
+        .where(NoteLink.note_id.in_(note_ids))
+        .execution_options(synchronize_session=False)
+    )
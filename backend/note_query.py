@@ -0,0 +1,268 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import cast, exists, false, func, literal, select, true, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Note, MOOD_SORT_KEY
+from schemas import NoteFilters, NoteResponse
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(data: dict) -> str:
+    """Encode cursor state as an opaque URL-safe string."""
+    raw = json.dumps(data, separators=(",", ":"), default=_encode_value)
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(data, dict):
+        raise InvalidCursor("Invalid cursor")
+    return data
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in cursor")
+
+
+# Sort name -> (key expression, ascending). Every sort is applied within
+# the pinned group and tie-broken by id in the same direction, so the keyset
+# predicate is a single row-value comparison backed by a composite index.
+SORTS = {
+    "modified": (Note.updated_at, False),
+    "created": (Note.created_at, False),
+    "title": (Note.title, True),
+    "mood": (MOOD_SORT_KEY, True),
+}
+SORT_ALIASES = {"date": "created"}
+DATETIME_SORTS = {"modified", "created"}
+
+
+def resolve_sort(sort: str) -> str:
+    """Map a client sort name to one of SORTS."""
+    sort = SORT_ALIASES.get(sort, sort)
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+    return sort
+
+
+# Sparse fieldsets: NoteResponse fields plus a truncated content preview
+PREVIEW_LENGTH = 200
+# link_preview is attached by the endpoint, not selected
+PROJECTABLE_FIELDS = (set(NoteResponse.model_fields) - {"link_preview"}) | {"content_preview"}
+VIEWS = {
+    "summary": (
+        "id", "title", "content_preview", "note_type", "color", "is_pinned",
+        "is_archived", "labels", "thumbnail_url", "drawing_url", "link_url", "reminder_time",
+        "detected_mood", "created_at", "updated_at",
+    ),
+}
+
+
+def resolve_fields(fields: Optional[str] = None, view: Optional[str] = None) -> Optional[List[str]]:
+    """Turn fields=/view= parameters into a field list (None means full notes)."""
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in PROJECTABLE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        if "id" not in names:
+            names.insert(0, "id")
+        return list(dict.fromkeys(names))
+    if view and view != "full":
+        if view not in VIEWS:
+            raise ValueError(f"Unknown view: {view}")
+        return list(VIEWS[view])
+    return None
+
+
+def _projection_columns(names: Sequence[str]) -> Dict[str, Any]:
+    """Columns to select for a field list, keyed by result label."""
+    columns = {}
+    for name in names:
+        if name == "content_preview":
+            # One extra character tells us whether the preview was cut
+            columns[name] = func.substr(Note.content, 1, PREVIEW_LENGTH + 1)
+        elif name == "drawing_url":
+            columns["_drawing_hash"] = Note.drawing_hash
+        else:
+            columns[name] = getattr(Note, name)
+    return columns
+
+
+def _shape_row(row, names: Sequence[str]) -> Dict[str, Any]:
+    item = {}
+    for name in names:
+        if name == "content_preview":
+            preview = row[name]
+            if preview is not None and len(preview) > PREVIEW_LENGTH:
+                preview = preview[:PREVIEW_LENGTH].rstrip() + "\u2026"
+            item[name] = preview
+        elif name == "drawing_url":
+            digest = row["_drawing_hash"]
+            item[name] = f"/notes/{row['_id']}/drawing?v={digest[:16]}" if digest else None
+        else:
+            item[name] = row[name]
+    return item
+
+
+class NoteListQuery:
+    """Filtered, keyset-paginated listing of a user's notes.
+
+    Notes are ordered pinned first, then by the sort key and id. Each pinned
+    group is read with its own range scan on the matching
+    ix_notes_user_pinned_* index, so a page costs the same wherever it
+    starts in the list.
+    """
+
+    def __init__(self, db: AsyncSession, user_id: int, filters: Optional[NoteFilters] = None,
+                 sort: str = "modified", fields: Optional[Sequence[str]] = None):
+        self.db = db
+        self.user_id = user_id
+        self.filters = filters or NoteFilters()
+        self.sort = resolve_sort(sort)
+        self.fields = fields
+
+    async def page(self, limit: int, cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """Return one page of notes and the cursor for the next one.
+
+        With a field list the page holds plain dicts read by a column-only
+        select, so unrequested columns are never loaded or serialized.
+        """
+        after = self._parse_position(decode_cursor(cursor)) if cursor else None
+        key, ascending = SORTS[self.sort]
+
+        groups = (True, False)
+        if self.filters.pinned is not None:
+            groups = (self.filters.pinned,)
+
+        notes = []
+        for pinned in groups:
+            if after and pinned and not after[0]:
+                # Cursor is already past the pinned group
+                continue
+            query = self._base_query().where(
+                Note.is_pinned == (true() if pinned else false()))
+            if after and pinned == after[0]:
+                position = tuple_(key, Note.id)
+                bound = tuple_(literal(after[1], key.type), literal(after[2]))
+                query = query.where(position > bound if ascending else position < bound)
+            order = [key.asc(), Note.id.asc()] if ascending else [key.desc(), Note.id.desc()]
+            result = await self.db.execute(
+                query.order_by(*order).limit(limit + 1 - len(notes)))
+            notes.extend(result.mappings().all() if self.fields else result.scalars().all())
+            if len(notes) > limit:
+                break
+
+        next_cursor = None
+        if len(notes) > limit:
+            notes = notes[:limit]
+            next_cursor = encode_cursor({
+                "s": self.sort,
+                "f": self._fingerprint(),
+                **self._position(notes[-1]),
+            })
+        if self.fields:
+            notes = [_shape_row(row, self.fields) for row in notes]
+        return notes, next_cursor
+
+    def _select(self):
+        if not self.fields:
+            return select(Note)
+        columns = _projection_columns(self.fields)
+        key, _ = SORTS[self.sort]
+        # Keyset position columns are always read, under private labels
+        columns.update({"_pinned": Note.is_pinned, "_key": key, "_id": Note.id})
+        return select(*[column.label(label) for label, column in columns.items()])
+
+    def _base_query(self):
+        f = self.filters
+        query = self._select().where(Note.user_id == self.user_id)
+
+        # Booleans are rendered as literals so partial indexes can match
+        if f.archived is not None:
+            query = query.where(Note.is_archived == (true() if f.archived else false()))
+        if f.mood is not None:
+            query = query.where(MOOD_SORT_KEY == f.mood)
+        if f.color is not None:
+            query = query.where(Note.color == f.color)
+        for column, wanted in (
+            (Note.reminder_time, f.has_reminder),
+            (Note.image_url, f.has_image),
+            (Note.audio_url, f.has_audio),
+        ):
+            if wanted is not None:
+                query = query.where(column.isnot(None) if wanted else column.is_(None))
+        for label in f.labels or []:
+            query = query.where(self._has_label(label))
+        if f.created_after is not None:
+            query = query.where(Note.created_at >= f.created_after)
+        if f.created_before is not None:
+            query = query.where(Note.created_at < f.created_before)
+        if f.updated_after is not None:
+            query = query.where(Note.updated_at >= f.updated_after)
+        if f.updated_before is not None:
+            query = query.where(Note.updated_at < f.updated_before)
+        return query
+
+    def _has_label(self, label: str):
+        """Match notes whose JSON labels array contains label."""
+        if self.db.bind.dialect.name == "postgresql":
+            return cast(Note.labels, JSONB).contains([label])
+        values = func.json_each(Note.labels).table_valued("value")
+        return exists(select(1).select_from(values).where(values.c.value == label))
+
+    def _position(self, last) -> dict:
+        if self.fields:
+            return {"p": bool(last["_pinned"]), "k": last["_key"], "i": last["_id"]}
+        if self.sort == "mood":
+            value = last.detected_mood or ""
+        else:
+            value = getattr(last, SORTS[self.sort][0].key)
+        return {"p": bool(last.is_pinned), "k": value, "i": last.id}
+
+    def _fingerprint(self) -> str:
+        """Short digest of the filters a cursor was issued for."""
+        raw = json.dumps(self.filters.dict(), sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+    def _parse_position(self, state: dict) -> Tuple[bool, object, int]:
+        if state.get("s") != self.sort or state.get("f") != self._fingerprint():
+            raise InvalidCursor("Cursor does not match the requested filters")
+        try:
+            value = state["k"]
+            if self.sort in DATETIME_SORTS:
+                value = datetime.fromisoformat(value)
+            elif not isinstance(value, str):
+                raise TypeError("Invalid sort value")
+            return bool(state["p"]), value, int(state["i"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidCursor("Invalid cursor") from e
+
+
+async def list_notes(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    filters: Optional[NoteFilters] = None,
+    sort: str = "modified",
+    fields: Optional[Sequence[str]] = None
+):
+    """Public function to page through a user's notes."""
+    return await NoteListQuery(db, user_id, filters, sort, fields).page(limit, cursor)
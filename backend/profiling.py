@@ -0,0 +1,313 @@
+import asyncio
+import cProfile
+import io
+import json
+import pstats
+import random
+import re
+import secrets
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from decouple import config
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from pyinstrument import Profiler as InstrumentProfiler
+except ImportError:
+    InstrumentProfiler = None
+
+# Configuration
+# Requests sending "X-Profile: <token>" are profiled; empty disables the header
+PROFILE_TOKEN = config("PROFILE_TOKEN", default="")
+# Fraction of all requests to profile (0 to 1)
+PROFILE_SAMPLE_RATE = config("PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+PROFILE_DIR = Path(config("PROFILE_DIR", default="profiles"))
+# "cprofile", or "pyinstrument" when it is installed
+PROFILER = config("PROFILER", default="cprofile")
+# SELECTs of one shape repeated this often in a request are N+1 suspects
+PROFILE_N_PLUS_ONE_THRESHOLD = config("PROFILE_N_PLUS_ONE_THRESHOLD", default=5, cast=int)
+PROFILE_MAX_STATEMENTS = config("PROFILE_MAX_STATEMENTS", default=1000, cast=int)
+PROFILE_TOP_FUNCTIONS = config("PROFILE_TOP_FUNCTIONS", default=40, cast=int)
+# Retention: keep at most this many reports, none older than this (0 disables)
+PROFILE_MAX_REPORTS = config("PROFILE_MAX_REPORTS", default=200, cast=int)
+PROFILE_MAX_AGE_HOURS = config("PROFILE_MAX_AGE_HOURS", default=72, cast=float)
+
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+PROFILE_HEADER = b"x-profile"
+REPORT_HEADER = b"x-profile-report"
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+")
+_PARAM_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """The shape of a statement: literals, parameters and IN lists collapsed to ?."""
+    shape = _STRING_RE.sub("?", statement)
+    shape = _PARAM_RE.sub("?", shape)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _SPACE_RE.sub(" ", shape).strip()
+    return _PARAM_LIST_RE.sub("(?)", shape)
+
+
+def find_n_plus_one(statements: List[dict], threshold: int = PROFILE_N_PLUS_ONE_THRESHOLD) -> List[dict]:
+    """Read statements of one shape issued at least threshold times."""
+    groups = defaultdict(list)
+    for statement in statements:
+        if statement["shape"].upper().startswith(("SELECT", "WITH")):
+            groups[statement["shape"]].append(statement["ms"])
+    suspects = [
+        {"statement": shape, "count": len(timings), "total_ms": round(sum(timings), 3)}
+        for shape, timings in groups.items() if len(timings) >= threshold
+    ]
+    return sorted(suspects, key=lambda suspect: suspect["count"], reverse=True)
+
+
+class RequestProfile:
+    """What one profiled request did: its SQL, timings and profiler output."""
+
+    def __init__(self, method: str, path: str, query: str, reason: str):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.query = query
+        self.reason = reason
+        self.status = None
+        self.statements: List[dict] = []
+        self.dropped_statements = 0
+        self.started = time.perf_counter()
+
+    def record_statement(self, statement: str, started: float, executemany: bool):
+        if len(self.statements) >= PROFILE_MAX_STATEMENTS:
+            self.dropped_statements += 1
+            return
+        self.statements.append({
+            "offset_ms": round((started - self.started) * 1000, 3),
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+            "statement": statement,
+            "shape": normalize_statement(statement),
+            "executemany": executemany,
+        })
+
+
+_active: ContextVar[Optional[RequestProfile]] = ContextVar("active_profile", default=None)
+
+# cProfile and pyinstrument hook the thread's profiler; one request at a time
+_profiler_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active.get()
+    if profile is not None:
+        profile.record_statement(statement, conn.info["profile_started"].pop(), executemany)
+
+
+def _handle_error(exception_context):
+    # Drop the start time of a query that failed
+    if _active.get() is None or exception_context.connection is None:
+        return
+    started = exception_context.connection.info.get("profile_started")
+    if started:
+        started.pop()
+
+
+def profile_engine(engine):
+    """Capture the SQL of profiled requests on a (sync) engine.
+
+    Nothing is registered unless profiling is configured, so it costs
+    nothing when disabled.
+    """
+    if not PROFILING_ENABLED or getattr(engine, "_profiling_instrumented", False):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    engine._profiling_instrumented = True
+
+
+class _Profiler:
+    """cProfile, or pyinstrument when configured and installed."""
+
+    def __init__(self):
+        self.kind = "pyinstrument" if PROFILER == "pyinstrument" and InstrumentProfiler else "cprofile"
+        if self.kind == "pyinstrument":
+            # Async mode attributes awaited time to this request only
+            self._profiler = InstrumentProfiler(async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def text(self) -> str:
+        if self.kind == "pyinstrument":
+            return self._profiler.output_text(unicode=True, color=False)
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        return stream.getvalue()
+
+    def save(self, stem: Path) -> str:
+        """Write the full profile next to the report; returns its file name."""
+        if self.kind == "pyinstrument":
+            path = stem.with_suffix(".html")
+            path.write_text(self._profiler.output_html())
+        else:
+            path = stem.with_suffix(".prof")
+            self._profiler.dump_stats(str(path))
+        return path.name
+
+
+def _write_report(profile: RequestProfile, profiler: Optional[_Profiler],
+                  response_seconds: float, total_seconds: float, cpu_seconds: float) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = PROFILE_DIR / profile.id
+    suspects = find_n_plus_one(profile.statements)
+    report = {
+        "id": profile.id,
+        "method": profile.method,
+        "path": profile.path,
+        "query": profile.query,
+        "status": profile.status,
+        "reason": profile.reason,
+        "response_ms": round(response_seconds * 1000, 3),
+        "total_ms": round(total_seconds * 1000, 3),
+        "process_cpu_ms": round(cpu_seconds * 1000, 3),
+        "sql": {
+            "count": len(profile.statements) + profile.dropped_statements,
+            "total_ms": round(sum(s["ms"] for s in profile.statements), 3),
+            "dropped": profile.dropped_statements,
+            "statements": profile.statements,
+        },
+        "n_plus_one_suspects": suspects,
+        "profiler": profiler.kind if profiler else None,
+        "profile": profiler.text() if profiler else "Skipped: another request was being profiled",
+        "profile_file": profiler.save(stem) if profiler else None,
+    }
+    path = stem.with_suffix(".json")
+    path.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Profiled {profile.method} {profile.path}: {report['response_ms']} ms, "
+          f"{report['sql']['count']} queries, {len(suspects)} N+1 suspects -> {path}")
+    prune_reports()
+    return path
+
+
+def prune_reports():
+    """Delete the oldest reports beyond PROFILE_MAX_REPORTS or PROFILE_MAX_AGE_HOURS.
+
+    A report's .json and its .prof/.html file are removed together.
+    """
+    reports = defaultdict(list)
+    for path in PROFILE_DIR.glob("*"):
+        if path.suffix in (".json", ".prof", ".html"):
+            reports[path.stem].append(path)
+    # Report ids start with their UTC timestamp, so names sort oldest first
+    ids = sorted(reports)
+    expired = set()
+    if PROFILE_MAX_REPORTS > 0 and len(ids) > PROFILE_MAX_REPORTS:
+        expired.update(ids[:len(ids) - PROFILE_MAX_REPORTS])
+    if PROFILE_MAX_AGE_HOURS > 0:
+        cutoff = time.time() - PROFILE_MAX_AGE_HOURS * 3600
+        for report_id in ids:
+            try:
+                if max(path.stat().st_mtime for path in reports[report_id]) < cutoff:
+                    expired.add(report_id)
+            except FileNotFoundError:
+                continue
+    for report_id in expired:
+        for path in reports[report_id]:
+            path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """Profile requests that send the admin header or are sampled.
+
+    Reports go to PROFILE_DIR and the response names them in X-Profile-Report.
+    Other requests sharing the event loop show up in cProfile output; use
+    PROFILER=pyinstrument to attribute awaited time to the request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not PROFILING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        reason = self._reason(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"],
+                                 scope.get("query_string", b"").decode("latin-1"), reason)
+        # Time the last body byte was sent
+        finished = [None]
+
+        async def send_with_report(message: Message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REPORT_HEADER, profile.id.encode())]
+            await send(message)
+            if message["type"] != "http.response.start" and not message.get("more_body", False):
+                finished[0] = time.perf_counter()
+
+        profiler = _Profiler() if _profiler_lock.acquire(blocking=False) else None
+        token = _active.set(profile)
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        if profiler:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_with_report)
+        finally:
+            if profiler:
+                profiler.stop()
+                _profiler_lock.release()
+            ended = time.perf_counter()
+            cpu_seconds = time.process_time() - cpu_started
+            _active.reset(token)
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(
+                    None, _write_report, profile, profiler,
+                    (finished[0] or ended) - started, ended - started, cpu_seconds)
+            except Exception as e:
+                print(f"Error writing profile report: {e}")
+
+    def _reason(self, scope: Scope) -> Optional[str]:
+        """Why this request is profiled, or None."""
+        if PROFILE_TOKEN:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER:
+                    if secrets.compare_digest(value, PROFILE_TOKEN.encode()):
+                        return "header"
+                    break
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
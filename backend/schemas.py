@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Literal
 from datetime import datetime
 
 # User schemas
@@ -83,6 +83,17 @@ class NoteUpdate(BaseModel):
     labels: Optional[List[str]] = None
 
 
+class LinkPreviewResponse(BaseModel):
+    url: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image: Optional[str] = None
+    site_name: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
 class NoteResponse(BaseModel):
     id: int
     title: str
@@ -94,7 +105,11 @@ class NoteResponse(BaseModel):
     checklist_items: Optional[List[ChecklistItem]] = None
     image_url: Optional[str] = None
     audio_url: Optional[str] = None
-    drawing_data: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
+    drawing_url: Optional[str] = None
+    drawing_size: Optional[int] = None
+    drawing_hash: Optional[str] = None
     reminder_time: Optional[datetime] = None
     detected_mood: Optional[str] = None
     mood_confidence: Optional[float] = None
@@ -104,10 +119,76 @@ class NoteResponse(BaseModel):
     user_id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # Only with include_previews; cached metadata for link_url
+    link_preview: Optional[LinkPreviewResponse] = None
 
     class Config:
         from_attributes = True
 
+
+
+class NoteFilters(BaseModel):
+    archived: Optional[bool] = None
+    pinned: Optional[bool] = None
+    mood: Optional[str] = None
+    color: Optional[str] = None
+    has_reminder: Optional[bool] = None
+    has_image: Optional[bool] = None
+    has_audio: Optional[bool] = None
+    labels: Optional[List[str]] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    updated_after: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
+
+
+class NoteListResponse(BaseModel):
+    items: List[NoteResponse]
+    next_cursor: Optional[str] = None
+
+
+class NoteBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    note: Optional[NoteCreate] = None
+    changes: Optional[NoteUpdate] = None
+
+
+class NoteBatchRequest(BaseModel):
+    operations: List[NoteBatchOperation]
+    atomic: bool = True
+
+
+class NoteBatchResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[int] = None
+    status: str
+
+
+class NoteBatchResponse(BaseModel):
+    results: List[NoteBatchResult]
+
+
+class NoteChangesResponse(BaseModel):
+    notes: List[NoteResponse]
+    deleted: List[int]
+    next_cursor: str
+    has_more: bool
+
+
+class NoteSearchHit(BaseModel):
+    note: NoteResponse
+    rank: float
+    title_highlight: Optional[str] = None
+    snippet: Optional[str] = None
+
+
+class NoteSearchResponse(BaseModel):
+    query: str
+    results: List[NoteSearchHit]
+    next_offset: Optional[int] = None
+
 # Label schemas
 
 
@@ -129,15 +210,15 @@ class LabelResponse(BaseModel):
 # Link preview schemas
 
 
-class LinkPreviewResponse(BaseModel):
-    url: str
-    title: Optional[str] = None
-    description: Optional[str] = None
-    image: Optional[str] = None
-    site_name: Optional[str] = None
+class LinkPreviewBatchRequest(BaseModel):
+    urls: List[str]
+    timeout: Optional[float] = None  # seconds; capped by the server
 
-    class Config:
-        from_attributes = True
+
+class LinkPreviewBatchResponse(BaseModel):
+    previews: List[LinkPreviewResponse]
+    # Still being fetched; ask again shortly
+    pending: List[str] = []
 
 # File upload schemas
 
@@ -148,6 +229,11 @@ class FileUploadResponse(BaseModel):
     content_type: str
     size: int
 
+
+class SignedFileUrlResponse(BaseModel):
+    url: str
+    expires_at: datetime
+
 # Mood detection schemas
 
 
@@ -0,0 +1,234 @@
+import html
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import engine
+from models import Note
+
+# Configuration
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Private-use characters the database wraps matches in; the note text is
+# HTML-escaped before they become HIGHLIGHT_START/END
+MATCH_START = "\ue000"
+MATCH_END = "\ue001"
+SNIPPET_TOKENS = 16
+MAX_QUERY_TERMS = 16
+
+# SQLite: FTS5 table keyed by note id (rowid). The owner column holds a
+# "u<user_id>" token so the per-user restriction is answered by the
+# inverted index itself instead of filtering every match afterwards.
+SQLITE_FTS_TABLE = """
+CREATE VIRTUAL TABLE notes_fts USING fts5(
+    title, content, checklist, labels, owner,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+SQLITE_FTS_DOCUMENT = """
+    {row}.id,
+    {row}.title,
+    coalesce({row}.content, ''),
+    (SELECT group_concat(json_extract(value, '$.text'), ' ')
+       FROM json_each({row}.checklist_items)),
+    (SELECT group_concat(value, ' ') FROM json_each({row}.labels)),
+    'u' || {row}.user_id
+"""
+
+SQLITE_FTS_INSERT = (
+    "INSERT INTO notes_fts(rowid, title, content, checklist, labels, owner) "
+    "SELECT" + SQLITE_FTS_DOCUMENT
+)
+
+SQLITE_FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        {SQLITE_FTS_INSERT.format(row="new")};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM notes_fts WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au
+    AFTER UPDATE OF title, content, checklist_items, labels, user_id ON notes BEGIN
+        DELETE FROM notes_fts WHERE rowid = old.id;
+        {SQLITE_FTS_INSERT.format(row="new")};
+    END
+    """,
+]
+
+# PostgreSQL: a GIN expression index over a weighted tsvector. The query
+# below repeats the exact same expression so the planner can use the index,
+# and the index is maintained by Postgres on every write.
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(labels::text, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce("
+    "jsonb_path_query_array(checklist_items::jsonb, '$[*].text')::text, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(content, '')), 'D')"
+)
+
+POSTGRES_INDEX = f"CREATE INDEX IF NOT EXISTS ix_notes_search ON notes USING GIN (({POSTGRES_DOCUMENT}))"
+
+
+class NoteSearchIndex:
+    def __init__(self, bind=engine):
+        self.bind = bind
+        self.dialect = bind.dialect.name
+
+    def create(self):
+        """Create the full-text index and its sync triggers if missing."""
+        with self.bind.begin() as conn:
+            if self.dialect == "sqlite":
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+                )).first()
+                if not exists:
+                    conn.execute(text(SQLITE_FTS_TABLE))
+                    # Backfill notes written before the index existed
+                    conn.execute(text(
+                        SQLITE_FTS_INSERT.format(row="notes") + " FROM notes"))
+                for trigger in SQLITE_FTS_TRIGGERS:
+                    conn.execute(text(trigger))
+            elif self.dialect == "postgresql":
+                conn.execute(text(POSTGRES_INDEX))
+
+    async def search(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        include_archived: bool = False
+    ) -> Tuple[List[dict], bool]:
+        """Return ranked hits for a user's notes and whether more exist."""
+        terms = self._tokenize(query)
+        if not terms:
+            return [], False
+
+        params = {
+            "user_id": user_id,
+            "limit": limit + 1,
+            "offset": offset,
+            "start": MATCH_START,
+            "end": MATCH_END,
+        }
+        if self.dialect == "postgresql":
+            sql = self._postgres_query(include_archived)
+            params["query"] = " & ".join(
+                [f"'{term}'" for term in terms[:-1]] + [f"'{terms[-1]}':*"])
+            params["options"] = (
+                f"StartSel={MATCH_START}, StopSel={MATCH_END}, "
+                f"MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}"
+            )
+        else:
+            sql = self._sqlite_query(include_archived)
+            params["query"] = self._sqlite_match(user_id, terms)
+
+        rows = (await db.execute(text(sql), params)).mappings().all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not rows:
+            return [], False
+
+        # Hydrate the matched notes in one query and keep rank order
+        ids = [row["id"] for row in rows]
+        notes = {
+            note.id: note
+            for note in await db.scalars(select(Note).where(
+                Note.id.in_(ids), Note.user_id == user_id))
+        }
+
+        hits = []
+        for row in rows:
+            note = notes.get(row["id"])
+            if note is None:
+                continue
+            hits.append({
+                "note": note,
+                "rank": float(row["rank"]),
+                "title_highlight": self._mark(row["title_highlight"]),
+                "snippet": self._mark(row["snippet"]),
+            })
+        return hits, has_more
+
+    def _sqlite_query(self, include_archived: bool) -> str:
+        archived = "" if include_archived else "AND coalesce(n.is_archived, 0) = 0"
+        # bm25 column weights: title, content, checklist, labels, owner
+        return f"""
+            SELECT n.id AS id,
+                   bm25(notes_fts, 10.0, 1.0, 2.0, 5.0, 0.0) AS rank,
+                   highlight(notes_fts, 0, :start, :end) AS title_highlight,
+                   snippet(notes_fts, -1, :start, :end, '…', {SNIPPET_TOKENS}) AS snippet
+            FROM notes_fts
+            JOIN notes n ON n.id = notes_fts.rowid
+            WHERE notes_fts MATCH :query
+              AND n.user_id = :user_id
+              {archived}
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        """
+
+    def _postgres_query(self, include_archived: bool) -> str:
+        archived = "" if include_archived else "AND coalesce(n.is_archived, false) = false"
+        return f"""
+            SELECT n.id AS id,
+                   ts_rank_cd({POSTGRES_DOCUMENT}, q.query) AS rank,
+                   ts_headline('simple', n.title, q.query, :options) AS title_highlight,
+                   ts_headline('simple', coalesce(n.content, ''), q.query, :options) AS snippet
+            FROM notes n, to_tsquery('simple', :query) AS q(query)
+            WHERE n.user_id = :user_id
+              AND ({POSTGRES_DOCUMENT}) @@ q.query
+              {archived}
+            ORDER BY rank DESC, n.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    def _sqlite_match(self, user_id: int, terms: List[str]) -> str:
+        """Build an FTS5 MATCH expression; the last term is a prefix."""
+        quoted = [f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*']
+        return (
+            f"owner : u{user_id} AND "
+            f"{{title content checklist labels}} : ({' AND '.join(quoted)})"
+        )
+
+    def _mark(self, fragment: Optional[str]) -> Optional[str]:
+        """HTML-escape a highlighted fragment, then insert the <mark> tags."""
+        if fragment is None:
+            return None
+        return (html.escape(fragment)
+                .replace(MATCH_START, HIGHLIGHT_START)
+                .replace(MATCH_END, HIGHLIGHT_END))
+
+    def _tokenize(self, query: str) -> List[str]:
+        """Split free text into safe search terms (no query syntax)."""
+        return re.findall(r"\w+", query.lower(), re.UNICODE)[:MAX_QUERY_TERMS]
+
+
+# Service instance
+search_index = NoteSearchIndex()
+
+
+def create_search_index():
+    """Public function to create the full-text index."""
+    search_index.create()
+
+
+async def search_notes(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    include_archived: bool = False
+) -> Tuple[List[dict], bool]:
+    """Public function to search a user's notes."""
+    return await search_index.search(db, user_id, query, limit, offset, include_archived)
@@ -0,0 +1,110 @@
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Note, NoteTombstone, User
+from note_query import InvalidCursor, decode_cursor, encode_cursor
+
+# Position before any change; a client without a cursor gets everything
+START_POSITION = (-1, 0)
+
+
+async def next_change_seq(db: AsyncSession, user_id: int) -> int:
+    """Allocate the user's next change sequence number.
+
+    The increment locks the user row until the transaction commits, so
+    sequence numbers become visible to readers in the order they were
+    allocated.
+    """
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(change_seq=User.change_seq + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return await db.scalar(select(User.change_seq).where(User.id == user_id))
+
+
+async def get_change_seq(db: AsyncSession, user_id: int) -> int:
+    """The user's current change sequence, used as the collection version."""
+    return await db.scalar(select(User.change_seq).where(User.id == user_id)) or 0
+
+
+async def record_note_change(db: AsyncSession, note: Note):
+    """Stamp a created or updated note with a new change sequence."""
+    note.change_seq = await next_change_seq(db, note.user_id)
+
+
+async def record_note_deletion(db: AsyncSession, note: Note):
+    """Leave a tombstone so syncing clients learn about the delete."""
+    db.add(NoteTombstone(
+        note_id=note.id,
+        user_id=note.user_id,
+        change_seq=await next_change_seq(db, note.user_id)
+    ))
+
+
+async def clear_tombstones(db: AsyncSession, note_id: int):
+    """Drop tombstones for a note id that is being reused by a new note."""
+    await db.execute(
+        delete(NoteTombstone)
+        .where(NoteTombstone.note_id == note_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+class ChangeFeed:
+    """Notes created, updated or deleted after a change cursor.
+
+    Live notes and tombstones are both read in (change_seq, id) order from
+    their per-user indexes and merged, so a sync costs O(changes).
+    """
+
+    def __init__(self, db: AsyncSession, user_id: int):
+        self.db = db
+        self.user_id = user_id
+
+    async def since(self, cursor: Optional[str], limit: int) -> Tuple[List[Note], List[int], str, bool]:
+        """Return (changed notes, deleted ids, next cursor, has_more)."""
+        position = self._parse_position(cursor) if cursor else START_POSITION
+
+        notes = (await self.db.scalars(
+            select(Note).where(
+                Note.user_id == self.user_id,
+                tuple_(Note.change_seq, Note.id) > tuple_(*position)
+            ).order_by(Note.change_seq, Note.id).limit(limit + 1)
+        )).all()
+
+        tombstones = (await self.db.scalars(
+            select(NoteTombstone).where(
+                NoteTombstone.user_id == self.user_id,
+                tuple_(NoteTombstone.change_seq, NoteTombstone.note_id) > tuple_(*position)
+            ).order_by(NoteTombstone.change_seq, NoteTombstone.note_id).limit(limit + 1)
+        )).all()
+
+        changes = sorted(
+            [((note.change_seq or 0, note.id), note) for note in notes] +
+            [((tomb.change_seq, tomb.note_id), tomb) for tomb in tombstones],
+            key=lambda change: change[0]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        if changes:
+            position = changes[-1][0]
+        changed = [item for _, item in changes if isinstance(item, Note)]
+        deleted = [item.note_id for _, item in changes if isinstance(item, NoteTombstone)]
+        return changed, deleted, encode_cursor({"c": position[0], "i": position[1]}), has_more
+
+    def _parse_position(self, cursor: str) -> Tuple[int, int]:
+        state = decode_cursor(cursor)
+        try:
+            return int(state["c"]), int(state["i"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidCursor("Invalid cursor") from e
+
+
+async def get_changes(db: AsyncSession, user_id: int, cursor: Optional[str], limit: int):
+    """Public function to read a user's change feed."""
+    return await ChangeFeed(db, user_id).since(cursor, limit)
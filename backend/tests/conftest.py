@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+# Settings are read at import time: point the app at a scratch database and
+# upload directory before anything imports it
+WORKDIR = tempfile.mkdtemp(prefix="notes-app-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.chdir(WORKDIR)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    from main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def register_user(client) -> dict:
+    """Register a fresh user; returns its Authorization header."""
+    name = uuid.uuid4().hex[:12]
+    response = client.post("/auth/register", json={
+        "email": f"{name}@example.com", "username": name, "password": "test-password"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def auth_headers(client):
+    return register_user(client)
+
+
+@pytest.fixture
+def create_note(client, auth_headers):
+    def create(**fields):
+        response = client.post("/notes", json={"title": "Note", **fields}, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create
@@ -0,0 +1,119 @@
+import asyncio
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+from sqlalchemy import select
+
+from conftest import register_user
+from database import AsyncSessionLocal, engine
+from file_handler import content_hash, file_handler
+from models import FileBlob, FileUpload
+import attachments
+
+
+def png_bytes(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def upload(client, headers, data: bytes) -> str:
+    response = client.post("/upload/image", files={"file": ("image.png", data, "image/png")},
+                           headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["file_url"]
+
+
+def blob(file_url: str):
+    with engine.connect() as conn:
+        return conn.execute(select(FileBlob).where(
+            FileBlob.sha256 == content_hash(file_url))).first()
+
+
+def pending_uploads(file_url: str):
+    with engine.connect() as conn:
+        return sorted(conn.scalars(select(FileUpload.user_id).where(
+            FileUpload.sha256 == content_hash(file_url))))
+
+
+def blob_file(file_url: str):
+    row = blob(file_url)
+    return file_handler.blob_path(row.file_type, row.sha256, row.extension)
+
+
+@pytest.fixture
+def image_url(client, auth_headers, request):
+    # Unique bytes per test, so blobs are not shared between tests
+    return upload(client, auth_headers, png_bytes(hash(request.node.name) & 0xFFFFFF))
+
+
+def test_attaching_counts_references_and_consumes_the_upload(client, auth_headers, create_note, image_url):
+    assert blob(image_url).ref_count == 0
+    assert len(pending_uploads(image_url)) == 1
+
+    create_note(title="one", image_url=image_url)
+    create_note(title="two", image_url=image_url)
+
+    assert blob(image_url).ref_count == 2
+    assert pending_uploads(image_url) == []
+
+
+def test_blob_is_removed_with_its_last_reference(client, auth_headers, create_note, image_url):
+    first = create_note(title="one", image_url=image_url)
+    second = create_note(title="two", image_url=image_url)
+    path = blob_file(image_url)
+
+    client.put(f"/notes/{first['id']}", json={"image_url": None}, headers=auth_headers)
+    assert blob(image_url).ref_count == 1
+
+    client.delete(f"/notes/{second['id']}", headers=auth_headers)
+    assert blob(image_url) is None
+    assert not path.exists()
+
+
+def test_batch_delete_releases_references(client, auth_headers, create_note, image_url):
+    notes = [create_note(title=f"Note {n}", image_url=image_url) for n in range(2)]
+
+    client.post("/notes/batch", json={"operations": [
+        {"op": "delete", "id": note["id"]} for note in notes]}, headers=auth_headers)
+
+    assert blob(image_url) is None
+
+
+def test_pending_upload_of_another_user_keeps_the_blob(client, auth_headers, create_note, image_url):
+    other = register_user(client)
+    other_url = upload(client, other, client.get(image_url, headers=auth_headers).content)
+    assert content_hash(other_url) == content_hash(image_url)
+
+    note = create_note(image_url=image_url)
+    client.delete(f"/notes/{note['id']}", headers=auth_headers)
+
+    assert blob(image_url).ref_count == 0
+    assert len(pending_uploads(image_url)) == 1
+    assert client.get(other_url, headers=other).status_code == 200
+    assert client.get(image_url, headers=auth_headers).status_code == 404
+
+
+def test_reaper_reclaims_only_expired_unattached_uploads(client, auth_headers, create_note, image_url):
+    attached = upload(client, auth_headers, png_bytes(0x654321))
+    create_note(image_url=attached)
+    path = blob_file(image_url)
+
+    async def reap(older_than):
+        async with AsyncSessionLocal() as db:
+            orphaned = await attachments.reap_unattached_uploads(db, older_than)
+            await db.commit()
+            await attachments.purge_files(db, orphaned)
+            return orphaned
+
+    assert asyncio.run(reap(datetime.utcnow() - timedelta(hours=1))) == []
+    assert blob(image_url) is not None
+
+    orphaned = asyncio.run(reap(datetime.utcnow() + timedelta(seconds=1)))
+
+    assert content_hash(image_url) in map(content_hash, orphaned)
+    assert blob(image_url) is None
+    assert not path.exists()
+    assert blob(attached).ref_count == 1
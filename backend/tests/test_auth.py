@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+from sqlalchemy import event, select, update
+
+from auth import BCRYPT_ROUNDS, PasswordHashPool, decode_access_token, hash_pool, principal_cache
+from conftest import register_user
+from database import async_engine, engine
+from models import User
+
+
+@contextmanager
+def user_row_loads():
+    """Count queries that load a full user row (the principal lookup)."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "users.hashed_password" in statement:
+            statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+def user_id(headers) -> int:
+    return decode_access_token(headers["Authorization"].split()[1])["uid"]
+
+
+def test_cached_principal_skips_the_user_query(client, auth_headers):
+    principal_cache.invalidate(user_id(auth_headers))
+
+    with user_row_loads() as loads:
+        assert client.get("/labels", headers=auth_headers).status_code == 200
+    assert len(loads) == 1
+
+    with user_row_loads() as loads:
+        assert client.get("/labels", headers=auth_headers).status_code == 200
+        assert client.get("/notes", headers=auth_headers).status_code == 200
+    assert loads == []
+
+
+def test_password_reset_revokes_cached_tokens(client):
+    headers = register_user(client)
+    uid = user_id(headers)
+    with engine.connect() as conn:
+        email = conn.scalar(select(User.email).where(User.id == uid))
+    # Warm the cache with the old token
+    assert client.get("/labels", headers=headers).status_code == 200
+    assert principal_cache.get(uid) is not None
+
+    client.post("/auth/forgot-password", json={"email": email})
+    with engine.connect() as conn:
+        reset_token = conn.scalar(select(User.reset_token).where(User.id == uid))
+    response = client.post("/auth/reset-password", json={
+        "token": reset_token, "new_password": "new-password"})
+    assert response.status_code == 200, response.text
+
+    assert client.get("/labels", headers=headers).status_code == 401
+
+    login = client.post("/auth/login", json={"email": email, "password": "new-password"})
+    new_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert client.get("/labels", headers=new_headers).status_code == 200
+    assert client.get("/labels", headers=headers).status_code == 401
+
+
+
+def test_hash_pool_sheds_load_beyond_its_queue_limit():
+    pool = PasswordHashPool(kind="thread", workers=1, queue_limit=2)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(pool.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert pool.queue_depth == 2
+        with pytest.raises(HTTPException) as shed:
+            await pool.run(len, "x")
+        release.set()
+        await asyncio.gather(*running)
+        # Room again once the queue drains
+        assert await pool.run(len, "abc") == 3
+        return shed.value
+
+    try:
+        error = asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "1"
+
+
+def test_login_returns_503_with_retry_after_when_saturated(client, monkeypatch):
+    email, password = "saturated@example.com", "test-password"
+    client.post("/auth/register", json={"email": email, "username": "saturated", "password": password})
+    monkeypatch.setattr(hash_pool, "queue_limit", 0)
+
+    response = client.post("/auth/login", json={"email": email, "password": password})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_login_rehashes_when_the_bcrypt_cost_changes(client):
+    headers = register_user(client)
+    uid = user_id(headers)
+    with engine.begin() as conn:
+        email = conn.scalar(select(User.email).where(User.id == uid))
+        # A hash made under a different BCRYPT_ROUNDS setting
+        conn.execute(update(User).where(User.id == uid).values(
+            hashed_password=bcrypt.using(rounds=BCRYPT_ROUNDS + 1).hash("test-password")))
+
+    response = client.post("/auth/login", json={"email": email, "password": "test-password"})
+    assert response.status_code == 200
+
+    with engine.connect() as conn:
+        stored = conn.scalar(select(User.hashed_password).where(User.id == uid))
+    assert stored.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    assert bcrypt.verify("test-password", stored)
+    # Already at the configured cost: left alone
+    client.post("/auth/login", json={"email": email, "password": "test-password"})
+    with engine.connect() as conn:
+        assert conn.scalar(select(User.hashed_password).where(User.id == uid)) == stored
@@ -0,0 +1,95 @@
+from conftest import register_user
+
+
+def batch(client, headers, operations, atomic=True):
+    return client.post("/notes/batch", json={"operations": operations, "atomic": atomic},
+                       headers=headers)
+
+
+def note_titles(client, headers):
+    page = client.get("/notes", params={"sort": "title"}, headers=headers).json()
+    return [note["title"] for note in page["items"]]
+
+
+def test_batch_applies_creates_updates_and_deletes(client, auth_headers, create_note):
+    edited = create_note(title="before")
+    deleted = create_note(title="deleted")
+
+    response = batch(client, auth_headers, [
+        {"op": "create", "note": {"title": "created"}},
+        {"op": "update", "id": edited["id"], "changes": {"title": "after"}},
+        {"op": "delete", "id": deleted["id"]},
+    ])
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["ok", "ok", "ok"]
+    assert results[0]["id"] is not None
+    assert note_titles(client, auth_headers) == ["after", "created"]
+
+
+def test_atomic_batch_with_a_missing_note_changes_nothing(client, auth_headers, create_note):
+    kept = create_note(title="kept")
+
+    response = batch(client, auth_headers, [
+        {"op": "create", "note": {"title": "never created"}},
+        {"op": "delete", "id": kept["id"]},
+        {"op": "update", "id": 999999, "changes": {"title": "missing"}},
+    ])
+
+    assert response.status_code == 404
+    assert note_titles(client, auth_headers) == ["kept"]
+
+
+def test_atomic_batch_rolls_back_on_a_failing_operation(client, auth_headers, create_note):
+    deleted = create_note(title="deleted")
+    drawing = create_note(title="drawing", note_type="drawing")
+
+    # The delete runs before the invalid drawing is rejected
+    response = batch(client, auth_headers, [
+        {"op": "delete", "id": deleted["id"]},
+        {"op": "update", "id": drawing["id"], "changes": {"drawing_data": "not base64!"}},
+    ])
+
+    assert response.status_code == 400
+    assert note_titles(client, auth_headers) == ["deleted", "drawing"]
+    changes = client.get("/notes/changes", headers=auth_headers).json()
+    assert changes["deleted"] == []
+
+
+def test_non_atomic_batch_skips_missing_notes(client, auth_headers, create_note):
+    edited = create_note(title="before")
+
+    response = batch(client, auth_headers, [
+        {"op": "update", "id": edited["id"], "changes": {"title": "after"}},
+        {"op": "delete", "id": 999999},
+        {"op": "create", "note": {"title": "created"}},
+    ], atomic=False)
+
+    assert response.status_code == 200, response.text
+    statuses = [result["status"] for result in response.json()["results"]]
+    assert statuses == ["ok", "not_found", "ok"]
+    assert note_titles(client, auth_headers) == ["after", "created"]
+
+
+def test_other_users_notes_are_not_found(client, auth_headers, create_note):
+    theirs = create_note(title="theirs")
+    other = register_user(client)
+
+    response = batch(client, other, [{"op": "delete", "id": theirs["id"]}], atomic=False)
+
+    assert response.json()["results"][0]["status"] == "not_found"
+    assert note_titles(client, auth_headers) == ["theirs"]
+
+
+def test_invalid_operations_are_rejected(client, auth_headers, create_note):
+    note = create_note()
+
+    response = batch(client, auth_headers, [
+        {"op": "update", "id": note["id"], "changes": {"title": "a"}},
+        {"op": "delete", "id": note["id"]},
+    ])
+    assert response.status_code == 400
+
+    response = batch(client, auth_headers, [{"op": "create"}])
+    assert response.status_code == 400
@@ -0,0 +1,85 @@
+def changes(client, headers, since=None, **params):
+    if since:
+        params["since"] = since
+    response = client.get("/notes/changes", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_initial_sync_returns_every_note(client, auth_headers, create_note):
+    ids = [create_note(title=f"Note {n}")["id"] for n in range(3)]
+
+    feed = changes(client, auth_headers)
+
+    assert [note["id"] for note in feed["notes"]] == ids
+    assert feed["deleted"] == []
+    assert feed["has_more"] is False
+
+
+def test_cursor_returns_only_later_changes(client, auth_headers, create_note):
+    first = create_note(title="first")
+    second = create_note(title="second")
+    cursor = changes(client, auth_headers)["next_cursor"]
+
+    client.put(f"/notes/{first['id']}", json={"title": "first, edited"}, headers=auth_headers)
+    third = create_note(title="third")
+    feed = changes(client, auth_headers, cursor)
+
+    assert [note["id"] for note in feed["notes"]] == [first["id"], third["id"]]
+    assert feed["notes"][0]["title"] == "first, edited"
+    assert second["id"] not in [note["id"] for note in feed["notes"]]
+
+    # Nothing new since the latest cursor
+    feed = changes(client, auth_headers, feed["next_cursor"])
+    assert feed["notes"] == [] and feed["deleted"] == []
+
+
+def test_deletes_arrive_as_tombstones(client, auth_headers, create_note):
+    kept = create_note(title="kept")
+    gone = create_note(title="gone")
+    cursor = changes(client, auth_headers)["next_cursor"]
+
+    client.delete(f"/notes/{gone['id']}", headers=auth_headers)
+    feed = changes(client, auth_headers, cursor)
+
+    assert feed["notes"] == []
+    assert feed["deleted"] == [gone["id"]]
+    # A client syncing from scratch never sees the deleted note
+    full = changes(client, auth_headers)
+    assert [note["id"] for note in full["notes"]] == [kept["id"]]
+    assert full["deleted"] == [gone["id"]]
+
+
+def test_batch_deletes_leave_tombstones(client, auth_headers, create_note):
+    ids = [create_note(title=f"Note {n}")["id"] for n in range(2)]
+    cursor = changes(client, auth_headers)["next_cursor"]
+
+    client.post("/notes/batch", json={"operations": [
+        {"op": "delete", "id": note_id} for note_id in ids]}, headers=auth_headers)
+
+    assert sorted(changes(client, auth_headers, cursor)["deleted"]) == sorted(ids)
+
+
+def test_limit_pages_through_notes_and_tombstones(client, auth_headers, create_note):
+    ids = [create_note(title=f"Note {n}")["id"] for n in range(4)]
+    client.delete(f"/notes/{ids[1]}", headers=auth_headers)
+    client.put(f"/notes/{ids[0]}", json={"title": "edited"}, headers=auth_headers)
+
+    seen_notes, seen_deleted, cursor = [], [], None
+    while True:
+        feed = changes(client, auth_headers, cursor, limit=2)
+        assert len(feed["notes"]) + len(feed["deleted"]) <= 2
+        seen_notes.extend(note["id"] for note in feed["notes"])
+        seen_deleted.extend(feed["deleted"])
+        cursor = feed["next_cursor"]
+        if not feed["has_more"]:
+            break
+
+    # Oldest change first: the edit to ids[0] comes after the delete
+    assert seen_notes == [ids[2], ids[3], ids[0]]
+    assert seen_deleted == [ids[1]]
+
+
+def test_invalid_change_cursor_returns_400(client, auth_headers):
+    response = client.get("/notes/changes", params={"since": "bogus"}, headers=auth_headers)
+    assert response.status_code == 400
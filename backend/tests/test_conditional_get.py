@@ -0,0 +1,102 @@
+from conftest import register_user
+
+
+def revalidate(client, headers, url, etag, **params):
+    return client.get(url, params=params, headers={**headers, "If-None-Match": etag})
+
+
+def test_note_listing_revalidates_until_a_note_changes(client, auth_headers, create_note):
+    note = create_note(title="first")
+    response = client.get("/notes", headers=auth_headers)
+    etag = response.headers["etag"]
+    assert etag.startswith("W/")
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = revalidate(client, auth_headers, "/notes", etag)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    client.put(f"/notes/{note['id']}", json={"title": "edited"}, headers=auth_headers)
+    response = revalidate(client, auth_headers, "/notes", etag)
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["items"][0]["title"] == "edited"
+
+    etag = response.headers["etag"]
+    create_note(title="second")
+    assert revalidate(client, auth_headers, "/notes", etag).status_code == 200
+
+    etag = client.get("/notes", headers=auth_headers).headers["etag"]
+    client.delete(f"/notes/{note['id']}", headers=auth_headers)
+    assert revalidate(client, auth_headers, "/notes", etag).status_code == 200
+
+
+def test_listing_etag_depends_on_the_query(client, auth_headers, create_note):
+    create_note(title="a")
+    plain = client.get("/notes", headers=auth_headers).headers["etag"]
+    sorted_etag = client.get("/notes", params={"sort": "title"}, headers=auth_headers).headers["etag"]
+    assert plain != sorted_etag
+
+    assert revalidate(client, auth_headers, "/notes", plain, sort="title").status_code == 200
+    assert revalidate(client, auth_headers, "/notes", sorted_etag, sort="title").status_code == 304
+
+
+def test_listing_etag_is_per_user(client, auth_headers, create_note):
+    create_note()
+    etag = client.get("/notes", headers=auth_headers).headers["etag"]
+    other = register_user(client)
+    assert revalidate(client, other, "/notes", etag).status_code == 200
+
+
+def test_single_note_revalidates_until_it_changes(client, auth_headers, create_note):
+    note = create_note(title="mine")
+    other_note = create_note(title="other")
+    url = f"/notes/{note['id']}"
+    etag = client.get(url, headers=auth_headers).headers["etag"]
+
+    assert revalidate(client, auth_headers, url, etag).status_code == 304
+    # A list of validators matches if any of them does
+    assert revalidate(client, auth_headers, url, f'W/"stale", {etag}').status_code == 304
+    assert revalidate(client, auth_headers, url, "*").status_code == 304
+
+    # Changes to other notes leave this one valid
+    client.put(f"/notes/{other_note['id']}", json={"title": "changed"}, headers=auth_headers)
+    assert revalidate(client, auth_headers, url, etag).status_code == 304
+
+    client.put(url, json={"content": "new"}, headers=auth_headers)
+    response = revalidate(client, auth_headers, url, etag)
+    assert response.status_code == 200
+    assert response.json()["content"] == "new"
+    assert response.headers["etag"] != etag
+
+
+def test_revalidating_a_missing_note_is_404(client, auth_headers, create_note):
+    note = create_note()
+    etag = client.get(f"/notes/{note['id']}", headers=auth_headers).headers["etag"]
+    other = register_user(client)
+
+    assert revalidate(client, other, f"/notes/{note['id']}", etag).status_code == 404
+    client.delete(f"/notes/{note['id']}", headers=auth_headers)
+    assert revalidate(client, auth_headers, f"/notes/{note['id']}", etag).status_code == 404
+
+
+def test_labels_revalidate_until_a_label_or_note_changes(client, auth_headers, create_note):
+    client.post("/labels", json={"name": "work"}, headers=auth_headers)
+    response = client.get("/labels", headers=auth_headers)
+    etag = response.headers["etag"]
+    assert [label["name"] for label in response.json()] == ["work"]
+
+    response = revalidate(client, auth_headers, "/labels", etag)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    client.post("/labels", json={"name": "home"}, headers=auth_headers)
+    response = revalidate(client, auth_headers, "/labels", etag)
+    assert response.status_code == 200
+    assert sorted(label["name"] for label in response.json()) == ["home", "work"]
+
+    # Notes can create labels, so a note write also invalidates the list
+    etag = response.headers["etag"]
+    create_note()
+    assert revalidate(client, auth_headers, "/labels", etag).status_code == 200
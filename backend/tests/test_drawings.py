@@ -0,0 +1,106 @@
+import base64
+import hashlib
+
+from sqlalchemy import create_engine, text
+
+from conftest import register_user
+from database import Base
+from migrations import run_migrations
+
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==")
+
+
+def put_drawing(client, headers, note_id, data, content_type="image/png"):
+    return client.put(f"/notes/{note_id}/drawing", content=data,
+                      headers={**headers, "Content-Type": content_type})
+
+
+def test_drawing_round_trip(client, auth_headers, create_note):
+    note = create_note(title="sketch", note_type="drawing")
+    assert note["drawing_url"] is None
+
+    response = put_drawing(client, auth_headers, note["id"], PNG)
+    assert response.status_code == 200, response.text
+    note = response.json()
+    assert note["drawing_hash"] == hashlib.sha256(PNG).hexdigest()
+    assert note["drawing_size"] == len(PNG)
+
+    response = client.get(note["drawing_url"], headers=auth_headers)
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    # The versioned URL never changes content
+    assert "immutable" in response.headers["cache-control"]
+
+    # An empty body removes the drawing
+    note = put_drawing(client, auth_headers, note["id"], b"").json()
+    assert note["drawing_url"] is None
+    assert client.get(f"/notes/{note['id']}/drawing", headers=auth_headers).status_code == 404
+
+
+def test_drawing_revalidates_with_if_none_match(client, auth_headers, create_note):
+    note = create_note(note_type="drawing")
+    put_drawing(client, auth_headers, note["id"], PNG)
+    url = f"/notes/{note['id']}/drawing"
+
+    response = client.get(url, headers=auth_headers)
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    put_drawing(client, auth_headers, note["id"], PNG + b"\x00")
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_drawings_are_owner_only(client, auth_headers, create_note):
+    note = create_note(note_type="drawing")
+    put_drawing(client, auth_headers, note["id"], PNG)
+    other = register_user(client)
+
+    assert client.get(f"/notes/{note['id']}/drawing", headers=other).status_code == 404
+    assert put_drawing(client, other, note["id"], b"GIF89a", "image/gif").status_code == 404
+    assert client.get(f"/notes/{note['id']}/drawing", headers=auth_headers).content == PNG
+
+
+def test_drawing_body_must_be_an_image(client, auth_headers, create_note):
+    note = create_note(note_type="drawing")
+    assert put_drawing(client, auth_headers, note["id"], b"{}", "application/json").status_code == 415
+
+
+def test_legacy_inline_drawings_are_migrated(tmp_path):
+    legacy = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    Base.metadata.create_all(legacy)
+    inline = "data:image/png;base64," + base64.b64encode(PNG).decode()
+    with legacy.begin() as conn:
+        conn.execute(text("ALTER TABLE notes ADD COLUMN drawing_data TEXT"))
+        conn.execute(text(
+            "INSERT INTO users (id, email, username, hashed_password) "
+            "VALUES (1, 'legacy@example.com', 'legacy', 'x')"))
+        conn.execute(text(
+            "INSERT INTO notes (id, title, user_id, note_type, drawing_data) VALUES "
+            "(1, 'data url', 1, 'drawing', :inline), "
+            "(2, 'bare base64', 1, 'drawing', :bare), "
+            "(3, 'text', 1, 'text', NULL)"),
+            {"inline": inline, "bare": base64.b64encode(b"GIF89a").decode()})
+
+    run_migrations(bind=legacy)
+    run_migrations(bind=legacy)  # Applied once only
+
+    with legacy.connect() as conn:
+        drawings = conn.execute(text(
+            "SELECT note_id, data, content_type, sha256 FROM note_drawings ORDER BY note_id")).all()
+        notes = conn.execute(text(
+            "SELECT id, drawing_data, drawing_size, drawing_hash FROM notes ORDER BY id")).all()
+    legacy.dispose()
+
+    assert [(row.note_id, row.data, row.content_type) for row in drawings] == [
+        (1, PNG, "image/png"), (2, b"GIF89a", "image/png")]
+    assert all(row.drawing_data is None for row in notes)
+    assert (notes[0].drawing_size, notes[0].drawing_hash) == (len(PNG), hashlib.sha256(PNG).hexdigest())
+    assert notes[2].drawing_hash is None
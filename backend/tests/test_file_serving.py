@@ -0,0 +1,201 @@
+import io
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from auth import sign_file_url
+from file_handler import UploadLimitMiddleware
+from conftest import register_user
+from http_cache import RangeNotSatisfiable, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=990-2000", (990, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    (" bytes=0-0", None),
+    ("items=0-10", None),
+    ("bytes=abc-def", None),
+    ("bytes=50-10", None),
+    ("bytes=0-10,20-30", None),
+    ("bytes=-10, 0-5", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=5000-6000", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=-10", 0),
+    ("bytes=0-", 0),
+])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, size)
+
+
+@pytest.fixture
+def image(client, auth_headers):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), (10, 200, 30)).save(buffer, format="PNG")
+    data = buffer.getvalue()
+    response = client.post("/upload/image", files={"file": ("image.png", data, "image/png")},
+                           headers=auth_headers)
+    return response.json()["file_url"], data
+
+
+def test_full_and_partial_responses(client, auth_headers, image):
+    url, data = image
+
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(url, headers={**auth_headers, "Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == data[:10]
+    assert response.headers["content-range"] == f"bytes 0-9/{len(data)}"
+
+    response = client.get(url, headers={**auth_headers, "Range": "bytes=-5"})
+    assert response.status_code == 206
+    assert response.content == data[-5:]
+
+    # Multiple ranges are answered with the whole file
+    response = client.get(url, headers={**auth_headers, "Range": "bytes=0-1,4-5"})
+    assert response.status_code == 200
+    assert response.content == data
+
+    response = client.get(url, headers={**auth_headers, "Range": f"bytes={len(data)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(data)}"
+
+
+def test_validators(client, auth_headers, image):
+    url, data = image
+    etag = client.get(url, headers=auth_headers).headers["etag"]
+
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    # A stale If-Range ignores the Range header
+    response = client.get(url, headers={**auth_headers, "Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == data
+
+
+def test_head_sends_headers_only(client, auth_headers, image):
+    url, data = image
+    response = client.head(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(data))
+    assert response.content == b""
+
+
+def test_files_need_a_header_or_a_signed_url(client, auth_headers, image):
+    url, data = image
+    token = auth_headers["Authorization"].split()[1]
+
+    assert client.get(url).status_code == 401
+    # Access tokens are never accepted in the query string
+    assert client.get(url, params={"token": token}).status_code == 401
+
+    signed = client.get(f"{url}/signed-url", headers=auth_headers).json()["url"]
+    response = client.get(signed)
+    assert response.status_code == 200
+    assert response.content == data
+
+
+def test_signed_urls_are_scoped_and_expire(client, auth_headers, image):
+    url, _ = image
+    signed = client.get(f"{url}/signed-url", headers=auth_headers).json()["url"]
+    path, query = signed.split("/files/", 1)[1].split("?")
+
+    other_file = signed.replace(path, "images/" + "0" * 64 + ".png")
+    assert client.get(other_file).status_code == 401
+    assert client.get(signed.replace("sig=", "sig=0")).status_code == 401
+
+    expired, _ = sign_file_url("/files/" + path, 1, expires_in=-1)
+    assert client.get(expired).status_code == 401
+
+
+def test_other_users_cannot_read_or_sign(client, image):
+    url, _ = image
+    other = register_user(client)
+    assert client.get(url, headers=other).status_code == 404
+    assert client.get(f"{url}/signed-url", headers=other).status_code == 404
+
+
+def test_knowing_a_url_does_not_grant_access(client, auth_headers, image):
+    url, data = image
+    other = register_user(client)
+    note = client.post("/notes", json={"title": "mine"}, headers=other).json()
+
+    assert client.post("/notes", json={"title": "x", "audio_url": url}, headers=other).status_code == 400
+    assert client.put(f"/notes/{note['id']}", json={"image_url": url}, headers=other).status_code == 400
+    response = client.post("/notes/batch", json={"operations": [
+        {"op": "create", "note": {"title": "x", "image_url": url}}]}, headers=other)
+    assert response.status_code == 400
+    assert client.get(url, headers=other).status_code == 404
+
+    # Uploading the same bytes is a legitimate claim on the blob
+    upload = client.post("/upload/image", files={"file": ("copy.png", data, "image/png")}, headers=other)
+    assert upload.json()["file_url"] == url
+    assert client.put(f"/notes/{note['id']}", json={"image_url": url}, headers=other).status_code == 200
+
+
+def test_signed_urls_are_stable_within_a_window(client, auth_headers, image):
+    url, _ = image
+    first = client.get(f"{url}/signed-url", headers=auth_headers).json()
+    second = client.get(f"{url}/signed-url", headers=auth_headers).json()
+    # The same URL lets the browser reuse its cached copy
+    assert first["url"] == second["url"]
+
+    signed, expires_at = sign_file_url("/files/images/a.png", 1, expires_in=300)
+    remaining = (expires_at - datetime.utcnow()).total_seconds()
+    assert 299 <= remaining <= 600
+    assert int(expires_at.replace(tzinfo=timezone.utc).timestamp()) % 300 == 0
+
+
+
+def test_oversized_uploads_are_refused_before_parsing(client, auth_headers):
+    # Declared too large: refused without reading the body
+    response = client.post("/upload/image", content=b"x", headers={
+        **auth_headers, "Content-Type": "multipart/form-data; boundary=b",
+        "Content-Length": str(200 * 1024 * 1024)})
+    assert response.status_code == 413
+
+
+def test_streamed_upload_stops_at_the_body_limit():
+    parsed = []
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_body_size=8192)
+
+    @app.post("/upload/image")
+    async def upload(file: UploadFile = File(...)):
+        parsed.append(file.filename)
+        return {}
+
+    def body(size):
+        yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n'
+        yield b"Content-Type: image/png\r\n\r\n"
+        for _ in range(size // 1024):
+            yield b"0" * 1024
+        yield b"\r\n--b--\r\n"
+
+    headers = {"Content-Type": "multipart/form-data; boundary=b"}
+    with TestClient(app) as upload_client:
+        # No Content-Length: the limit applies as the body streams in
+        assert upload_client.post("/upload/image", content=body(64 * 1024), headers=headers).status_code == 413
+        assert parsed == []
+        assert upload_client.post("/upload/image", content=body(4096), headers=headers).status_code == 200
+        assert parsed == ["a.png"]
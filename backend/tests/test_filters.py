@@ -0,0 +1,72 @@
+import pytest
+
+
+def titles(client, headers, **params):
+    response = client.get("/notes", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return [note["title"] for note in response.json()["items"]]
+
+
+@pytest.fixture
+def notes(client, auth_headers, create_note):
+    banana = create_note(title="banana", color="yellow", labels=["work"])
+    create_note(title="apple", color="blue", labels=["work", "ideas"], is_pinned=True)
+    create_note(title="cherry", color="blue", is_archived=True, labels=["ideas"])
+    date = create_note(title="date", color="green", reminder_time="2030-01-01T09:00:00")
+    # Moods are only set by updates
+    for note, mood in ((banana, "happy"), (date, "calm")):
+        client.put(f"/notes/{note['id']}", json={"detected_mood": mood}, headers=auth_headers)
+
+
+def test_title_sort_keeps_pinned_notes_first(client, auth_headers, notes):
+    assert titles(client, auth_headers, sort="title") == ["apple", "banana", "cherry", "date"]
+
+
+def test_mood_sort_puts_notes_without_a_mood_first(client, auth_headers, notes):
+    assert titles(client, auth_headers, sort="mood") == ["apple", "cherry", "date", "banana"]
+
+
+def test_created_sort_is_newest_first(client, auth_headers, notes):
+    assert titles(client, auth_headers, sort="created") == ["apple", "date", "cherry", "banana"]
+    # "date" is an alias for the created sort
+    assert titles(client, auth_headers, sort="date") == ["apple", "date", "cherry", "banana"]
+
+
+@pytest.mark.parametrize("params, expected", [
+    ({"color": "blue"}, ["apple", "cherry"]),
+    ({"archived": "false"}, ["apple", "banana", "date"]),
+    ({"archived": "true"}, ["cherry"]),
+    ({"pinned": "true"}, ["apple"]),
+    ({"label": "ideas"}, ["apple", "cherry"]),
+    ({"label": ["work", "ideas"]}, ["apple"]),
+    ({"has_reminder": "true"}, ["date"]),
+    ({"mood": "happy"}, ["banana"]),
+    ({"color": "blue", "archived": "false"}, ["apple"]),
+    ({"label": "work", "pinned": "false"}, ["banana"]),
+    ({"color": "purple"}, []),
+])
+def test_filters_combine(client, auth_headers, notes, params, expected):
+    assert titles(client, auth_headers, sort="title", **params) == expected
+
+
+def test_filtered_pages_follow_the_sort(client, auth_headers, create_note):
+    for title in "edcba":
+        create_note(title=title, color="blue")
+    create_note(title="other", color="green")
+
+    seen, cursor = [], None
+    while True:
+        params = {"sort": "title", "color": "blue", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/notes", params=params, headers=auth_headers).json()
+        seen.extend(note["title"] for note in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["a", "b", "c", "d", "e"]
+
+
+def test_unknown_sort_returns_400(client, auth_headers):
+    response = client.get("/notes", params={"sort": "colour"}, headers=auth_headers)
+    assert response.status_code == 400
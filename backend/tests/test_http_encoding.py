@@ -0,0 +1,136 @@
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import http_encoding
+from http_encoding import CompressionMiddleware, negotiate_encoding
+
+BIG_TEXT = "notes " * 1000
+
+
+@pytest.fixture
+def encodings(monkeypatch):
+    """Pretend every coding is installed, in the default preference order."""
+    monkeypatch.setattr(http_encoding, "AVAILABLE_ENCODINGS", ["zstd", "br", "gzip"])
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("gzip, br, zstd", "zstd"),
+    ("GZIP", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=1.0, gzip;q=0.9", "br"),
+    ("zstd;q=0, br;q=0, gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "zstd"),
+    ("*;q=0.1, gzip;q=0.5", "gzip"),
+    ("*, zstd;q=0", "br"),
+    ("gzip;q=bogus, br", "br"),
+    ("compress, deflate", None),
+])
+def test_negotiate_encoding(encodings, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_negotiation_only_offers_installed_codings(monkeypatch):
+    monkeypatch.setattr(http_encoding, "AVAILABLE_ENCODINGS", ["gzip"])
+    assert negotiate_encoding("zstd, br") is None
+    assert negotiate_encoding("zstd, br, gzip;q=0.1") == "gzip"
+
+
+def big_text(request):
+    return PlainTextResponse(BIG_TEXT, headers={"ETag": '"v1"'})
+
+
+def small_text(request):
+    return PlainTextResponse("short")
+
+
+def image(request):
+    return Response(b"\x89PNG" + b"0" * 4096, media_type="image/png")
+
+
+def streamed(request):
+    async def chunks():
+        for _ in range(10):
+            yield "line of text\n" * 100
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+@pytest.fixture
+def gzip_client(monkeypatch):
+    monkeypatch.setattr(http_encoding, "AVAILABLE_ENCODINGS", ["gzip"])
+    app = Starlette(routes=[
+        Route("/big", big_text), Route("/small", small_text),
+        Route("/image", image), Route("/stream", streamed),
+    ])
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def test_compresses_large_text(gzip_client):
+    response = gzip_client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(BIG_TEXT)
+    assert response.text == BIG_TEXT
+    # The encoded bytes no longer match a strong validator
+    assert response.headers["etag"] == 'W/"v1"'
+
+
+def test_identity_keeps_body_and_still_varies(gzip_client):
+    response = gzip_client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == '"v1"'
+    assert response.text == BIG_TEXT
+
+
+def test_small_and_binary_responses_pass_through(gzip_client):
+    response = gzip_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "short"
+
+    response = gzip_client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+
+
+def test_streamed_bodies_are_compressed_incrementally(gzip_client):
+    with gzip_client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+    assert gzip.decompress(raw).decode() == "line of text\n" * 1000
+
+
+def test_zstd_round_trip(monkeypatch):
+    zstandard = pytest.importorskip("zstandard")
+    monkeypatch.setattr(http_encoding, "zstandard", zstandard)
+    monkeypatch.setattr(http_encoding, "AVAILABLE_ENCODINGS", ["zstd", "gzip"])
+    app = Starlette(routes=[Route("/big", big_text)])
+    app.add_middleware(CompressionMiddleware)
+
+    with TestClient(app).stream("GET", "/big", headers={"Accept-Encoding": "zstd"}) as response:
+        raw = b"".join(response.iter_raw())
+        assert response.headers["content-encoding"] == "zstd"
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(raw).decode() == BIG_TEXT
+
+
+def test_api_listing_is_compressed(client, auth_headers, create_note):
+    for n in range(20):
+        create_note(title=f"Note {n}", content="Some longer note content. " * 10)
+
+    response = client.get("/notes", headers={**auth_headers, "Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()["items"]) == 20
@@ -0,0 +1,56 @@
+import asyncio
+import io
+
+from PIL import Image
+from sqlalchemy import select, update
+
+from database import AsyncSessionLocal, engine
+from file_handler import content_hash
+from image_derivatives import catch_up_image_derivatives
+from models import FileBlob
+
+
+def upload_png(client, headers, color) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), color).save(buffer, format="PNG")
+    response = client.post("/upload/image", files={"file": ("photo.png", buffer.getvalue(), "image/png")},
+                           headers=headers)
+    return response.json()["file_url"]
+
+
+def set_derivatives(file_url, derivatives):
+    with engine.begin() as conn:
+        conn.execute(update(FileBlob).where(FileBlob.sha256 == content_hash(file_url))
+                     .values(derivatives=derivatives))
+
+
+def test_note_gets_thumbnail_of_rendered_image(client, auth_headers, create_note):
+    url = upload_png(client, auth_headers, (200, 10, 10))
+    note = create_note(image_url=url)
+
+    assert note["thumbnail_url"]
+    response = client.get(note["thumbnail_url"], headers=auth_headers)
+    assert response.status_code == 200
+    with Image.open(io.BytesIO(response.content)) as thumb:
+        assert max(thumb.size) == 320
+
+
+def test_derivatives_finished_during_the_write_are_caught_up(client, auth_headers, create_note):
+    url = upload_png(client, auth_headers, (10, 10, 200))
+    with engine.connect() as conn:
+        rendered = conn.scalar(select(FileBlob.derivatives).where(
+            FileBlob.sha256 == content_hash(url)))
+
+    # The note commits before it sees the pipeline's result
+    set_derivatives(url, None)
+    note = create_note(image_url=url)
+    assert note["thumbnail_url"] is None
+    set_derivatives(url, rendered)
+
+    async def catch_up():
+        async with AsyncSessionLocal() as db:
+            await catch_up_image_derivatives(db, [note["id"]])
+    asyncio.run(catch_up())
+
+    note = client.get(f"/notes/{note['id']}", headers=auth_headers).json()
+    assert note["thumbnail_url"].endswith("_thumb.webp") or note["thumbnail_url"].endswith("_thumb.jpg")
@@ -0,0 +1,138 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+import link_preview
+from database import engine
+from link_preview import LinkPreviewService, UnsafeURLError, check_public_url
+from models import LinkPreview
+
+PUBLIC_IP = "93.184.216.34"
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/",
+    "http://localhost:8000/admin",
+    "http://10.0.0.5/",
+    "http://172.16.0.1/",
+    "http://192.168.1.1/router",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://100.64.0.1/",
+    "http://0.0.0.0/",
+    "http://[::1]/",
+    "http://[fe80::1]/",
+    "http://[::ffff:127.0.0.1]/",
+    "http://224.0.0.1/",
+    "ftp://example.com/",
+    "file:///etc/passwd",
+])
+def test_internal_targets_are_refused(url):
+    with pytest.raises(UnsafeURLError):
+        asyncio.run(check_public_url(url))
+
+
+def test_public_address_is_allowed():
+    asyncio.run(check_public_url(f"https://{PUBLIC_IP}/page"))
+
+
+def test_any_internal_address_in_dns_answer_is_refused(monkeypatch):
+    def fake_getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))
+                for address in (PUBLIC_IP, "10.1.2.3")]
+    monkeypatch.setattr(socket, "getaddrinfo", fake_getaddrinfo)
+
+    with pytest.raises(UnsafeURLError):
+        asyncio.run(check_public_url("http://rebinding.example/"))
+
+
+def test_private_hosts_can_be_allowed_for_local_testing(monkeypatch):
+    monkeypatch.setattr(link_preview, "LINK_PREVIEW_ALLOW_PRIVATE_HOSTS", True)
+    asyncio.run(check_public_url("http://127.0.0.1:8080/"))
+    with pytest.raises(UnsafeURLError):
+        asyncio.run(check_public_url("file:///etc/passwd"))
+
+
+def service_with(handler) -> LinkPreviewService:
+    service = LinkPreviewService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service
+
+
+def test_redirects_are_checked_at_every_hop():
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        return httpx.Response(302, headers={"Location": "http://169.254.169.254/latest/meta-data/"})
+
+    service = service_with(handler)
+    with pytest.raises(UnsafeURLError):
+        asyncio.run(service._scrape_url(f"http://{PUBLIC_IP}/start"))
+    assert requested == [f"http://{PUBLIC_IP}/start"]
+
+
+def test_public_redirects_are_followed():
+    html = ('<html><head><title>Landing</title>'
+            '<meta property="og:description" content="Where it ends"></head></html>')
+
+    def handler(request):
+        if request.url.path == "/start":
+            return httpx.Response(301, headers={"Location": "/landing"})
+        return httpx.Response(200, text=html, headers={"Content-Type": "text/html"})
+
+    preview = asyncio.run(service_with(handler)._scrape_url(f"http://{PUBLIC_IP}/start"))
+
+    assert preview.title == "Landing"
+    assert preview.description == "Where it ends"
+
+
+def test_prefetch_queue_skips_duplicates_and_unsupported_schemes(client):
+    # client: app startup creates the link_previews table
+    requested = []
+    service = service_with(lambda request: requested.append(request) or httpx.Response(500))
+    url = "http://127.0.0.1:9/admin"
+
+    async def scenario():
+        service.start_maintenance()
+        try:
+            service.prefetch([url, url, "javascript:alert(1)", "ftp://example.com/file"])
+            assert service._queued == {url}
+            await service._prefetch_queue.join()
+            assert service._queued == set()
+        finally:
+            await service.close()
+
+    asyncio.run(scenario())
+
+    # Refused without a request; the failure is negative-cached
+    assert requested == []
+    with engine.connect() as conn:
+        row = conn.execute(select(LinkPreview).where(LinkPreview.url == url)).first()
+    assert row is not None and row.is_error
+
+
+def test_full_prefetch_queue_drops_urls(client, monkeypatch):
+    monkeypatch.setattr(link_preview, "LINK_PREVIEW_PREFETCH_QUEUE_SIZE", 2)
+    service = service_with(lambda request: httpx.Response(500))
+    urls = [f"http://10.0.0.{n}/" for n in range(4)]
+
+    async def scenario():
+        service.start_maintenance()
+        try:
+            service.prefetch(urls)
+            queued = set(service._queued)
+            await service._prefetch_queue.join()
+            return queued
+        finally:
+            await service.close()
+
+    assert asyncio.run(scenario()) == set(urls[:2])
+
+
+def test_prefetch_is_a_no_op_before_startup():
+    service = service_with(lambda request: httpx.Response(500))
+    service.prefetch(["http://example.com/"])
+    assert service._queued == set()
@@ -0,0 +1,18 @@
+import re
+
+
+def sample(text: str, name: str) -> float:
+    match = re.search(rf"^{re.escape(name)} (\S+)$", text, re.MULTILINE)
+    assert match, f"{name} not exported"
+    return float(match.group(1))
+
+
+def test_pool_checkout_wait_is_measured_per_session(client, auth_headers):
+    before = sample(client.get("/metrics").text, "db_pool_checkout_wait_seconds_count")
+
+    client.get("/notes", headers=auth_headers)
+
+    text = client.get("/metrics").text
+    assert "# TYPE db_pool_checkout_wait_seconds histogram" in text
+    assert sample(text, "db_pool_checkout_wait_seconds_count") > before
+    assert 'db_pool_checkout_wait_seconds_bucket{le="+Inf"}' in text
@@ -0,0 +1,73 @@
+import pytest
+
+from note_query import InvalidCursor, decode_cursor, encode_cursor
+
+
+def list_all(client, headers, **params):
+    """Follow next_cursor to the end; returns the ids in order."""
+    ids, cursor = [], None
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/notes", params=query, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        ids.extend(note["id"] for note in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_cursor_encoding_round_trip():
+    state = {"s": "modified", "f": "abc", "p": True, "k": "2024-01-01T00:00:00", "i": 7}
+    assert decode_cursor(encode_cursor(state)) == state
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor!", "W10", "e30x"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_note_once(client, auth_headers, create_note):
+    created = [create_note(title=f"Note {n}", is_pinned=n % 3 == 0)["id"] for n in range(7)]
+
+    ids = list_all(client, auth_headers, limit=3)
+
+    assert sorted(ids) == sorted(created)
+    assert len(ids) == len(set(ids))
+
+
+def test_single_page_has_no_cursor(client, auth_headers, create_note):
+    create_note()
+    page = client.get("/notes", params={"limit": 10}, headers=auth_headers).json()
+    assert len(page["items"]) == 1
+    assert page["next_cursor"] is None
+
+
+def test_tampered_cursor_returns_400(client, auth_headers, create_note):
+    for n in range(3):
+        create_note(title=f"Note {n}")
+    cursor = client.get("/notes", params={"limit": 1}, headers=auth_headers).json()["next_cursor"]
+
+    state = decode_cursor(cursor)
+    state["i"] = "not-an-id"
+    response = client.get("/notes", params={"limit": 1, "cursor": encode_cursor(state)},
+                          headers=auth_headers)
+    assert response.status_code == 400
+
+    response = client.get("/notes", params={"limit": 1, "cursor": cursor[:-4] + "!!!!"},
+                          headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_cursor_is_bound_to_its_filters(client, auth_headers, create_note):
+    for n in range(3):
+        create_note(title=f"Note {n}")
+    cursor = client.get("/notes", params={"limit": 1}, headers=auth_headers).json()["next_cursor"]
+
+    response = client.get("/notes", params={"limit": 1, "cursor": cursor, "color": "blue"},
+                          headers=auth_headers)
+    assert response.status_code == 400
+    response = client.get("/notes", params={"limit": 1, "cursor": cursor, "sort": "title"},
+                          headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,75 @@
+import pytest
+
+from note_query import PREVIEW_LENGTH, VIEWS
+
+
+def get_notes(client, headers, **params):
+    response = client.get("/notes", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_fields_returns_only_the_named_fields(client, auth_headers, create_note):
+    note = create_note(title="projected", content="body", color="blue")
+
+    items = get_notes(client, auth_headers, fields="title,color")["items"]
+
+    # id is always included
+    assert items == [{"id": note["id"], "title": "projected", "color": "blue"}]
+
+
+def test_summary_view_truncates_content(client, auth_headers, create_note):
+    long_text = "word " * 100
+    create_note(title="long", content=long_text)
+    create_note(title="short", content="brief")
+
+    items = get_notes(client, auth_headers, view="summary", sort="title")["items"]
+
+    assert [set(item) for item in items] == [set(VIEWS["summary"])] * 2
+    assert "content" not in items[0]
+    assert items[0]["content_preview"].endswith("…")
+    assert len(items[0]["content_preview"]) <= PREVIEW_LENGTH + 1
+    assert long_text.startswith(items[0]["content_preview"][:-1])
+    assert items[1]["content_preview"] == "brief"
+
+
+def test_drawing_url_is_projectable(client, auth_headers, create_note):
+    note = create_note(note_type="drawing")
+    client.put(f"/notes/{note['id']}/drawing", content=b"GIF89a",
+               headers={**auth_headers, "Content-Type": "image/gif"})
+    full = client.get(f"/notes/{note['id']}", headers=auth_headers).json()
+
+    items = get_notes(client, auth_headers, fields="drawing_url")["items"]
+
+    assert items == [{"id": note["id"], "drawing_url": full["drawing_url"]}]
+
+
+@pytest.mark.parametrize("params", [
+    {"fields": "title,password"},
+    {"fields": "link_preview"},
+    {"view": "everything"},
+])
+def test_unknown_fields_and_views_are_rejected(client, auth_headers, params):
+    response = client.get("/notes", params=params, headers=auth_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("sort", ["modified", "created", "title"])
+def test_cursor_pagination_with_a_projection(client, auth_headers, create_note, sort):
+    created = [create_note(title=f"Note {n}", is_pinned=n == 2)["id"] for n in range(5)]
+    full_order = [item["id"] for item in get_notes(client, auth_headers, sort=sort)["items"]]
+
+    # The sort key is not among the projected fields
+    ids, cursor = [], None
+    while True:
+        params = {"fields": "id", "sort": sort, "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = get_notes(client, auth_headers, **params)
+        assert all(set(item) == {"id"} for item in page["items"])
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert ids == full_order
+    assert sorted(ids) == sorted(created)
+
@@ -0,0 +1,95 @@
+from conftest import register_user
+
+
+def search(client, headers, q, **params):
+    response = client.get("/notes/search", params={"q": q, **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def hit_ids(client, headers, q, **params):
+    return [hit["note"]["id"] for hit in search(client, headers, q, **params)["results"]]
+
+
+def test_index_follows_creates_updates_and_deletes(client, auth_headers, create_note):
+    note = create_note(title="Groceries", content="buy avocados")
+    assert hit_ids(client, auth_headers, "avocados") == [note["id"]]
+
+    client.put(f"/notes/{note['id']}", json={"content": "buy lemons"}, headers=auth_headers)
+    assert hit_ids(client, auth_headers, "avocados") == []
+    assert hit_ids(client, auth_headers, "lemons") == [note["id"]]
+
+    client.put(f"/notes/{note['id']}", json={
+        "checklist_items": [{"text": "saffron", "completed": False}], "labels": ["kitchen"]},
+        headers=auth_headers)
+    assert hit_ids(client, auth_headers, "saffron") == [note["id"]]
+    assert hit_ids(client, auth_headers, "kitchen") == [note["id"]]
+
+    client.delete(f"/notes/{note['id']}", headers=auth_headers)
+    assert hit_ids(client, auth_headers, "lemons") == []
+
+
+def test_index_follows_batch_operations(client, auth_headers, create_note):
+    edited = create_note(title="draft", content="quarterly report")
+    deleted = create_note(title="old", content="quarterly budget")
+
+    response = client.post("/notes/batch", json={"operations": [
+        {"op": "create", "note": {"title": "new", "content": "quarterly forecast"}},
+        {"op": "update", "id": edited["id"], "changes": {"content": "annual report"}},
+        {"op": "delete", "id": deleted["id"]},
+    ]}, headers=auth_headers)
+    created_id = response.json()["results"][0]["id"]
+
+    assert hit_ids(client, auth_headers, "quarterly") == [created_id]
+    assert hit_ids(client, auth_headers, "annual") == [edited["id"]]
+    assert hit_ids(client, auth_headers, "budget") == []
+
+
+def test_users_only_find_their_own_notes(client, auth_headers, create_note):
+    create_note(title="secret plans", content="zeppelin")
+    other = register_user(client)
+    client.post("/notes", json={"title": "my zeppelin"}, headers=other)
+
+    mine = search(client, auth_headers, "zeppelin")["results"]
+    theirs = search(client, other, "zeppelin")["results"]
+    assert [hit["note"]["title"] for hit in mine] == ["secret plans"]
+    assert [hit["note"]["title"] for hit in theirs] == ["my zeppelin"]
+
+
+def test_last_term_matches_as_a_prefix(client, auth_headers, create_note):
+    note = create_note(title="Photography course", content="aperture and shutter")
+    assert hit_ids(client, auth_headers, "photo") == [note["id"]]
+    assert hit_ids(client, auth_headers, "shutter aper") == [note["id"]]
+    # Only the last term is a prefix
+    assert hit_ids(client, auth_headers, "aper shutter") == []
+
+
+def test_archived_notes_need_include_archived(client, auth_headers, create_note):
+    note = create_note(title="archived recipe", is_archived=True)
+    assert hit_ids(client, auth_headers, "recipe") == []
+    assert hit_ids(client, auth_headers, "recipe", include_archived=True) == [note["id"]]
+
+
+def test_offset_pages_through_ranked_results(client, auth_headers, create_note):
+    ids = {create_note(title=f"meeting {n}")["id"] for n in range(5)}
+
+    page = search(client, auth_headers, "meeting", limit=2)
+    seen = [hit["note"]["id"] for hit in page["results"]]
+    while page["next_offset"] is not None:
+        page = search(client, auth_headers, "meeting", limit=2, offset=page["next_offset"])
+        seen.extend(hit["note"]["id"] for hit in page["results"])
+
+    assert len(seen) == 5 and set(seen) == ids
+
+
+def test_highlights_escape_note_text(client, auth_headers, create_note):
+    create_note(title="<script>alert(1)</script> widget",
+                content='<img src=x onerror="alert(1)"> the gadget & more')
+
+    hit = search(client, auth_headers, "widget")["results"][0]
+    assert hit["title_highlight"] == "&lt;script&gt;alert(1)&lt;/script&gt; <mark>widget</mark>"
+
+    hit = search(client, auth_headers, "gadget")["results"][0]
+    assert "<img" not in hit["snippet"]
+    assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt;" in hit["snippet"]
+    assert "<mark>gadget</mark> &amp; more" in hit["snippet"]
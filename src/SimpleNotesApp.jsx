@@ -2,7 +2,8 @@ import { useState, useRef, useEffect, useCallback } from 'react';
 import { DragDropContext, Droppable, Draggable } from '@hello-pangea/dnd';
 import { format, parseISO } from 'date-fns';
 import { useAuth } from './AuthContext';
-import { useNotes, useLinkPreview } from './hooks';
+import { useNotes, useLinkPreview, useSignedFileUrl } from './hooks';
+import { apiClient } from './api';
 import SimpleAuthModal from './SimpleAuthModal';
 import { 
   Pin, 
@@ -44,10 +45,34 @@ import {
 } from 'lucide-react';
 
 // Simple Drawing Canvas Component
-const DrawingCanvas = ({ onDrawingChange }) => {
+const DrawingCanvas = ({ onDrawingChange, drawingUrl }) => {
   const canvasRef = useRef(null);
   const [isDrawing, setIsDrawing] = useState(false);
 
+  // Start from the note's saved drawing when editing
+  useEffect(() => {
+    if (!drawingUrl) return;
+    let objectUrl = null;
+    let cancelled = false;
+    apiClient.getDrawingObjectUrl(drawingUrl)
+      .then(url => {
+        objectUrl = url;
+        if (cancelled) return;
+        const image = new Image();
+        image.onload = () => {
+          if (!cancelled && canvasRef.current) {
+            canvasRef.current.getContext('2d').drawImage(image, 0, 0);
+          }
+        };
+        image.src = url;
+      })
+      .catch(error => console.error('Error loading drawing:', error));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [drawingUrl]);
+
   const startDrawing = (e) => {
     const canvas = canvasRef.current;
     const rect = canvas.getBoundingClientRect();
@@ -108,6 +133,48 @@ const DrawingCanvas = ({ onDrawingChange }) => {
   );
 };
 
+// Saved drawing, fetched with the auth header from note.drawing_url
+const DrawingImage = ({ drawingUrl }) => {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let objectUrl = null;
+    let cancelled = false;
+    apiClient.getDrawingObjectUrl(drawingUrl)
+      .then(url => {
+        objectUrl = url;
+        if (!cancelled) setSrc(url);
+      })
+      .catch(error => console.error('Error loading drawing:', error));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [drawingUrl]);
+
+  if (!src) return null;
+  return (
+    <img 
+      src={src} 
+      alt="Drawing" 
+      className="max-w-full h-auto rounded border"
+    />
+  );
+};
+
+// Attachments under /files load through short-lived signed URLs
+const SignedImage = ({ fileUrl, ...props }) => {
+  const src = useSignedFileUrl(fileUrl);
+  if (!src) return null;
+  return <img src={src} {...props} />;
+};
+
+const SignedAudio = ({ fileUrl, ...props }) => {
+  const src = useSignedFileUrl(fileUrl);
+  if (!src) return null;
+  return <audio controls src={src} {...props} />;
+};
+
 // URL Detection Utility
 const extractUrls = (text) => {
   const urlRegex = /(https?:\/\/[^\s]+)/g;
@@ -280,13 +347,17 @@ function SimpleNotesApp() {
     fetchNotes,
     createNote, 
     updateNote, 
+    saveDrawing,
     deleteNote: deleteNoteAPI, 
-    uploadImage
+    uploadImage,
+    uploadAudio
   } = useNotes();
   const { getLinkPreview } = useLinkPreview();
   
   const [title, setTitle] = useState('');
   const [content, setContent] = useState('');
+  // Drawings are saved through their own endpoint, and only when edited
+  const [drawingChanged, setDrawingChanged] = useState(false);
   const [currentTheme, setCurrentTheme] = useState('lavenderDream');
   const [searchTerm, setSearchTerm] = useState('');
   const [showArchived, setShowArchived] = useState(false);
@@ -297,7 +368,7 @@ function SimpleNotesApp() {
   const [editingNote, setEditingNote] = useState(null);
   const [enableMoodDetection, setEnableMoodDetection] = useState(true);
   const [showCreateForm, setShowCreateForm] = useState(false);
-  const [_imageFile, setImageFile] = useState(null);
+  const [imageFile, setImageFile] = useState(null);
   const [imagePreview, setImagePreview] = useState('');
   const [linkUrl, setLinkUrl] = useState('');
   const [linkText, setLinkText] = useState('');
@@ -828,7 +899,7 @@ function SimpleNotesApp() {
       const matchesMood = !searchFilters.mood || note.detected_mood === searchFilters.mood;
       const matchesColor = !searchFilters.color || note.color === searchFilters.color;
       const matchesReminder = !searchFilters.hasReminder || note.reminder_time;
-      const matchesAudio = !searchFilters.hasAudio || note.audioUrl;
+      const matchesAudio = !searchFilters.hasAudio || note.audio_url;
       const matchesImage = !searchFilters.hasImage || note.image_url;
       const matchesArchived = showArchived ? note.is_archived : !note.is_archived;
 
@@ -860,7 +931,7 @@ function SimpleNotesApp() {
   // Add/Edit note
   const handleSubmit = async (e) => {
     e.preventDefault();
-    if (title.trim() || content.trim()) {
+    if (title.trim() || content.trim() || (noteType === 'drawing' && editingNote)) {
       let mood = null;
       let confidence = 0;
       
@@ -873,7 +944,6 @@ function SimpleNotesApp() {
       const noteData = {
         title: title.trim() || 'Untitled',
         content: noteType === 'drawing' ? '' : content.trim(),
-        drawing_data: noteType === 'drawing' ? content.trim() : null,
         detected_mood: mood,
         mood_confidence: confidence,
         is_pinned: false,
@@ -886,18 +956,34 @@ function SimpleNotesApp() {
         note_type: noteType,
         checklist_items: noteType === 'checklist' ? [...checklistItems] : [],
         reminder_time: reminder || null,
-        audioUrl: audioBlob ? URL.createObjectURL(audioBlob) : null,
         version: 1,
         history: []
       };
 
       try {
+        // Attachments are uploaded first and referenced by their /files URL
+        if (imageFile) {
+          noteData.image_url = await uploadImage(imageFile);
+        }
+        if (audioBlob) {
+          noteData.audio_url = await uploadAudio(
+            new File([audioBlob], 'recording.wav', { type: audioBlob.type }));
+        }
+        const drawingBlob = noteType === 'drawing' && drawingChanged && content
+          ? await (await fetch(content)).blob()
+          : null;
         if (editingNote) {
           await updateNote(editingNote.id, noteData);
+          if (noteType === 'drawing' && drawingChanged) {
+            await saveDrawing(editingNote.id, drawingBlob);
+          }
           setEditingNote(null);
           setShowCreateForm(false);
         } else {
           const newNote = await createNote(noteData);
+          if (drawingBlob) {
+            await saveDrawing(newNote.id, drawingBlob);
+          }
           
           // Schedule reminder if set
           if (reminder) {
@@ -912,6 +998,7 @@ function SimpleNotesApp() {
       
       setTitle('');
       setContent('');
+      setDrawingChanged(false);
       setSelectedColor('');
       setSelectedLabels([]);
       setImageFile(null);
@@ -930,12 +1017,9 @@ function SimpleNotesApp() {
     setEditingNote(note);
     setShowCreateForm(true);
     setTitle(note.title);
-    // Load content based on note type
-    if (note.note_type === 'drawing') {
-      setContent(note.drawing_data || '');
-    } else {
-      setContent(note.content || '');
-    }
+    // Drawings load into the canvas from drawing_url; content holds new strokes
+    setContent(note.note_type === 'drawing' ? '' : note.content || '');
+    setDrawingChanged(false);
     setSelectedColor(note.color || '');
     setSelectedLabels(note.labels || []);
     setEnableMoodDetection(note.detected_mood ? true : false);
@@ -952,6 +1036,7 @@ function SimpleNotesApp() {
     setShowCreateForm(false);
     setTitle('');
     setContent('');
+    setDrawingChanged(false);
     setSelectedColor('');
     setSelectedLabels([]);
     setImageFile(null);
@@ -1307,7 +1392,11 @@ function SimpleNotesApp() {
           ) : noteType === 'drawing' ? (
             <div className="mb-4">
               <DrawingCanvas 
-                onDrawingChange={(drawingData) => setContent(drawingData)}
+                onDrawingChange={(drawingData) => {
+                  setContent(drawingData);
+                  setDrawingChanged(true);
+                }}
+                drawingUrl={editingNote?.drawing_url}
                 theme={theme}
               />
             </div>
@@ -1330,8 +1419,8 @@ function SimpleNotesApp() {
           
           {imagePreview && (
             <div className="mb-3">
-              <img 
-                src={imagePreview} 
+              <SignedImage 
+                fileUrl={imagePreview} 
                 alt="Preview" 
                 className="max-w-full h-32 object-contain rounded border"
               />
@@ -1718,13 +1807,9 @@ function SimpleNotesApp() {
                 )}
 
                 {/* Drawing Content */}
-                {note.note_type === 'drawing' && note.drawing_data && (
+                {note.note_type === 'drawing' && note.drawing_url && (
                   <div className="mb-2">
-                    <img 
-                      src={note.drawing_data} 
-                      alt="Drawing" 
-                      className="max-w-full h-auto rounded border"
-                    />
+                    <DrawingImage drawingUrl={note.drawing_url} />
                   </div>
                 )}
 
@@ -1768,17 +1853,17 @@ function SimpleNotesApp() {
                 )}
 
                 {/* Audio Display */}
-                {note.audioUrl && (
+                {note.audio_url && (
                   <div className="mb-2">
-                    <audio controls src={note.audioUrl} className="w-full h-8" />
+                    <SignedAudio fileUrl={note.audio_url} className="w-full h-8" />
                   </div>
                 )}
 
-                {/* Image display */}
+                {/* Image display: the grid shows the thumbnail, not the original */}
                 {note.image_url && (
                   <div className="mb-2">
-                    <img 
-                      src={note.image_url} 
+                    <SignedImage 
+                      fileUrl={note.thumbnail_url || note.image_url} 
                       alt="Note attachment" 
                       className="max-w-full h-auto rounded-lg shadow-sm max-h-48 object-cover"
                       onError={(e) => {
@@ -24,17 +24,28 @@ const SimpleNotesApp = () => {
     if (!user?.token) return;
     
     try {
-      const response = await fetch(`${API_URL}/notes`, {
-        headers: {
-          'Authorization': `Bearer ${user.token}`,
-          'Content-Type': 'application/json',
-        },
-      });
-      
-      if (response.ok) {
-        const data = await response.json();
-        setNotes(data);
-      }
+      // GET /notes is paginated: follow next_cursor until the last page
+      const allNotes = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ limit: 500 });
+        if (cursor) {
+          params.set('cursor', cursor);
+        }
+        const response = await fetch(`${API_URL}/notes?${params}`, {
+          headers: {
+            'Authorization': `Bearer ${user.token}`,
+            'Content-Type': 'application/json',
+          },
+        });
+        if (!response.ok) return;
+
+        const page = await response.json();
+        allNotes.push(...page.items);
+        cursor = page.next_cursor;
+      } while (cursor);
+
+      setNotes(allNotes);
     } catch (error) {
       console.error('Error fetching notes:', error);
     }
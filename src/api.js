@@ -5,11 +5,14 @@ class ApiClient {
   constructor() {
     this.baseURL = API_BASE_URL;
     this.token = localStorage.getItem('auth_token');
+    // Signed attachment URLs by /files path, reused until near expiry
+    this.signedUrls = new Map();
   }
 
   // Set authentication token
   setToken(token) {
     this.token = token;
+    this.signedUrls.clear();
     if (token) {
       localStorage.setItem('auth_token', token);
     } else {
@@ -112,8 +115,35 @@ class ApiClient {
   }
 
   // Notes methods
-  async getNotes(skip = 0, limit = 100) {
-    return await this.request(`/notes?skip=${skip}&limit=${limit}`);
+  // filters: { sort, archived, pinned, mood, color, has_reminder, has_image,
+  //            has_audio, label: [...], created_after, ... }
+  async getNotes(cursor = null, limit = 100, filters = {}) {
+    const params = new URLSearchParams({ limit });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value === null || value === undefined || value === '') return;
+      if (Array.isArray(value)) {
+        value.forEach(item => params.append(key, item));
+      } else {
+        params.set(key, value);
+      }
+    });
+    return await this.request(`/notes?${params}`);
+  }
+
+  async getNoteChanges(since = null, limit = 500) {
+    const params = new URLSearchParams({ limit });
+    if (since) {
+      params.set('since', since);
+    }
+    return await this.request(`/notes/changes?${params}`);
+  }
+
+  async searchNotes(query, limit = 20, offset = 0) {
+    const params = new URLSearchParams({ q: query, limit, offset });
+    return await this.request(`/notes/search?${params}`);
   }
 
   async createNote(noteData) {
@@ -136,6 +166,58 @@ class ApiClient {
     });
   }
 
+  // Fetch a note's drawing (note.drawing_url) and return an object URL
+  async getDrawingObjectUrl(drawingUrl) {
+    const response = await fetch(`${this.baseURL}${drawingUrl}`, {
+      headers: this.token ? { 'Authorization': `Bearer ${this.token}` } : {},
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    return URL.createObjectURL(await response.blob());
+  }
+
+  // Whether a URL names an attachment served (with auth) from /files
+  isStoredFileUrl(fileUrl) {
+    if (!fileUrl || /^(data|blob):/.test(fileUrl)) {
+      return false;
+    }
+    const url = new URL(fileUrl, this.baseURL);
+    return url.origin === new URL(this.baseURL).origin && url.pathname.startsWith('/files/');
+  }
+
+  // Short-lived URL for an attachment (note.image_url / audio_url) that
+  // <img>/<audio> can load without an Authorization header. Other URLs
+  // (data:, external) are returned unchanged.
+  async getSignedFileUrl(fileUrl) {
+    if (!this.isStoredFileUrl(fileUrl)) {
+      return fileUrl;
+    }
+    const path = new URL(fileUrl, this.baseURL).pathname;
+    const cached = this.signedUrls.get(path);
+    if (cached && cached.expiresAt - Date.now() > 30000) {
+      return cached.url;
+    }
+    const { url, expires_at } = await this.request(`${path}/signed-url`);
+    // expires_at is UTC without an offset
+    const expiresAt = Date.parse(/Z|[+-]\d\d:\d\d$/.test(expires_at) ? expires_at : `${expires_at}Z`);
+    this.signedUrls.set(path, { url, expiresAt });
+    return url;
+  }
+
+  // Replace a note's drawing with an image blob; null removes it
+  async saveDrawing(noteId, blob) {
+    const headers = { 'Content-Type': blob ? blob.type || 'image/png' : 'image/png' };
+    if (this.token) {
+      headers['Authorization'] = `Bearer ${this.token}`;
+    }
+    return await this.request(`/notes/${noteId}/drawing`, {
+      method: 'PUT',
+      headers,
+      body: blob || '',
+    });
+  }
+
   // File upload methods
   async uploadImage(file) {
     const formData = new FormData();
@@ -10,8 +10,8 @@ export const useNotes = () => {
     try {
       setIsLoading(true);
       setError(null);
-      const fetchedNotes = await apiClient.getNotes();
-      setNotes(fetchedNotes);
+      const page = await apiClient.getNotes();
+      setNotes(page.items);
     } catch (error) {
       setError(error.message);
       console.error('Error fetching notes:', error);
@@ -46,6 +46,20 @@ export const useNotes = () => {
     }
   };
 
+  const saveDrawing = async (noteId, blob) => {
+    try {
+      setError(null);
+      const updatedNote = await apiClient.saveDrawing(noteId, blob);
+      setNotes(prev => prev.map(note =>
+        note.id === noteId ? updatedNote : note
+      ));
+      return updatedNote;
+    } catch (error) {
+      setError(error.message);
+      throw error;
+    }
+  };
+
   const deleteNote = async (noteId) => {
     try {
       setError(null);
@@ -92,6 +106,7 @@ export const useNotes = () => {
     fetchNotes,
     createNote,
     updateNote,
+    saveDrawing,
     deleteNote,
     uploadImage,
     uploadAudio,
@@ -133,4 +148,25 @@ export const useLinkPreview = () => {
   }, []);
 
   return { getLinkPreview, previews };
-};
\ No newline at end of file
+};
+
+// src for an attachment URL: signed when served from /files, else as is
+export const useSignedFileUrl = (fileUrl) => {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    setSrc(null);
+    if (!fileUrl) return;
+    apiClient.getSignedFileUrl(fileUrl)
+      .then(url => {
+        if (!cancelled) setSrc(url);
+      })
+      .catch(error => console.error('Error signing file URL:', error));
+    return () => {
+      cancelled = true;
+    };
+  }, [fileUrl]);
+
+  return src;
+};